@@ -21,6 +21,7 @@ from .model_utils import *
 from .multimodal import *
 from .pptgen import *
 from .presentation import *
+from .preview import *
 from .shapes import *
 from .utils import *
 
@@ -31,6 +32,7 @@ __all__ = [
     "document",
     "llms",
     "presentation",
+    "preview",
     "utils",
     "shapes",
     "layout",
@@ -1,22 +1,26 @@
+from copy import copy
 from dataclasses import asdict, dataclass
 from functools import partial
 from math import ceil
 from typing import Optional
 
 import jsonlines
-import tiktoken
 import yaml
 from jinja2 import Environment, StrictUndefined, Template
 from PIL import Image
 from torch import Tensor, cosine_similarity
 
 from pptagent.llms import LLM, AsyncLLM
-from pptagent.utils import get_json_from_response, package_join, pexists, pjoin
+from pptagent.utils import (
+    ENCODING,
+    get_json_from_response,
+    package_join,
+    pexists,
+    pjoin,
+)
 
-ENCODING = tiktoken.encoding_for_model("gpt-4o")
 
-
-@dataclass
+@dataclass(slots=True)
 class Turn:
     """
     A class to represent a turn in a conversation.
@@ -105,6 +109,26 @@ class Agent:
         self.llm.__call__ = partial(self.llm.__call__, **run_args)
         self.system_tokens = len(ENCODING.encode(self.system_message))
 
+    def fork(self) -> "Agent":
+        """
+        Create an agent of the same role and models, with its own history and cost.
+        """
+        agent = copy(self)
+        agent.history = []
+        agent.input_tokens = 0
+        agent.output_tokens = 0
+        return agent
+
+    def merge(self, agent: "Agent"):
+        """
+        Merge the history and cost of a forked agent back into this agent.
+        """
+        for turn in agent.history:
+            turn.id = len(self.history)
+            self.history.append(turn)
+        self.input_tokens += agent.input_tokens
+        self.output_tokens += agent.output_tokens
+
     def calc_cost(self, turns: list[Turn]):
         """
         Calculate the cost of a list of turns.
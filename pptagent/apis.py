@@ -1,17 +1,17 @@
+import ast
 import inspect
 import os
 import re
+import textwrap
 import traceback
+from collections import defaultdict
 from copy import deepcopy
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 from functools import partial
 from typing import Optional, Union
 
 import PIL
-from bs4 import BeautifulSoup
-from mistune import html as markdown
-from pptx.oxml import parse_xml
 from pptx.shapes.base import BaseShape
 from pptx.shapes.graphfrm import GraphicFrame as PPTXGraphicFrame
 from pptx.text.text import _Run
@@ -19,11 +19,12 @@ from pptx.util import Pt
 
 from pptagent.document import Document
 from pptagent.presentation import SlidePage
-from pptagent.shapes import Closure, Picture, ShapeElement
+from pptagent.shapes import Closure, EditTransaction, Picture, ShapeElement
 from pptagent.utils import get_logger, runs_merge
 
 logger = get_logger(__name__)
 TABLE_REGEX = re.compile(r".*table_[0-9a-fA-F]{4}\.png$")
+CODE_BLOCK_REGEX = re.compile(r"```(?:python)?[ \t]*\n(.*?)```", re.DOTALL)
 
 
 class SlideEditError(Exception):
@@ -31,6 +32,10 @@ class SlideEditError(Exception):
     Exception raised when an edit operation fails.
     """
 
+    def __init__(self, message: str, lineno: Optional[int] = None):
+        super().__init__(message)
+        self.lineno = lineno
+
 
 @dataclass
 class HistoryMark:
@@ -46,6 +51,87 @@ class HistoryMark:
     CODE_RUN_CORRECT = "code_run_correct"
 
 
+@dataclass
+class ActionStatement:
+    """
+    A statement of an action program, either a comment or an API call.
+    """
+
+    lineno: int
+    end_lineno: int
+    source: str
+    func: Optional[str] = None
+    args: list = field(default_factory=list)
+    kwargs: dict = field(default_factory=dict)
+
+    @property
+    def is_comment(self) -> bool:
+        return self.func is None
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ActionStatement)
+            and self.func == other.func
+            and self.args == other.args
+            and self.kwargs == other.kwargs
+        )
+
+
+@dataclass
+class ActionProgram:
+    """
+    The actions parsed into API calls and comments, in the order of their lines.
+    """
+
+    code: str
+    statements: list[ActionStatement]
+
+    @property
+    def calls(self) -> list[ActionStatement]:
+        return [stmt for stmt in self.statements if not stmt.is_comment]
+
+    def resume_index(self, num_applied: int) -> int:
+        """
+        Get the index of the statement following the first `num_applied` API calls.
+        """
+        if num_applied == 0:
+            return 0
+        call_idx = 0
+        for idx, stmt in enumerate(self.statements):
+            if stmt.is_comment:
+                continue
+            call_idx += 1
+            if call_idx == num_applied:
+                return idx + 1
+        raise ValueError(f"The program has less than {num_applied} API calls.")
+
+
+def extract_code(actions: str) -> str:
+    """
+    Extract the code from the actions, joining all code blocks if there are any.
+    """
+    code_blocks = CODE_BLOCK_REGEX.findall(actions)
+    if len(code_blocks) == 0:
+        return actions.strip()
+    return "\n".join(textwrap.dedent(block).strip() for block in code_blocks)
+
+
+def mark_error_lines(code: str, error_lines: Optional[tuple[int, int]]) -> str:
+    """
+    Mark the lines from `error_lines[0]` to `error_lines[1]` (1-indexed) in the code.
+    """
+    if error_lines is None:
+        return code
+    return "\n".join(
+        (
+            f"--> Error Line: {line}"
+            if error_lines[0] <= lineno <= error_lines[1]
+            else line
+        )
+        for lineno, line in enumerate(code.split("\n"), 1)
+    )
+
+
 class CodeExecutor:
     """
     Execute code actions and manage API call history, and providing error feedback.
@@ -63,7 +149,25 @@ class CodeExecutor:
         self.code_history = []
         self.retry_times = retry_times
         self.registered_functions = API_TYPES.all_funcs()
-        self.function_regex = re.compile(r"^[a-z]+_[a-z_]+\(.+\)")
+        # signatures of the api functions without the arguments bound by the executor
+        self._signatures = {
+            name: inspect.signature(func).replace(
+                parameters=[
+                    param
+                    for param in inspect.signature(func).parameters.values()
+                    if param.name not in {"slide", "doc"}
+                ]
+            )
+            for name, func in self.registered_functions.items()
+        }
+        self._doc_funcs = {
+            name
+            for name, func in self.registered_functions.items()
+            if "doc" in inspect.signature(func).parameters
+        }
+        self._programs: dict[str, ActionProgram] = {}
+        self._edit_slide: Optional[SlidePage] = None
+        self._applied: list[ActionStatement] = []
 
     @classmethod
     def get_apis_docs(
@@ -109,6 +213,118 @@ class CodeExecutor:
             api_doc.append(signature)
         return "\n".join(api_doc)
 
+    def compile_actions(self, actions: str) -> "ActionProgram":
+        """
+        Parse the actions into a validated program of API calls with literal arguments.
+
+        Args:
+            actions (str): The actions to compile.
+
+        Returns:
+            ActionProgram: The compiled program.
+
+        Raises:
+            SlideEditError: If the actions are not a valid program, with the line of the error.
+        """
+        if actions in self._programs:
+            return self._programs[actions]
+        code = extract_code(actions)
+        try:
+            tree = ast.parse(code)
+        except SyntaxError as e:
+            raise SlideEditError(f"Invalid syntax: {e.msg}", e.lineno)
+
+        statements = [
+            ActionStatement(lineno, lineno, line.strip())
+            for lineno, line in enumerate(code.split("\n"), 1)
+            if line.strip().startswith("#")
+        ]
+        for node in tree.body:
+            statements.append(self._compile_statement(code, node))
+        statements.sort(key=lambda stmt: stmt.lineno)
+
+        # only one of clone and del can be used in a command
+        tag = None
+        for stmt in statements:
+            if stmt.is_comment:
+                tag = None
+            elif stmt.func.startswith("clone") or stmt.func.startswith("del"):
+                if tag is not None and tag != stmt.func.split("_")[0]:
+                    raise SlideEditError(
+                        "Invalid command: Both 'clone_paragraph' and 'del_paragraph'/'del_image' are used within a single command. "
+                        "Each command must only perform one of these operations based on the quantity_change.",
+                        stmt.lineno,
+                    )
+                tag = stmt.func.split("_")[0]
+
+        program = ActionProgram(code, statements)
+        self._programs[actions] = program
+        return program
+
+    def _compile_statement(self, code: str, node: ast.stmt) -> "ActionStatement":
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            raise SlideEditError(
+                "The function definition were not allowed.", node.lineno
+            )
+        if not isinstance(node, ast.Expr) or not isinstance(node.value, ast.Call):
+            raise SlideEditError(
+                f"Only API calls are allowed, got: {ast.get_source_segment(code, node)}",
+                node.lineno,
+            )
+        call = node.value
+        if not isinstance(call.func, ast.Name):
+            raise SlideEditError(
+                f"The function {ast.unparse(call.func)} is not defined.", node.lineno
+            )
+        func = call.func.id
+        if func not in self.registered_functions:
+            raise SlideEditError(f"The function {func} is not defined.", node.lineno)
+        try:
+            args = [ast.literal_eval(arg) for arg in call.args]
+            kwargs = {kw.arg: ast.literal_eval(kw.value) for kw in call.keywords}
+        except ValueError:
+            raise SlideEditError(
+                f"Only literal arguments are allowed in {func}, got: {ast.get_source_segment(code, call)}",
+                node.lineno,
+            )
+        if None in kwargs:
+            raise SlideEditError(
+                f"Unpacking arguments is not allowed in {func}.", node.lineno
+            )
+        try:
+            self._signatures[func].bind(*args, **kwargs)
+        except TypeError as e:
+            raise SlideEditError(f"Invalid arguments for {func}: {e}", node.lineno)
+        return ActionStatement(
+            node.lineno,
+            node.end_lineno,
+            ast.get_source_segment(code, node),
+            func,
+            args,
+            kwargs,
+        )
+
+    def resumable(self, actions: str, edit_slide: SlidePage) -> bool:
+        """
+        Check if the actions can continue on the slide from the last executed actions,
+        that is, the API calls already applied to the slide are a prefix of the actions.
+
+        Args:
+            actions (str): The actions to execute.
+            edit_slide (SlidePage): The slide edited by the last executed actions.
+
+        Returns:
+            bool: Whether the actions can be executed on the slide without starting over,
+                actions failed to compile are resumable as nothing will be executed.
+        """
+        if edit_slide is not self._edit_slide:
+            return False
+        try:
+            calls = self.compile_actions(actions).calls
+        except SlideEditError:
+            return True
+        return calls[: len(self._applied)] == self._applied
+
     def execute_actions(
         self,
         actions: str,
@@ -118,6 +334,8 @@ class CodeExecutor:
     ) -> Union[tuple[str, str], None]:
         """
         Execute a series of actions on a slide.
+        When executed on the same slide again, the API calls already applied are skipped,
+        so the actions must be resumable from the previous execution (see `resumable`).
 
         Args:
             actions (str): The actions to execute.
@@ -128,63 +346,60 @@ class CodeExecutor:
             tuple: The API lines and traceback if an error occurs.
             None: If no error occurs.
         """
-        api_calls = actions.strip().split("\n")
         self.api_history.append(
             [HistoryMark.API_CALL_ERROR, edit_slide.slide_idx, actions]
         )
-        for line_idx, line in enumerate(api_calls):
-            try:
-                if line_idx == len(api_calls) - 1 and not found_code:
-                    raise SlideEditError(
-                        "No code block found in the output, please output the api calls without any prefix."
-                    )
-                if line.startswith("def"):
-                    raise SlideEditError("The function definition were not allowed.")
-                if line.startswith("#"):
+        if edit_slide is not self._edit_slide:
+            self._edit_slide = edit_slide
+            self._applied = []
+        elif not self.resumable(actions, edit_slide):
+            raise ValueError(
+                "The actions can not be resumed from the previous execution on this slide."
+            )
+        stmt = None
+        try:
+            program = self.compile_actions(actions)
+            if len(program.calls) == 0 and not found_code:
+                raise SlideEditError(
+                    "No code block found in the output, please output the api calls without any prefix."
+                )
+            for stmt in program.statements[program.resume_index(len(self._applied)) :]:
+                if stmt.is_comment:
                     if len(self.command_history) != 0:
                         self.command_history[-1][0] = HistoryMark.COMMENT_CORRECT
-                    self.command_history.append([HistoryMark.COMMENT_ERROR, line, None])
-                    continue
-                if not self.function_regex.match(line):
+                    self.command_history.append(
+                        [HistoryMark.COMMENT_ERROR, stmt.source, None]
+                    )
                     continue
-                found_code = True
-                func = line.split("(")[0]
-                if func not in self.registered_functions:
-                    raise SlideEditError(f"The function {func} is not defined.")
-                # only one of clone and del can be used in a row
-                if func.startswith("clone") or func.startswith("del"):
-                    tag = func.split("_")[0]
-                    if (
-                        self.command_history[-1][-1] is None
-                        or self.command_history[-1][-1] == tag
-                    ):
-                        self.command_history[-1][-1] = tag
-                    else:
-                        raise SlideEditError(
-                            "Invalid command: Both 'clone_paragraph' and 'del_paragraph'/'del_image' are used within a single command. "
-                            "Each command must only perform one of these operations based on the quantity_change."
-                        )
-                self.code_history.append([HistoryMark.CODE_RUN_ERROR, line, None])
-                partial_func = partial(self.registered_functions[func], edit_slide)
-                if func == "replace_image":
-                    partial_func = partial(partial_func, doc)
-                eval(line, {}, {func: partial_func})
-                self.code_history[-1][0] = HistoryMark.CODE_RUN_CORRECT
-            except Exception as e:
-                if isinstance(e, SlideEditError):
-                    logger.info(f"Encountered SlideEditError: {e}")
-                else:
-                    logger.warning(f"Encountered unknown error: {e}")
-
-                trace_msg = traceback.format_exc()
-                if len(self.code_history) != 0:
-                    self.code_history[-1][-1] = trace_msg
-                api_lines = (
-                    "\n".join(api_calls[: line_idx - 1])
-                    + f"\n--> Error Line: {line}\n"
-                    + "\n".join(api_calls[line_idx + 1 :])
+                if len(self.command_history) != 0 and (
+                    stmt.func.startswith("clone") or stmt.func.startswith("del")
+                ):
+                    self.command_history[-1][-1] = stmt.func.split("_")[0]
+                self.code_history.append(
+                    [HistoryMark.CODE_RUN_ERROR, stmt.source, None]
                 )
-                return api_lines, trace_msg
+                func = partial(self.registered_functions[stmt.func], edit_slide)
+                if stmt.func in self._doc_funcs:
+                    func = partial(func, doc)
+                func(*stmt.args, **stmt.kwargs)
+                self._applied.append(stmt)
+                self.code_history[-1][0] = HistoryMark.CODE_RUN_CORRECT
+        except Exception as e:
+            if isinstance(e, SlideEditError):
+                logger.info(f"Encountered SlideEditError: {e}")
+            else:
+                logger.warning(f"Encountered unknown error: {e}")
+
+            trace_msg = traceback.format_exc()
+            if stmt is not None and len(self.code_history) != 0:
+                self.code_history[-1][-1] = trace_msg
+            if getattr(e, "lineno", None) is not None:
+                error_lines = (e.lineno, e.lineno)
+            elif stmt is not None:
+                error_lines = (stmt.lineno, stmt.end_lineno)
+            else:
+                error_lines = None
+            return mark_error_lines(extract_code(actions), error_lines), trace_msg
         if len(self.command_history) != 0:
             self.command_history[-1][0] = HistoryMark.COMMENT_CORRECT
         self.api_history[-1][0] = HistoryMark.API_CALL_CORRECT
@@ -196,6 +411,78 @@ class CodeExecutor:
         return self
 
 
+def synthesize_actions(slide: SlidePage, command_list: list[tuple]) -> Optional[str]:
+    """
+    Translate the command list into API calls without the coder,
+    by locating the old data of each command in the slide.
+
+    Args:
+        slide (SlidePage): The template slide to edit.
+        command_list (list[tuple]): The commands of (el_name, el_type, quantity_change, old_data, new_data).
+
+    Returns:
+        str: The API calls, in the same format as the output of the coder.
+        None: If the mapping is ambiguous, e.g. the old data is not found or found more than once.
+    """
+    paragraphs = defaultdict(list)
+    images = defaultdict(list)
+    max_para_idx = {}
+    for shape in slide:
+        if isinstance(shape, Picture):
+            if shape.caption is not None:
+                images[" ".join(shape.caption.split())].append(shape.shape_idx)
+        elif shape.text_frame.is_textframe:
+            for para in shape.text_frame.paragraphs:
+                if para.idx == -1:
+                    continue
+                paragraphs[" ".join(para.text.split())].append(
+                    (shape.shape_idx, para.idx)
+                )
+                max_para_idx[shape.shape_idx] = max(
+                    max_para_idx.get(shape.shape_idx, -1), para.idx
+                )
+
+    api_calls = []
+    located = set()
+    for command in command_list:
+        _, el_type, _, old_data, new_data = command
+        index = images if el_type == "image" else paragraphs
+        locs = []
+        for old in old_data:
+            matches = index.get(" ".join(str(old).split()), [])
+            if len(matches) != 1 or matches[0] in located:
+                return None
+            locs.append(matches[0])
+            located.add(matches[0])
+        quantity_change = len(new_data) - len(old_data)
+
+        api_calls.append(f"# {command}")
+        if quantity_change > 0:
+            # cloned paragraphs are appended to the element, so the last paragraph of the command
+            # should be the last paragraph of the element
+            if el_type == "image" or len(locs) == 0:
+                return None
+            div_id, para_id = locs[-1]
+            if any(loc[0] != div_id for loc in locs) or max_para_idx[div_id] != para_id:
+                return None
+            for _ in range(quantity_change):
+                max_para_idx[div_id] += 1
+                api_calls.append(f"clone_paragraph({div_id}, {para_id})")
+                locs.append((div_id, max_para_idx[div_id]))
+        elif quantity_change < 0:
+            for loc in locs[len(new_data) :]:
+                if el_type == "image":
+                    api_calls.append(f"del_image({loc})")
+                else:
+                    api_calls.append(f"del_paragraph({loc[0]}, {loc[1]})")
+        for loc, new in zip(locs, new_data):
+            if el_type == "image":
+                api_calls.append(f"replace_image({loc}, {new!r})")
+            else:
+                api_calls.append(f"replace_paragraph({loc[0]}, {loc[1]}, {new!r})")
+    return "\n".join(api_calls)
+
+
 # supporting functions
 def element_index(slide: SlidePage, element_id: int) -> ShapeElement:
     """
@@ -211,9 +498,9 @@ def element_index(slide: SlidePage, element_id: int) -> ShapeElement:
     Raises:
         SlideEditError: If the element is not found.
     """
-    for shape in slide:
-        if shape.shape_idx == element_id:
-            return shape
+    shape = slide.get_shape(element_id)
+    if shape is not None:
+        return shape
     raise SlideEditError(
         f"Cannot find element {element_id}, is it deleted or not exist?"
     )
@@ -243,73 +530,158 @@ class TextBlock:
         run.text = self.text
 
 
-MARKDOWN_STYLES = {
-    "strong": "bold",
-    "em": "italic",
-    "code": "code",
-    "del": "strikethrough",
-}
+# inline markdown delimiters and their styles, longer delimiters first
+MARKDOWN_STYLES = (
+    ("**", "bold"),
+    ("__", "bold"),
+    ("~~", "strikethrough"),
+    ("*", "italic"),
+    ("_", "italic"),
+)
+MARKDOWN_ESCAPABLE = set("\\`*_{}[]()#+-.!~<>|")
+MARKDOWN_BLOCK_PREFIX = re.compile(
+    r"^ {0,3}(?:#{1,6}[ \t]+|[-*+][ \t]+|\d{1,9}[.)][ \t]+|>[ \t]?)"
+)
+MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\(([^)\s]*)\)")
 
 
-def process_element(element, styles=None) -> list[TextBlock]:
-    if styles is None:
-        styles = {}
+def _find_closing(text: str, delimiter: str, start: int) -> int:
+    """
+    Find the closing delimiter of an emphasis, skipping code spans and the delimiters of nested emphasis.
+    In runs longer than the delimiter, like `***`, the nested emphasis is closed first.
+    """
+    pos = start
+    while pos < len(text):
+        if text[pos] == "\\":
+            pos += 2
+        elif text[pos] == "`":
+            end = text.find("`", pos + 1)
+            pos = len(text) if end == -1 else end + 1
+        elif text[pos] == delimiter[0]:
+            run = len(text[pos:]) - len(text[pos:].lstrip(delimiter[0]))
+            closing = (
+                not text[pos - 1].isspace()
+                and run != 3 - len(delimiter)
+                and not (
+                    delimiter[0] == "_" and text[pos + run : pos + run + 1].isalnum()
+                )
+            )
+            if closing:
+                return pos + run - len(delimiter)
+            pos += run
+        else:
+            pos += 1
+    return -1
 
-    result = []
 
-    if isinstance(element, str):
-        result.append(TextBlock(element, **styles))
-    else:
-        if element.name == "a":
-            new_styles = styles.copy()
-            for child in element.children:
-                blocks = process_element(child, new_styles)
-                for block in blocks:
-                    block.href = element.get("href")
-                result.extend(blocks)
-        elif MARKDOWN_STYLES.get(element.name):
-            new_styles = styles.copy()
-            new_styles[MARKDOWN_STYLES[element.name]] = True
-            for child in element.children:
-                result.extend(process_element(child, new_styles))
-        else:
-            for child in element.children:
-                result.extend(process_element(child, styles))
+def tokenize_markdown(text: str, styles: Optional[dict] = None) -> list[TextBlock]:
+    """
+    Split inline markdown into styled text blocks: bold, italic, code, strikethrough and links.
+    Block markers like headings and list bullets are dropped, as the paragraph keeps its own style.
 
-    return result
+    Args:
+        text (str): The markdown text.
+        styles (Optional[dict]): The styles of the enclosing emphasis.
+
+    Returns:
+        list[TextBlock]: The text blocks, adjacent text of the same style is merged.
+    """
+    if styles is None:
+        styles = {}
+        text = "\n".join(
+            MARKDOWN_BLOCK_PREFIX.sub("", line) for line in text.strip().splitlines()
+        )
+    blocks = []
+    chars = []
+
+    def flush():
+        if chars:
+            blocks.append(TextBlock("".join(chars), **styles))
+            chars.clear()
+
+    pos = 0
+    while pos < len(text):
+        char = text[pos]
+        if char == "\\" and text[pos + 1 : pos + 2] in MARKDOWN_ESCAPABLE:
+            chars.append(text[pos + 1])
+            pos += 2
+            continue
+        if char == "`" and (end := text.find("`", pos + 1)) != -1:
+            flush()
+            blocks.append(TextBlock(text[pos + 1 : end], **(styles | {"code": True})))
+            pos = end + 1
+            continue
+        if char == "[" and (link := MARKDOWN_LINK.match(text, pos)) is not None:
+            flush()
+            for block in tokenize_markdown(link.group(1), styles):
+                block.href = link.group(2)
+                blocks.append(block)
+            pos = link.end()
+            continue
+        for delimiter, style in MARKDOWN_STYLES:
+            inner = pos + len(delimiter)
+            # a single delimiter can't open at a longer run, like an unclosed `**`
+            if (
+                not text.startswith(delimiter, pos)
+                or inner >= len(text)
+                or text[inner].isspace()
+                or (len(delimiter) == 1 and text[inner] == delimiter)
+                or (delimiter[0] == "_" and pos > 0 and text[pos - 1].isalnum())
+            ):
+                continue
+            end = _find_closing(text, delimiter, inner)
+            if end <= inner:
+                continue
+            flush()
+            blocks.extend(tokenize_markdown(text[inner:end], styles | {style: True}))
+            pos = end + len(delimiter)
+            break
+        else:
+            chars.append(char)
+            pos += 1
+    flush()
+    return blocks
 
 
-def replace_para(paragraph_id: int, new_text: str, shape: BaseShape):
+def replace_para(
+    paragraph_id: int, new_text: str, shape: Union[BaseShape, EditTransaction]
+):
     """
     Replace the text of a paragraph in a shape.
     """
-    para = shape.text_frame.paragraphs[paragraph_id]
-    html = markdown(new_text).strip()
-    soup = BeautifulSoup(html, "html.parser")
-    blocks = process_element(soup)
+    para = EditTransaction.wrap(shape).paragraphs[paragraph_id]
+    blocks = tokenize_markdown(new_text)
 
-    empty_run = runs_merge(para)
+    empty_run = runs_merge(para, convert_fields=True)
     empty_run.text = ""
     for _ in range(len(blocks) - 1):
-        empty_run._r.addnext(parse_xml(empty_run._r.xml))
+        empty_run._r.addnext(deepcopy(empty_run._r))
     for block, run in zip(blocks, para.runs):
         block.build_run(run)
 
 
-def clone_para(paragraph_id: int, shape: BaseShape):
+def clone_para(paragraph_id: int, shape: Union[BaseShape, EditTransaction]):
     """
     Clone a paragraph in a shape.
     """
-    para = shape.text_frame.paragraphs[paragraph_id]
-    shape.text_frame.paragraphs[-1]._element.addnext(parse_xml(para._element.xml))
+    EditTransaction.wrap(shape).clone_paragraph(paragraph_id)
 
 
-def del_para(paragraph_id: int, shape: BaseShape):
+def del_para(paragraph_id: int, shape: Union[BaseShape, EditTransaction]):
     """
     Delete a paragraph from a shape.
     """
-    para = shape.text_frame.paragraphs[paragraph_id]
-    para._element.getparent().remove(para._element)
+    EditTransaction.wrap(shape).delete_paragraph(paragraph_id)
+
+
+def resize_text(font_size: float, shape: BaseShape):
+    """
+    Set the font size of all paragraphs in a shape.
+    """
+    for para in shape.text_frame.paragraphs:
+        para.font.size = Pt(font_size)
+        for run in para.runs:
+            run.font.size = Pt(font_size)
 
 
 def add_table(table_data: list[list[str]], table: PPTXGraphicFrame):
@@ -348,6 +720,7 @@ def del_paragraph(slide: SlidePage, div_id: int, paragraph_id: int):
             shape._closures["delete"].append(
                 Closure(partial(del_para, para.real_idx), para.real_idx)
             )
+            slide.clear_cache(shape)
             return
     else:
         raise SlideEditError(
@@ -366,7 +739,7 @@ def del_image(slide: SlidePage, figure_id: int):
     """
     shape = element_index(slide, figure_id)
     assert isinstance(shape, Picture), "The element is not a Picture."
-    slide.shapes.remove(shape)
+    slide.remove_shape(shape)
 
 
 def replace_paragraph(slide: SlidePage, div_id: int, paragraph_id: int, text: str):
@@ -395,6 +768,7 @@ def replace_paragraph(slide: SlidePage, div_id: int, paragraph_id: int, text: st
                     para.real_idx,
                 )
             )
+            slide.clear_cache(shape)
             return
     else:
         raise SlideEditError(
@@ -405,6 +779,27 @@ def replace_paragraph(slide: SlidePage, div_id: int, paragraph_id: int, text: st
         )
 
 
+def set_font_size(slide: SlidePage, div_id: int, font_size: float):
+    """
+    Set the font size of an element in a slide, used to shrink text to fit its text box.
+
+    Args:
+        slide (SlidePage): The slide containing the element.
+        div_id (int): The ID of the element.
+        font_size (float): The font size in points.
+    """
+    shape = element_index(slide, div_id)
+    assert (
+        shape.text_frame.is_textframe
+    ), "The element does not have a text frame, please check the element id and type of element."
+    shape.text_frame.font = shape.text_frame.font | {"size": font_size}
+    for para in shape.text_frame.paragraphs:
+        if para.idx != -1:
+            para.font = para.font | {"size": font_size}
+    shape._closures["style"].append(Closure(partial(resize_text, font_size)))
+    slide.clear_cache(shape)
+
+
 def replace_image(slide: SlidePage, doc: Document, img_id: int, image_path: str):
     """
     Replace an image in a slide.
@@ -423,6 +818,7 @@ def replace_image(slide: SlidePage, doc: Document, img_id: int, image_path: str)
         )
     shape = element_index(slide, img_id)
     assert isinstance(shape, Picture), "The element is not a Picture."
+    slide.clear_cache(shape)
 
     try:
         if TABLE_REGEX.match(image_path):
@@ -472,6 +868,7 @@ def clone_paragraph(slide: SlidePage, div_id: int, paragraph_id: int):
                 para.real_idx,
             )
         )
+        slide.clear_cache(shape)
         return
     raise SlideEditError(
         f"Cannot find the paragraph {paragraph_id} of the element {div_id}, may refer to a non-existed paragraph."
@@ -495,6 +892,8 @@ class API_TYPES(Enum):
         replace_paragraph,
         del_paragraph,
     ]
+    # not documented for the coder, applied to the slides after editing
+    Style = [set_font_size]
 
     @classmethod
     def all_funcs(cls) -> dict[str, callable]:
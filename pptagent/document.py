@@ -3,6 +3,7 @@ import re
 import traceback
 from dataclasses import asdict, dataclass
 from datetime import datetime
+from functools import cached_property
 from hashlib import md5
 from typing import Any, Optional
 
@@ -13,8 +14,9 @@ from mistune import html as markdown
 
 from pptagent.agent import Agent, AsyncAgent
 from pptagent.llms import LLM, AsyncLLM
+from pptagent.multimodal import CaptionStore
 from pptagent.utils import (
-    edit_distance,
+    FuzzyIndex,
     get_logger,
     markdown_table_to_image,
     package_join,
@@ -152,6 +154,10 @@ class SubSection:
         if self.medias is not None:
             yield from self.medias
 
+    @property
+    def content_source(self) -> str:
+        return f"Paragraph: {self.title}\nContent: {self.content}\n"
+
 
 @dataclass
 class Section:
@@ -170,19 +176,17 @@ class Section:
             ],
         )
 
+    @cached_property
+    def index(self) -> FuzzyIndex[SubSection]:
+        return FuzzyIndex((subsec.title, subsec) for subsec in self.subsections)
+
     def __contains__(self, key: str):
-        for subsection in self.subsections:
-            if subsection.title == key:
-                return True
-        return False
+        return key in self.index
 
     def __getitem__(self, key: str):
-        for subsection in self.subsections:
-            if subsection.title == key:
-                return subsection
-        sim_subsec = max(self.subsections, key=lambda x: edit_distance(x.title, key))
-        if edit_distance(sim_subsec.title, key) > 0.8:
-            return sim_subsec
+        subsection, similarity = self.index.match(key)
+        if similarity > 0.8:
+            return subsection
         raise KeyError(
             f"subsection not found: {key}, available subsections of {self.title} are: {[subsection.title for subsection in self.subsections]}"
         )
@@ -343,6 +347,7 @@ class Document:
         language_model: LLM,
         vision_model: LLM,
         image_dir: str,
+        caption_store: Optional[CaptionStore] = None,
     ):
         doc_extractor = Agent(
             "doc_extractor",
@@ -375,12 +380,19 @@ class Document:
                 )
                 media.parse_table(language_model)
             else:
-                media.caption = vision_model(
-                    IMAGE_CAPTION_PROMPT.render(
-                        markdown_caption=media.markdown_caption,
-                    ),
-                    media.path,
+                prompt = IMAGE_CAPTION_PROMPT.render(
+                    markdown_caption=media.markdown_caption,
                 )
+                if caption_store is not None:
+                    media.caption = caption_store.get(
+                        media.path, vision_model.model, prompt
+                    )
+                if media.caption is None:
+                    media.caption = vision_model(prompt, media.path)
+                    if caption_store is not None:
+                        caption_store.set(
+                            media.path, vision_model.model, prompt, media.caption
+                        )
         return document
 
     @classmethod
@@ -390,6 +402,7 @@ class Document:
         language_model: AsyncLLM,
         vision_model: AsyncLLM,
         image_dir: str,
+        caption_store: Optional[CaptionStore] = None,
     ):
         doc_extractor = AsyncAgent(
             "doc_extractor",
@@ -439,29 +452,46 @@ class Document:
                 )
                 await media.parse_table_async(language_model)
             else:
-                task = vision_model(
-                    IMAGE_CAPTION_PROMPT.render(
-                        markdown_caption=media.markdown_caption,
-                    ),
-                    media.path,
+                prompt = IMAGE_CAPTION_PROMPT.render(
+                    markdown_caption=media.markdown_caption,
                 )
+                if caption_store is not None:
+                    media.caption = caption_store.get(
+                        media.path, vision_model.model, prompt
+                    )
+                    if media.caption is not None:
+                        continue
+                task = vision_model(prompt, media.path)
             caption_tasks.append((media, task))
 
         for media, task in caption_tasks:
             media.caption = await task
+            if caption_store is not None and not isinstance(media, Table):
+                caption_store.set(
+                    media.path,
+                    vision_model.model,
+                    IMAGE_CAPTION_PROMPT.render(
+                        markdown_caption=media.markdown_caption
+                    ),
+                    media.caption,
+                )
 
         return document
 
+    @cached_property
+    def section_index(self) -> FuzzyIndex[Section]:
+        return FuzzyIndex((section.title, section) for section in self.sections)
+
+    @cached_property
+    def subsection_index(self) -> FuzzyIndex[SubSection]:
+        return FuzzyIndex((subsec.title, subsec) for subsec in self.subsections)
+
     def __contains__(self, key: str):
-        for section in self.sections:
-            if section.title == key:
-                return True
-        return False
+        return key in self.section_index
 
     def __getitem__(self, key: str):
-        for section in self.sections:
-            if section.title == key:
-                return section
+        if key in self.section_index:
+            return self.section_index.exact[key]
         raise KeyError(
             f"section not found: {key}, available sections: {[section.title for section in self.sections]}"
         )
@@ -480,49 +510,32 @@ class Document:
         ), "subsection_keys for index must be a dict, follow a two-level structure"
         subsecs = []
         for sec_key, subsec_keys in indexs.items():
-            if sec_key in self:
-                section = self[sec_key]
-            else:
-                section = max(
-                    self.sections, key=lambda x: edit_distance(x.title, sec_key)
+            section, similarity = self.section_index.match(sec_key)
+            if similarity < sim_bound:
+                logger.warning("section not found: %s", sec_key)
+                raise ValueError(
+                    f"section not found: {sec_key}, available sections: {[section.title for section in self.sections]}"
                 )
-                if edit_distance(section.title, sec_key) < sim_bound:
-                    logger.warning(
-                        "section not found: %s, available sections: {[section.title for section in self.sections]}",
-                        sec_key,
-                    )
-                    raise ValueError(
-                        "section not found: %s, available sections: {[section.title for section in self.sections]}"
-                    )
             for subsec_key in subsec_keys:
-                if subsec_key in section:
-                    retr = section[subsec_key]
-                else:
-                    retr = max(
-                        section.subsections,
-                        key=lambda x: edit_distance(x.title, subsec_key),
+                retr, similarity = section.index.match(subsec_key)
+                if similarity < sim_bound and from_all:
+                    retr, similarity = self.subsection_index.match(subsec_key)
+                if similarity < sim_bound:
+                    raise ValueError(
+                        f"subsection not found: {subsec_key} in section {section.title}, available subsections: {[subsection.title for subsection in section.subsections]}"
                     )
-                    if edit_distance(retr.title, subsec_key) < sim_bound and from_all:
-                        retr = max(
-                            self.subsections,
-                            key=lambda x: edit_distance(x.title, subsec_key),
-                        )
-                    if edit_distance(retr.title, subsec_key) < sim_bound:
-                        raise ValueError(
-                            "subsection not found: %s in section %s, available subsections: {[subsection.title for subsection in section.subsections]}",
-                            subsec_key,
-                            section.title,
-                        )
 
                 subsecs.append(retr)
 
         return subsecs
 
-    @property
+    # The properties below are cached on first access,
+    # as a document is not modified once it has been refined.
+    @cached_property
     def metainfo(self):
         return "\n".join([f"{k}: {v}" for k, v in self.metadata.items()])
 
-    @property
+    @cached_property
     def overview(self):
         overview = self.to_dict()
         for section in overview["sections"]:
@@ -530,7 +543,7 @@ class Document:
                 subsection.pop("content")
         return overview
 
-    @property
+    @cached_property
     def subsections(self):
         return [subsec for section in self.sections for subsec in section.subsections]
 
@@ -549,7 +562,7 @@ class OutlineItem:
         content = ""
         images = []
         for subsection in subsections:
-            content += f"Paragraph: {subsection.title}\nContent: {subsection.content}\n"
+            content += subsection.content_source
             if subsection.medias is not None:
                 for media in subsection.medias:
                     images.append(
@@ -1,6 +1,9 @@
+from collections import Counter
 from dataclasses import asdict, dataclass
-from typing import Literal
+from typing import Literal, Optional
 
+from pptagent.presentation import SlidePage
+from pptagent.text_fit import MIN_FONT_SCALE, TextArea
 from pptagent.utils import pbasename, pexists, pjoin
 
 
@@ -13,11 +16,13 @@ class Element:
     suggested_characters: int | None
     variable_length: tuple[int, int] | None
     variable_data: dict[str, list[str]] | None
+    text_area: Optional[TextArea] = None
 
     def get_schema(self):
         schema = asdict(self)
         schema.pop("content")
         schema.pop("variable_data")
+        schema.pop("text_area")
         if self.el_type == "image":
             schema.pop("suggested_characters")
         if self.variable_length is None:
@@ -88,6 +93,42 @@ class Layout:
             vary_mapping=data.get("vary_mapping", None),
         )
 
+    def locate_text_areas(self, slide: SlidePage):
+        """
+        Locate the text box of each text element in the template slide, for fitting the text of the editor.
+        Elements spread over several shapes or sharing a shape, shapes without explicit font sizes
+        and layouts with variable elements, which are edited on other template slides, are left to the character limit.
+        """
+        if self.vary_mapping is not None:
+            return
+        paragraphs = {}
+        for shape in slide:
+            if not shape.text_frame.is_textframe:
+                continue
+            for para in shape.text_frame.paragraphs:
+                if para.idx != -1:
+                    key = " ".join(para.text.split())
+                    paragraphs[key] = None if key in paragraphs else shape
+        located = {}
+        for el in self.elements:
+            shapes = {paragraphs.get(" ".join(str(i).split())) for i in el.content}
+            if el.el_type == "text" and len(shapes) == 1 and None not in shapes:
+                located[el.el_name] = shapes.pop()
+        shared = Counter(shape.shape_idx for shape in located.values())
+        for el_name, shape in located.items():
+            if shared[shape.shape_idx] == 1:
+                self[el_name].text_area = TextArea.from_shape(shape)
+
+    def resize_actions(self, editor_output: dict) -> str:
+        """
+        Get the API calls applying the font sizes shrunk by `validate` to fit the text.
+        """
+        return "\n".join(
+            f"set_font_size({self[el_name].text_area.shape_idx}, {el_data['font_size']})"
+            for el_name, el_data in editor_output.items()
+            if el_data.get("font_size") is not None
+        )
+
     def __getitem__(self, key: str):
         for el in self.elements:
             if el.el_name == key:
@@ -125,7 +166,20 @@ class Layout:
                             or ["/path/to/image", "..."] for image elements
                         },
                     }"""
-            if length_factor is not None:
+            text_area = self[el_name].text_area
+            if length_factor is not None and text_area is not None:
+                # fit the text to its text box locally, only overflowing content is sent back to the editor
+                if not isinstance(el_data["data"], list):
+                    el_data["data"] = [el_data["data"]]
+                fitted = text_area.fit(el_data["data"])
+                if fitted is None:
+                    raise ValueError(
+                        f"Content for '{el_name}' overflows its text box even with the font shrunk to {MIN_FONT_SCALE:.0%}. "
+                        f"Please reduce the content length to maintain slide readability and visual balance. "
+                        f"Current text: '{el_data['data']}'"
+                    )
+                el_data["data"], el_data["font_size"] = fitted
+            elif length_factor is not None:
                 charater_counts = [len(i) for i in el_data["data"]]
                 if (
                     max(charater_counts)
@@ -1,17 +1,74 @@
 import base64
+import io
+import os
 import re
 import threading
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, Union
 
 import torch
 from oaib import Auto
 from openai import OpenAI
+from PIL import Image
 
 from pptagent.utils import get_json_from_response, get_logger, tenacity
 
 logger = get_logger(__name__)
 
+IMAGE_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+@lru_cache(maxsize=256)
+def _encode_image(
+    image_path: str, mtime_ns: int, max_side: int, image_format: str, quality: int
+) -> str:
+    with Image.open(image_path) as image:
+        image.load()
+    # keep the original bytes if it's already small enough and in the target format
+    if image.format == image_format and (max_side <= 0 or max(image.size) <= max_side):
+        with open(image_path, "rb") as f:
+            data = f.read()
+    else:
+        if max_side > 0 and max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        if image_format == "JPEG" and image.mode == "RGBA":
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=quality)
+        data = buffer.getvalue()
+    payload = base64.b64encode(data).decode("utf-8")
+    return f"data:{IMAGE_MIME_TYPES[image_format]};base64,{payload}"
+
+
+def encode_image(
+    image_path: str, max_side: int = 1024, image_format: str = "JPEG", quality: int = 85
+) -> str:
+    """
+    Downsize and re-encode an image to a base64 data URL.
+    Results are cached by path, modification time and the encoding settings.
+
+    Args:
+        image_path (str): The path to the image.
+        max_side (int): The maximum side length, images are not resized if it is 0.
+        image_format (str): The output format, JPEG or WEBP.
+        quality (int): The quality of the output image.
+
+    Returns:
+        str: The data URL of the encoded image.
+    """
+    image_format = image_format.upper()
+    assert (
+        image_format in IMAGE_MIME_TYPES
+    ), f"image_format should be one of {list(IMAGE_MIME_TYPES)}, but got {image_format}"
+    return _encode_image(
+        image_path, os.stat(image_path).st_mtime_ns, max_side, image_format, quality
+    )
+
 
 @dataclass
 class LLM:
@@ -23,6 +80,8 @@ class LLM:
     base_url: Optional[str] = None
     api_key: Optional[str] = None
     timeout: int = 360
+    image_max_side: int = 1024
+    image_format: str = "JPEG"
 
     def __post_init__(self):
         self.client = OpenAI(
@@ -144,15 +203,16 @@ class LLM:
         if images is not None:
             for image in images:
                 try:
-                    with open(image, "rb") as f:
-                        message[0]["content"].append(
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64.b64encode(f.read()).decode('utf-8')}"
-                                },
-                            }
-                        )
+                    message[0]["content"].append(
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": encode_image(
+                                    image, self.image_max_side, self.image_format
+                                )
+                            },
+                        }
+                    )
                 except Exception as e:
                     logger.error("Failed to load image %s: %s", image, e)
         return system, message
@@ -194,6 +254,8 @@ class LLM:
             base_url=self.base_url,
             api_key=self.api_key,
             timeout=self.timeout,
+            image_max_side=self.image_max_side,
+            image_format=self.image_format,
         )
 
 
@@ -343,7 +405,14 @@ class AsyncLLM(LLM):
         """
         Convert the AsyncLLM to a synchronous LLM.
         """
-        return LLM(model=self.model, base_url=self.base_url, api_key=self.api_key)
+        return LLM(
+            model=self.model,
+            base_url=self.base_url,
+            api_key=self.api_key,
+            timeout=self.timeout,
+            image_max_side=self.image_max_side,
+            image_format=self.image_format,
+        )
 
 
 def get_model_abbr(llms: Union[LLM, list[LLM]]) -> str:
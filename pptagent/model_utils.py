@@ -1,19 +1,35 @@
 import json
+import multiprocessing
 import os
+import re
+import shutil
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
+from hashlib import md5
+from itertools import repeat
+from typing import Optional
 
 import numpy as np
 import torch
 import torchvision.transforms as T
 from marker.config.parser import ConfigParser
 from marker.converters.pdf import PdfConverter
+from marker.models import create_model_dict
 from marker.output import text_from_rendered
 from PIL import Image
+from PyPDF2 import PdfReader
 from transformers import AutoFeatureExtractor, AutoModel
 
 from pptagent.llms import LLM
 from pptagent.presentation import Presentation, SlidePage
-from pptagent.utils import is_image_path, pjoin
+from pptagent.utils import get_logger, is_image_path, pexists, pjoin
+
+logger = get_logger(__name__)
+
+# marker's page separator when `paginate_output` is enabled: "\n\n{page_id}------...\n\n"
+PAGE_SEPARATOR = re.compile(r"\n*\{(\d+)\}-{48}\n\n")
+PAGE_IMAGE = re.compile(r"^_page_(\d+)_")
 
 
 def prs_dedup(
@@ -71,26 +87,41 @@ def get_image_model(device: str = None):
     )
 
 
-def parse_pdf(
-    pdf_path: str,
-    output_path: str,
-    model_lst: list,
-) -> str:
+def pdf_page_hashes(pdf_path: str) -> list[str]:
     """
-    Parse a PDF file and extract text and images.
+    Hash the content of each page in a PDF file, including its content stream and embedded objects.
 
     Args:
         pdf_path (str): The path to the PDF file.
-        output_path (str): The directory to save the extracted content.
-        model_lst (list): A list of models for processing the PDF.
 
     Returns:
-        str: The full text extracted from the PDF.
+        list[str]: The md5 hash of each page.
+    """
+    page_hashes = []
+    for page in PdfReader(pdf_path).pages:
+        digest = md5(str(page.mediabox).encode())
+        contents = page.get_contents()
+        if contents is not None:
+            digest.update(contents.get_data())
+        resources = page.get("/Resources")
+        xobjects = resources.get_object().get("/XObject") if resources else None
+        xobjects = xobjects.get_object() if xobjects else {}
+        for name in sorted(xobjects):
+            digest.update(name.encode())
+            digest.update(xobjects[name].get_object().get_data())
+        page_hashes.append(digest.hexdigest())
+    return page_hashes
+
+
+def _convert_pages(pdf_path: str, page_range: list[int], model_lst: dict) -> dict:
+    """
+    Convert a range of pages with marker, and split the result by pages.
     """
-    os.makedirs(output_path, exist_ok=True)
     config_parser = ConfigParser(
         {
             "output_format": "markdown",
+            "paginate_output": True,
+            "page_range": ",".join(str(page_idx) for page_idx in page_range),
         }
     )
     converter = PdfConverter(
@@ -101,13 +132,183 @@ def parse_pdf(
     )
     rendered = converter(pdf_path)
     full_text, _, images = text_from_rendered(rendered)
+
+    pages = {
+        page_idx: {"markdown": "", "images": {}, "metadata": defaultdict(list)}
+        for page_idx in page_range
+    }
+    parts = PAGE_SEPARATOR.split(full_text)
+    pages[page_range[0]]["markdown"] = parts[0].strip()
+    for page_idx, markdown in zip(parts[1::2], parts[2::2]):
+        page = pages[int(page_idx)]
+        page["markdown"] = (page["markdown"] + "\n\n" + markdown.strip()).strip()
+    for filename, image in images.items():
+        match = PAGE_IMAGE.match(filename)
+        page_idx = int(match.group(1)) if match else page_range[0]
+        pages[page_idx]["images"][filename] = image
+    for key, items in rendered.metadata.items():
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            page_idx = item.get("page_id") if isinstance(item, dict) else None
+            pages[page_idx if page_idx in pages else page_range[0]]["metadata"][
+                key
+            ].append(item)
+    return pages
+
+
+_worker_models = None
+
+
+def _init_marker_worker(device: str):
+    global _worker_models
+    _worker_models = create_model_dict(device=device)
+
+
+def _convert_pages_in_worker(pdf_path: str, page_range: list[int]) -> dict:
+    return _convert_pages(pdf_path, page_range, _worker_models)
+
+
+def _rename_page(page: dict, old_idx: int, new_idx: int) -> dict:
+    """
+    Rename the images of a cached page whose position in the PDF has changed.
+    """
+    if old_idx == new_idx:
+        return page
+    old_prefix, new_prefix = f"_page_{old_idx}_", f"_page_{new_idx}_"
+    page["markdown"] = page["markdown"].replace(old_prefix, new_prefix)
+    page["images"] = {
+        filename.replace(old_prefix, new_prefix, 1): cached_name
+        for filename, cached_name in page["images"].items()
+    }
+    for items in page["metadata"].values():
+        for item in items:
+            if isinstance(item, dict) and "page_id" in item:
+                item["page_id"] = new_idx
+    return page
+
+
+def _load_cached_page(
+    cache_dir: str, page_hash: str, page_idx: int, output_path: str
+) -> Optional[dict]:
+    """
+    Load a parsed page from the cache and copy its images to the output directory.
+    """
+    page_dir = pjoin(cache_dir, page_hash)
+    if not pexists(pjoin(page_dir, "page.json")):
+        return None
+    with open(pjoin(page_dir, "page.json"), encoding="utf-8") as f:
+        page = json.load(f)
+    page = _rename_page(page, page.pop("page_idx"), page_idx)
+    for filename, cached_name in page["images"].items():
+        shutil.copy(pjoin(page_dir, cached_name), pjoin(output_path, filename))
+    return page
+
+
+def _save_cached_page(
+    cache_dir: str, page_hash: str, page_idx: int, page: dict, output_path: str
+):
+    """
+    Save a parsed page to the cache, `page.json` is written last to mark the entry as complete.
+    """
+    page_dir = pjoin(cache_dir, page_hash)
+    os.makedirs(page_dir, exist_ok=True)
+    for filename in page["images"]:
+        shutil.copy(pjoin(output_path, filename), pjoin(page_dir, filename))
+    tmp_file = pjoin(page_dir, f"page.json.{os.getpid()}")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump({"page_idx": page_idx, **page}, f, ensure_ascii=False)
+    os.replace(tmp_file, pjoin(page_dir, "page.json"))
+
+
+def parse_pdf(
+    pdf_path: str,
+    output_path: str,
+    model_lst: Optional[dict] = None,
+    num_workers: int = 1,
+    pages_per_shard: int = 16,
+    cache_dir: Optional[str] = None,
+) -> str:
+    """
+    Parse a PDF file and extract text and images.
+
+    Pages are converted in shards of consecutive pages, either sequentially with `model_lst`,
+    or in parallel by `num_workers` processes each loading its own marker models on CPU.
+    With `cache_dir`, the result of each page is cached by the hash of its content,
+    so only the changed pages of a revised PDF are parsed again.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        output_path (str): The directory to save the extracted content.
+        model_lst (dict): The marker models, required when `num_workers` is 1.
+        num_workers (int): The number of worker processes.
+        pages_per_shard (int): The maximum number of pages converted in one marker call.
+        cache_dir (Optional[str]): The directory of the page cache.
+
+    Returns:
+        str: The full text extracted from the PDF.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    page_hashes = pdf_page_hashes(pdf_path)
+    pages = {}
+    if cache_dir is not None:
+        for page_idx, page_hash in enumerate(page_hashes):
+            page = _load_cached_page(cache_dir, page_hash, page_idx, output_path)
+            if page is not None:
+                pages[page_idx] = page
+    missing_pages = [i for i in range(len(page_hashes)) if i not in pages]
+    shards = [
+        missing_pages[i : i + pages_per_shard]
+        for i in range(0, len(missing_pages), pages_per_shard)
+    ]
+    logger.info(
+        "parsing %d/%d pages of %s in %d shards",
+        len(missing_pages),
+        len(page_hashes),
+        pdf_path,
+        len(shards),
+    )
+
+    executor = None
+    if num_workers > 1 and len(shards) > 1:
+        executor = ProcessPoolExecutor(
+            min(num_workers, len(shards)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_marker_worker,
+            initargs=("cpu",),
+        )
+        results = executor.map(_convert_pages_in_worker, repeat(pdf_path), shards)
+    else:
+        assert model_lst is not None, "model_lst is required for parsing in process"
+        results = (_convert_pages(pdf_path, shard, model_lst) for shard in shards)
+    try:
+        for shard_pages in results:
+            for page_idx, page in shard_pages.items():
+                for filename, image in page["images"].items():
+                    image.save(pjoin(output_path, filename), "JPEG")
+                page["images"] = {filename: filename for filename in page["images"]}
+                if cache_dir is not None:
+                    _save_cached_page(
+                        cache_dir, page_hashes[page_idx], page_idx, page, output_path
+                    )
+                pages[page_idx] = page
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    full_text = "\n\n".join(
+        pages[page_idx]["markdown"]
+        for page_idx in sorted(pages)
+        if pages[page_idx]["markdown"]
+    )
+    metadata = defaultdict(list)
+    for page_idx in sorted(pages):
+        for key, items in pages[page_idx]["metadata"].items():
+            metadata[key].extend(items)
     with open(pjoin(output_path, "source.md"), "w+", encoding="utf-8") as f:
         f.write(full_text)
-    for filename, image in images.items():
-        image_filepath = os.path.join(output_path, filename)
-        image.save(image_filepath, "JPEG")
     with open(pjoin(output_path, "meta.json"), "w+") as f:
-        f.write(json.dumps(rendered.metadata, indent=4))
+        f.write(json.dumps(metadata, indent=4))
 
     return full_text
 
@@ -1,13 +1,73 @@
 import asyncio
+import os
+import re
+from hashlib import sha1
 from typing import Optional
 
 import PIL.Image
 
 from pptagent.llms import LLM, AsyncLLM
 from pptagent.presentation import Picture, Presentation
-from pptagent.utils import Config, get_logger, package_join, pbasename, pjoin
+from pptagent.utils import Config, get_logger, package_join, pbasename, pexists, pjoin
 
 logger = get_logger(__name__)
+SHA1_REGEX = re.compile(r"^[0-9a-f]{40}$")
+
+
+class CaptionStore:
+    """
+    A persistent store of image captions shared across templates and documents.
+    Captions are keyed by the content hash of the image, the vision model and the caption prompt.
+    """
+
+    def __init__(self, store_dir: str):
+        """
+        Initialize the CaptionStore.
+
+        Args:
+            store_dir (str): The directory to store captions in.
+        """
+        self.store_dir = store_dir
+        self.captions: dict[str, str] = {}
+        os.makedirs(store_dir, exist_ok=True)
+
+    @staticmethod
+    def image_hash(image_path: str) -> str:
+        """
+        Get the sha1 of an image, images extracted from presentations are already named by it.
+        """
+        stem = pbasename(image_path).rsplit(".", 1)[0]
+        if SHA1_REGEX.match(stem):
+            return stem
+        with open(image_path, "rb") as f:
+            return sha1(f.read()).hexdigest()
+
+    def _key(self, image_path: str, model: str, prompt: str) -> str:
+        model = re.sub(r"[^\w.-]", "_", model)
+        prompt_hash = sha1(prompt.encode()).hexdigest()[:8]
+        return pjoin(model, f"{self.image_hash(image_path)}-{prompt_hash}.txt")
+
+    def get(self, image_path: str, model: str, prompt: str) -> Optional[str]:
+        """
+        Get the caption of an image, or None if it has not been captioned by the model.
+        """
+        key = self._key(image_path, model, prompt)
+        if key not in self.captions and pexists(pjoin(self.store_dir, key)):
+            with open(pjoin(self.store_dir, key), encoding="utf-8") as f:
+                self.captions[key] = f.read()
+        return self.captions.get(key, None)
+
+    def set(self, image_path: str, model: str, prompt: str, caption: str):
+        """
+        Save the caption of an image.
+        """
+        key = self._key(image_path, model, prompt)
+        self.captions[key] = caption
+        caption_file = pjoin(self.store_dir, key)
+        os.makedirs(os.path.dirname(caption_file), exist_ok=True)
+        with open(f"{caption_file}.{os.getpid()}", "w", encoding="utf-8") as f:
+            f.write(caption)
+        os.replace(f"{caption_file}.{os.getpid()}", caption_file)
 
 
 class ImageLabler:
@@ -40,13 +100,17 @@ class ImageLabler:
             for shape in slide.shape_filter(Picture):
                 stats = image_stats[pbasename(shape.img_path)]
                 shape.caption = stats["caption"]
+            slide.clear_cache()
 
-    async def caption_images_async(self, vision_model: AsyncLLM):
+    async def caption_images_async(
+        self, vision_model: AsyncLLM, caption_store: Optional[CaptionStore] = None
+    ):
         """
         Generate captions for images in the presentation asynchronously.
 
         Args:
             vision_model (AsyncLLM): The async vision model to use for captioning.
+            caption_store (Optional[CaptionStore]): The store to look up and save captions.
 
         Returns:
             dict: Dictionary containing image stats with captions.
@@ -58,25 +122,43 @@ class ImageLabler:
 
         caption_tasks = {}
         for image, stats in self.image_stats.items():
-            if "caption" not in stats:
-                task = vision_model(caption_prompt, pjoin(self.config.IMAGE_DIR, image))
-                caption_tasks[image] = task
+            if "caption" in stats:
+                continue
+            image_path = pjoin(self.config.IMAGE_DIR, image)
+            if caption_store is not None:
+                caption = caption_store.get(
+                    image_path, vision_model.model, caption_prompt
+                )
+                if caption is not None:
+                    stats["caption"] = caption
+                    continue
+            caption_tasks[image] = vision_model(caption_prompt, image_path)
 
         if caption_tasks:
             results = await asyncio.gather(*caption_tasks.values())
             for image, caption in zip(caption_tasks.keys(), results):
                 self.image_stats[image]["caption"] = caption
                 logger.info("captioned %s: %s", image, caption)
+                if caption_store is not None:
+                    caption_store.set(
+                        pjoin(self.config.IMAGE_DIR, image),
+                        vision_model.model,
+                        caption_prompt,
+                        caption,
+                    )
 
         self.apply_stats()
         return self.image_stats
 
-    def caption_images(self, vision_model: LLM):
+    def caption_images(
+        self, vision_model: LLM, caption_store: Optional[CaptionStore] = None
+    ):
         """
         Generate captions for images in the presentation.
 
         Args:
             vision_model (LLM): The vision model to use for captioning.
+            caption_store (Optional[CaptionStore]): The store to look up and save captions.
 
         Returns:
             dict: Dictionary containing image stats with captions.
@@ -84,11 +166,20 @@ class ImageLabler:
         assert isinstance(vision_model, LLM), "vision_model must be an LLM instance"
         caption_prompt = open(package_join("prompts", "caption.txt")).read()
         for image, stats in self.image_stats.items():
-            if "caption" not in stats:
-                stats["caption"] = vision_model(
-                    caption_prompt, pjoin(self.config.IMAGE_DIR, image)
+            if "caption" in stats:
+                continue
+            image_path = pjoin(self.config.IMAGE_DIR, image)
+            if caption_store is not None:
+                stats["caption"] = caption_store.get(
+                    image_path, vision_model.model, caption_prompt
                 )
+            if stats.get("caption", None) is None:
+                stats["caption"] = vision_model(caption_prompt, image_path)
                 logger.info("captioned %s: %s", image, stats["caption"])
+                if caption_store is not None:
+                    caption_store.set(
+                        image_path, vision_model.model, caption_prompt, stats["caption"]
+                    )
         self.apply_stats()
         return self.image_stats
 
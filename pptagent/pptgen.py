@@ -1,23 +1,188 @@
 import asyncio
+import hashlib
 import json
+import os
+import threading
+import time
 import traceback
 from abc import ABC, abstractmethod
 from copy import deepcopy
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field, replace
+from functools import cached_property
 from typing import Optional
 
+import torch
+from torch.nn.functional import cosine_similarity
+
 from pptagent.agent import Agent, AsyncAgent
-from pptagent.apis import API_TYPES, CodeExecutor
-from pptagent.document import Document, OutlineItem
+from pptagent.apis import API_TYPES, CodeExecutor, extract_code, synthesize_actions
+from pptagent.document import Document, OutlineItem, SubSection
 from pptagent.layout import Layout
 from pptagent.llms import LLM, AsyncLLM
 from pptagent.presentation import Presentation, SlidePage, StyleArg
-from pptagent.utils import Config, edit_distance, get_logger
+from pptagent.utils import Config, FuzzyIndex, get_logger, pexists, pjoin
 
 logger = get_logger(__name__)
 
-style = StyleArg.all_true()
-style.area = False
+style = replace(StyleArg.all_true(), area=False)
+
+
+@dataclass
+class DeckContext:
+    """
+    The state of generating a presentation, so that an agent can generate multiple presentations concurrently.
+    Each deck and each of its slides work with their own fork of the agents.
+    """
+
+    source_doc: Document
+    staffs: dict[str, Agent]
+    empty_prs: Presentation
+    outline: list[OutlineItem] = field(default_factory=list)
+    slides: list["SlideContext"] = field(default_factory=list)
+    # HTML of the template slides being rendered by PPTAgentAsync
+    template_html: dict[int, asyncio.Task] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # where the outline and the generated slides are checkpointed, None to disable
+    checkpoint_dir: Optional[str] = None
+
+    @cached_property
+    def doc_hash(self) -> str:
+        """
+        The hash of the source document, checkpoints of other documents are ignored.
+        """
+        return hashlib.sha1(
+            json.dumps(self.source_doc.to_dict(), sort_keys=True).encode()
+        ).hexdigest()
+
+    @property
+    def simple_outline(self) -> str:
+        return "\n".join(
+            [
+                f"Slide {slide_idx+1}: {item.purpose}"
+                for slide_idx, item in enumerate(self.outline)
+            ]
+        )
+
+    def new_slide(
+        self, slide_idx: int, excluded_layouts: Optional[set[str]] = None
+    ) -> "SlideContext":
+        """
+        Create the context for generating a slide of the presentation.
+
+        Args:
+            slide_idx (int): The index of the slide in the outline.
+            excluded_layouts (Optional[set[str]]): The layouts not to use, e.g. the layouts failed before.
+        """
+        slide = SlideContext(
+            deck=self,
+            slide_idx=slide_idx,
+            staffs={
+                name: role.fork()
+                for name, role in self.staffs.items()
+                if name != "planner"
+            },
+            excluded_layouts=excluded_layouts or set(),
+        )
+        with self.lock:
+            self.slides.append(slide)
+        return slide
+
+    def build_slide(self, slide: SlidePage):
+        """
+        Build a generated slide in the presentation of this deck.
+        """
+        with self.lock:
+            self.empty_prs.build_slide(slide)
+
+    def save_checkpoint(self, name: str, data: dict):
+        """
+        Save a checkpoint to the checkpoint directory, replaced atomically so an interrupted run never leaves a broken one.
+        """
+        if self.checkpoint_dir is None:
+            return
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        checkpoint_file = pjoin(self.checkpoint_dir, f"{name}.json")
+        tmp_file = f"{checkpoint_file}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_file, "w") as f:
+            json.dump(
+                {"doc_hash": self.doc_hash, **data}, f, ensure_ascii=False, indent=2
+            )
+        os.replace(tmp_file, checkpoint_file)
+
+    def load_checkpoint(self, name: str) -> Optional[dict]:
+        """
+        Load a checkpoint saved for the same source document, None if there is no such checkpoint.
+        """
+        if self.checkpoint_dir is None:
+            return None
+        checkpoint_file = pjoin(self.checkpoint_dir, f"{name}.json")
+        if not pexists(checkpoint_file):
+            return None
+        with open(checkpoint_file) as f:
+            checkpoint = json.load(f)
+        if checkpoint.pop("doc_hash", None) != self.doc_hash:
+            return None
+        return checkpoint
+
+    @staticmethod
+    def slide_checkpoint(outline_item: OutlineItem) -> str:
+        """
+        The checkpoint name of a slide, keyed by its outline item so it's reused after the outline is edited.
+        """
+        outline_hash = hashlib.sha1(
+            json.dumps(asdict(outline_item), sort_keys=True).encode()
+        ).hexdigest()
+        return f"slide_{outline_hash}"
+
+    def save_slide(self, slide: "SlideContext"):
+        """
+        Checkpoint a generated slide with its outline item.
+        """
+        outline_item = self.outline[slide.slide_idx]
+        self.save_checkpoint(
+            self.slide_checkpoint(outline_item),
+            {"outline_item": asdict(outline_item), **slide.checkpoint},
+        )
+
+    def load_slide(self, outline_item: OutlineItem) -> Optional[dict]:
+        """
+        Load the checkpoint of the slide generated from the outline item.
+        """
+        return self.load_checkpoint(self.slide_checkpoint(outline_item))
+
+    def collect_history(self, code_executor: CodeExecutor) -> dict:
+        """
+        Collect the history of code execution, API calls and agent steps of the deck and its slides.
+
+        Returns:
+            dict: The collected history data.
+        """
+        history = {
+            "agents": {},
+            "code_history": code_executor.code_history,
+            "api_history": code_executor.api_history,
+        }
+        for role_name, role in self.staffs.items():
+            history["agents"][role_name] = list(role.history)
+            for slide in sorted(self.slides, key=lambda x: x.slide_idx):
+                if role_name in slide.staffs:
+                    history["agents"][role_name].extend(slide.staffs[role_name].history)
+        return history
+
+
+@dataclass
+class SlideContext:
+    """
+    The state of generating a slide in a presentation.
+    """
+
+    deck: DeckContext
+    slide_idx: int
+    staffs: dict[str, Agent]
+    excluded_layouts: set[str] = field(default_factory=set)
+    layout: Optional[str] = None
+    # the editor output and actions of the generated slide, see `DeckContext.save_slide`
+    checkpoint: Optional[dict] = None
 
 
 @dataclass
@@ -40,6 +205,14 @@ class PPTGen(ABC):
         error_exit: bool = False,
         record_cost: bool = True,
         length_factor: float | None = None,
+        layout_top_k: int = 5,
+        layout_threshold: float | None = None,
+        race_layouts: bool = False,
+        slide_retry_budget: int = 3,
+        retry_backoff: float = 1.0,
+        outline_cache_dir: Optional[str] = None,
+        section_planning: bool = False,
+        key_points_cache_dir: Optional[str] = None,
     ):
         """
         Initialize the PPTGen.
@@ -50,6 +223,15 @@ class PPTGen(ABC):
             force_pages (bool): Whether to force a specific number of pages.
             error_exit (bool): Whether to exit on error.
             record_cost (bool): Whether to record the cost of generation.
+            layout_top_k (int): The number of layouts shortlisted by embedding similarity for the layout selector.
+            layout_threshold (float | None): The similarity to select a layout without the layout selector, None to disable.
+            race_layouts (bool): Whether to edit the slide with the selected and the most similar layout concurrently and keep the first finished, only for PPTAgentAsync.
+            slide_retry_budget (int): The number of times failed slides can be regenerated in a presentation.
+            retry_backoff (float): The seconds to wait before regenerating failed slides, doubled for every retry.
+            outline_cache_dir (Optional[str]): The directory to cache outlines of documents, None to disable.
+            section_planning (bool): Whether to plan the slides of each section separately and merge them, sections are planned concurrently by PPTAgentAsync.
+            key_points_cache_dir (Optional[str]): The directory to cache the key points extracted per subsection,
+                None to extract the key points of each slide at once.
             **kwargs: Additional arguments.
         """
         self.text_embedder = text_embedder
@@ -57,6 +239,17 @@ class PPTGen(ABC):
         self.force_pages = force_pages
         self.error_exit = error_exit
         self.length_factor = length_factor
+        self.layout_top_k = layout_top_k
+        self.layout_threshold = layout_threshold
+        self.race_layouts = race_layouts
+        self.slide_retry_budget = slide_retry_budget
+        self.retry_backoff = retry_backoff
+        self.outline_cache_dir = outline_cache_dir
+        self.section_planning = section_planning
+        self.key_points_cache_dir = key_points_cache_dir
+        self._key_points: dict[str, list] = {}
+        # extractions in progress of PPTAgentAsync, shared by slides with the same subsection
+        self._key_points_tasks: dict[str, asyncio.Task] = {}
         self._hire_staffs(record_cost, language_model, vision_model)
         self._initialized = False
 
@@ -80,7 +273,10 @@ class PPTGen(ABC):
         self.presentation = presentation
         self.functional_keys = slide_induction.pop("functional_keys")
         self.layouts = {k: Layout.from_dict(k, v) for k, v in slide_induction.items()}
-        self.empty_prs = deepcopy(self.presentation)
+        for layout in self.layouts.values():
+            layout.locate_text_areas(presentation.slides[layout.slide_id - 1])
+        self.layout_index = FuzzyIndex(self.layouts.items())
+        self.layout_embeddings: Optional[torch.Tensor] = None
         self._initialized = True
         return self
 
@@ -89,6 +285,9 @@ class PPTGen(ABC):
         source_doc: Document,
         num_slides: Optional[int] = None,
         outline: Optional[list[OutlineItem]] = None,
+        resume: bool = False,
+        regenerate: Optional[list[int]] = None,
+        checkpoint: bool = False,
     ):
         """
         Generate a PowerPoint presentation.
@@ -97,6 +296,11 @@ class PPTGen(ABC):
             source_doc (Document): The source document.
             num_slides (Optional[int]): The number of slides to generate.
             outline (Optional[List[OutlineItem]]): The outline of the presentation.
+            resume (bool): Whether to reuse the outline and slides checkpointed by previous runs in the run directory,
+                slides are reused as long as their outline items are unchanged, so an edited outline only regenerates the edited slides.
+            regenerate (Optional[list[int]]): The indices of the outline items whose slides are regenerated even if they are checkpointed.
+            checkpoint (bool): Whether to checkpoint the outline and slides in the run directory so the run can be resumed,
+                implied by `resume`.
 
         Returns:
             dict: A dictionary containing the presentation data and history.
@@ -105,76 +309,191 @@ class PPTGen(ABC):
             ValueError: if failed to generate presentation outline.
         """
         assert self._initialized, "PPTGen not initialized, call `set_reference` first"
-        self.source_doc = source_doc
+        deck = self.new_deck(source_doc, checkpoint or resume)
         succ_flag = True
+        if outline is None and resume:
+            outline = self._restore_outline(deck)
         if outline is None:
-            self.outline = self.generate_outline(num_slides, source_doc)
-        else:
-            self.outline = outline
-        self.simple_outline = "\n".join(
-            [
-                f"Slide {slide_idx+1}: {item.purpose}"
-                for slide_idx, item in enumerate(self.outline)
-            ]
+            outline = self.generate_outline(num_slides, source_doc, deck)
+        deck.outline = outline
+        deck.save_checkpoint(
+            "outline", {"outline": [asdict(outline_item) for outline_item in outline]}
         )
+        if self._use_layout_embeddings and self.layout_embeddings is None:
+            self.layout_embeddings = self.text_embedder.get_embedding(
+                [layout.overview for layout in self.layouts.values()]
+            )
         generated_slides = []
         code_executors = []
-        for slide_idx, outline_item in enumerate(self.outline):
+        retry_budget = self.slide_retry_budget
+        for slide_idx, outline_item in enumerate(deck.outline):
             if self.force_pages and slide_idx == num_slides:
                 break
-            try:
-                slide, code_executor = self._generate_slide(slide_idx, outline_item)
-                generated_slides.append(slide)
-                code_executors.append(code_executor)
-            except Exception as e:
+            restored = None
+            if resume and slide_idx not in (regenerate or ()):
+                restored = self._restore_slide(deck, slide_idx)
+            if restored is not None:
+                generated_slides.append(restored[0])
+                code_executors.append(restored[1])
+                continue
+            excluded_layouts = set()
+            for attempt in range(retry_budget + 1):
+                if attempt > 0:
+                    retry_budget -= 1
+                    time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                slide = deck.new_slide(slide_idx, excluded_layouts)
+                try:
+                    slide_page, code_executor = self._generate_slide(
+                        slide, outline_item
+                    )
+                    generated_slides.append(slide_page)
+                    code_executors.append(code_executor)
+                    deck.save_slide(slide)
+                    break
+                except Exception as e:
+                    logger.warning(
+                        "Failed to generate slide %d, tried %d times, error: %s",
+                        slide_idx + 1,
+                        attempt + 1,
+                        str(e),
+                    )
+                    if slide.layout is not None:
+                        excluded_layouts.add(slide.layout)
+            else:
                 logger.warning(
-                    "Failed to generate slide, error_exit=%s, error: %s",
-                    self.error_exit,
-                    str(e),
+                    "Gave up slide %d, error_exit=%s", slide_idx + 1, self.error_exit
                 )
                 if self.error_exit:
                     succ_flag = False
                     break
 
         # Collect history data
-        history = self._collect_history(
+        history = deck.collect_history(
             sum(code_executors, start=CodeExecutor(self.retry_times))
         )
 
         if succ_flag:
-            self.empty_prs.slides = generated_slides
-            prs = self.empty_prs
+            deck.empty_prs.slides = generated_slides
+            prs = deck.empty_prs
         else:
             prs = None
-
-        self.empty_prs = deepcopy(self.presentation)
         return prs, history
 
+    def new_deck(self, source_doc: Document, checkpoint: bool = False) -> DeckContext:
+        """
+        Create the context for generating a presentation from the source document.
+
+        Args:
+            source_doc (Document): The source document.
+            checkpoint (bool): Whether to checkpoint the deck, in a directory of its source document
+                so decks of other documents generated concurrently don't overwrite each other.
+        """
+        deck = DeckContext(
+            source_doc=source_doc,
+            staffs={name: role.fork() for name, role in self.staffs.items()},
+            empty_prs=deepcopy(self.presentation),
+        )
+        if checkpoint:
+            deck.checkpoint_dir = pjoin(
+                self.config.RUN_DIR, "checkpoints", deck.doc_hash
+            )
+        return deck
+
+    def _restore_outline(self, deck: DeckContext) -> Optional[list[OutlineItem]]:
+        """
+        Restore the outline of the presentation from its checkpoint.
+        """
+        checkpoint = deck.load_checkpoint("outline")
+        if checkpoint is None:
+            return None
+        return [OutlineItem(**outline_item) for outline_item in checkpoint["outline"]]
+
+    def _restore_slide(
+        self, deck: DeckContext, slide_idx: int
+    ) -> Optional[tuple[SlidePage, CodeExecutor]]:
+        """
+        Restore a slide by replaying the actions of its checkpoint on the template slide, no agent is called.
+
+        Returns:
+            Optional[tuple[SlidePage, CodeExecutor]]: The restored slide and code executor, None if it can't be restored.
+        """
+        checkpoint = deck.load_slide(deck.outline[slide_idx])
+        if checkpoint is None:
+            return None
+        code_executor = CodeExecutor(self.retry_times)
+        edit_slide = deepcopy(self.presentation.slides[checkpoint["template_id"] - 1])
+        feedback = code_executor.execute_actions(
+            checkpoint["actions"], edit_slide, deck.source_doc
+        )
+        if feedback is not None:
+            logger.warning(
+                "Failed to restore slide %d, error: %s", slide_idx + 1, feedback[0]
+            )
+            return None
+        deck.build_slide(edit_slide)
+        return edit_slide, code_executor
+
     def generate_outline(
         self,
         num_slides: int,
         source_doc: Document,
+        deck: Optional[DeckContext] = None,
     ):
         """
         Generate an outline for the presentation.
 
         Args:
             num_slides (int): The number of slides to generate.
+            source_doc (Document): The source document.
+            deck (Optional[DeckContext]): The context of the presentation, whose planner is used.
 
         Returns:
             dict: The generated outline.
         """
         assert self._initialized, "PPTGen not initialized, call `set_reference` first"
-        outline = self.staffs["planner"](
+        planner = (deck or self).staffs["planner"]
+        cache_file = self._outline_cache_file(source_doc, num_slides, planner.model)
+        outline = self._load_outline(cache_file)
+        if outline is not None:
+            return outline
+        section_plans = None
+        if self.section_planning:
+            section_plans = self._split_sections(source_doc, num_slides)
+        if section_plans is None:
+            section_plans = [(num_slides, source_doc.overview, self.functional_keys)]
+        outline = []
+        for section_plan in section_plans:
+            outline.extend(self._plan_section(planner, source_doc, *section_plan))
+        self._save_outline(cache_file, outline)
+        return outline
+
+    def _plan_section(
+        self,
+        planner: Agent,
+        source_doc: Document,
+        num_slides: int,
+        document_overview: dict,
+        functional_layouts: list[str],
+    ) -> list[OutlineItem]:
+        """
+        Plan the slides of a part of the document with a fork of the planner, so only this part is re-prompted if it's invalid.
+        """
+        section_planner = planner.fork()
+        outline = section_planner(
             num_slides=num_slides,
-            document_overview=source_doc.overview,
-            functional_layouts=self.functional_keys,
+            document_overview=document_overview,
+            functional_layouts=functional_layouts,
         )
-        outline = self._valid_outline(outline, source_doc)
+        outline = self._valid_outline(outline, source_doc, section_planner)
+        planner.merge(section_planner)
         return outline
 
     def _valid_outline(
-        self, outline: list[dict], source_doc: Document, retry: int = 0
+        self,
+        outline: list[dict],
+        source_doc: Document,
+        planner: Agent,
+        retry: int = 0,
     ) -> list[OutlineItem]:
         """
         Validate the generated outline.
@@ -195,40 +514,212 @@ class PPTGen(ABC):
                 str(e),
             )
             if retry < self.retry_times:
-                new_outline = self.staffs["planner"].retry(
-                    str(e), traceback.format_exc(), retry + 1
-                )
-                return self._valid_outline(new_outline, source_doc, retry + 1)
+                new_outline = planner.retry(str(e), traceback.format_exc(), retry + 1)
+                return self._valid_outline(new_outline, source_doc, planner, retry + 1)
             else:
                 raise ValueError("Failed to generate outline, tried too many times")
 
-    @abstractmethod
-    def _generate_slide(
-        self, slide_idx: int, outline_item: OutlineItem
-    ) -> tuple[SlidePage, CodeExecutor]:
+    def _outline_cache_file(
+        self, source_doc: Document, num_slides: Optional[int], model: str
+    ) -> Optional[str]:
         """
-        Generate a slide from the outline item.
+        The file caching the outline of the document planned with the functional layouts, the number of slides, the model and whether sections are planned separately.
         """
-        raise NotImplementedError("Subclass must implement this method")
+        if self.outline_cache_dir is None:
+            return None
+        cache_key = hashlib.sha1(
+            json.dumps(
+                [
+                    source_doc.overview,
+                    self.functional_keys,
+                    num_slides,
+                    model,
+                    self.section_planning,
+                ],
+                sort_keys=True,
+                ensure_ascii=False,
+            ).encode()
+        ).hexdigest()
+        return pjoin(self.outline_cache_dir, f"{cache_key}.json")
+
+    def _load_outline(self, cache_file: Optional[str]) -> Optional[list[OutlineItem]]:
+        """
+        Load a cached outline, None if it's not cached.
+        """
+        if cache_file is None or not pexists(cache_file):
+            return None
+        with open(cache_file) as f:
+            return [OutlineItem(**outline_item) for outline_item in json.load(f)]
+
+    def _save_outline(self, cache_file: Optional[str], outline: list[OutlineItem]):
+        """
+        Cache a validated outline, replaced atomically as presentations can be generated concurrently.
+        """
+        if cache_file is None:
+            return
+        os.makedirs(self.outline_cache_dir, exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_file, "w") as f:
+            json.dump(
+                [asdict(outline_item) for outline_item in outline],
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        os.replace(tmp_file, cache_file)
 
-    def _collect_history(self, code_executor: CodeExecutor):
+    def _split_sections(
+        self, source_doc: Document, num_slides: Optional[int]
+    ) -> Optional[list[tuple[int, dict, list[str]]]]:
         """
-        Collect the history of code execution, API calls and agent steps.
+        Split the planning by the top-level sections of the document, the slides are allotted by the length of each section.
+        Functional layouts are only offered to the first and last sections, where the opening and ending slides go.
 
         Returns:
-            dict: The collected history data.
+            Optional[list[tuple[int, dict, list[str]]]]: The number of slides, document overview and functional layouts of each section,
+                None if there are too few sections or slides to split.
         """
-        history = {
-            "agents": {},
-            "code_history": code_executor.code_history,
-            "api_history": code_executor.api_history,
-        }
+        sections = source_doc.overview["sections"]
+        if num_slides is None or len(sections) < 2 or num_slides < len(sections):
+            return None
+        weights = [
+            sum(len(subsection.content) for subsection in section.subsections) + 1
+            for section in source_doc.sections
+        ]
+        quotas = [num_slides * weight / sum(weights) for weight in weights]
+        allotted = [max(1, int(quota)) for quota in quotas]
+        # settle the rounding by the largest remainders
+        while sum(allotted) < num_slides:
+            idx = max(range(len(quotas)), key=lambda i: quotas[i] - allotted[i])
+            allotted[idx] += 1
+        while sum(allotted) > num_slides:
+            idx = max(
+                (i for i in range(len(quotas)) if allotted[i] > 1),
+                key=lambda i: allotted[i] - quotas[i],
+            )
+            allotted[idx] -= 1
+        return [
+            (
+                section_slides,
+                {**source_doc.overview, "sections": [section]},
+                (self.functional_keys if section_idx in (0, len(sections) - 1) else []),
+            )
+            for section_idx, (section_slides, section) in enumerate(
+                zip(allotted, sections)
+            )
+        ]
 
-        for role_name, role in self.staffs.items():
-            history["agents"][role_name] = role.history
-            role.history = []
+    def _key_points_key(self, subsection: SubSection, model: str) -> str:
+        return hashlib.sha1(
+            f"{model}\n{subsection.content_source}".encode()
+        ).hexdigest()
 
-        return history
+    def _load_key_points(self, cache_key: str) -> Optional[list]:
+        """
+        Load the cached key points of a subsection, from memory or the cache directory.
+        """
+        if cache_key not in self._key_points:
+            cache_file = pjoin(self.key_points_cache_dir, f"{cache_key}.json")
+            if not pexists(cache_file):
+                return None
+            with open(cache_file) as f:
+                self._key_points[cache_key] = json.load(f)
+        return self._key_points[cache_key]
+
+    def _save_key_points(self, cache_key: str, key_points: list):
+        """
+        Cache the key points of a subsection, replaced atomically as presentations can be generated concurrently.
+        """
+        if not isinstance(key_points, list):
+            key_points = [key_points]
+        self._key_points[cache_key] = key_points
+        os.makedirs(self.key_points_cache_dir, exist_ok=True)
+        cache_file = pjoin(self.key_points_cache_dir, f"{cache_key}.json")
+        tmp_file = f"{cache_file}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_file, "w") as f:
+            json.dump(key_points, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, cache_file)
+        return key_points
+
+    @property
+    def _use_layout_embeddings(self) -> bool:
+        return (
+            self.layout_threshold is not None or len(self.layouts) > self.layout_top_k
+        )
+
+    def _layout_query(self, header: str, content_source: str, images: str) -> str:
+        """
+        The text to embed for shortlisting layouts of a slide.
+        """
+        return f"{header}\n{content_source[:2048]}\n{images}"
+
+    def _shortlist_layouts(
+        self,
+        query_embedding: Optional[torch.Tensor],
+        has_images: bool,
+        excluded_layouts: Optional[set[str]] = None,
+    ) -> tuple[list[Layout], Optional[Layout]]:
+        """
+        Shortlist the layouts most similar to the slide, the functional layouts are always included.
+
+        Args:
+            query_embedding (Optional[torch.Tensor]): The embedding of the slide, None to keep all layouts.
+            has_images (bool): Whether the slide has images.
+            excluded_layouts (Optional[set[str]]): The layouts not to shortlist, ignored if it excludes all layouts.
+
+        Returns:
+            tuple[list[Layout], Optional[Layout]]: The shortlisted layouts from the most similar, and the layout selected without
+                the layout selector if its similarity reaches `layout_threshold`.
+        """
+        layouts = list(self.layouts.values())
+        if query_embedding is None:
+            scores = [0.0] * len(layouts)
+        else:
+            scores = cosine_similarity(query_embedding, self.layout_embeddings).tolist()
+        ranked = [
+            (score, layout)
+            for score, layout in zip(scores, layouts)
+            if layout.title not in (excluded_layouts or ())
+        ] or list(zip(scores, layouts))
+        if query_embedding is None:
+            return [layout for _, layout in ranked], None
+        ranked.sort(key=lambda x: x[0], reverse=True)
+        best_score, best_layout = ranked[0]
+        if (
+            self.layout_threshold is not None
+            and best_score >= self.layout_threshold
+            and (
+                has_images or all(el.el_type != "image" for el in best_layout.elements)
+            )
+        ):
+            return [best_layout], best_layout
+        shortlist = [layout for _, layout in ranked[: self.layout_top_k]]
+        shortlist += [
+            layout
+            for _, layout in ranked[self.layout_top_k :]
+            if layout.title in self.functional_keys
+        ]
+        return shortlist, None
+
+    def _match_layout(
+        self, slide: SlideContext, name: str, layouts: list[Layout]
+    ) -> Layout:
+        """
+        Get the layout selected by name, or the first shortlisted layout if it is excluded for the slide.
+        """
+        layout, _ = self.layout_index.match(name)
+        if layout is None or layout.title in slide.excluded_layouts:
+            layout = layouts[0]
+        return layout
+
+    @abstractmethod
+    def _generate_slide(
+        self, slide: SlideContext, outline_item: OutlineItem
+    ) -> tuple[SlidePage, CodeExecutor]:
+        """
+        Generate a slide from the outline item.
+        """
+        raise NotImplementedError("Subclass must implement this method")
 
     def _hire_staffs(
         self,
@@ -262,40 +753,90 @@ class PPTAgent(PPTGen):
     roles: list[str] = ["editor", "coder", "content_organizer", "layout_selector"]
 
     def _generate_slide(
-        self, slide_idx: int, outline_item: OutlineItem
+        self, slide: SlideContext, outline_item: OutlineItem
     ) -> tuple[SlidePage, CodeExecutor]:
         """
         Generate a slide from the outline item.
         """
         header, content_source, images = outline_item.retrieve(
-            slide_idx, self.source_doc
+            slide.slide_idx, slide.deck.source_doc
         )
-        available_layouts = "\n".join(
-            [layout.overview for layout in self.layouts.values()]
+        query_embedding = None
+        if self._use_layout_embeddings:
+            query_embedding = self.text_embedder.get_embedding(
+                self._layout_query(header, content_source, images)
+            )
+        layouts, layout = self._shortlist_layouts(
+            query_embedding, len(images) != 0, slide.excluded_layouts
         )
-        key_points = self.staffs["content_organizer"](content_source=content_source)
+        key_points = self._organize_content(slide, outline_item, content_source)
         slide_content = (
             json.dumps(key_points, indent=2, ensure_ascii=False)
             + "\nImages:\n"
             + images
         )
-        layout_selection = self.staffs["layout_selector"](
-            outline=self.simple_outline,
-            slide_description=header,
-            slide_content=slide_content,
-            available_layouts=available_layouts,
-            functional_layouts=self.functional_keys,
-        )
-        layout = max(
-            self.layouts.keys(),
-            key=lambda x: edit_distance(x, layout_selection["layout"]),
-        )
-        return self.edit_slide(
-            self.layouts[layout], slide_content, slide_description=header
-        )
+        if layout is None:
+            layout_selection = slide.staffs["layout_selector"](
+                outline=slide.deck.simple_outline,
+                slide_description=header,
+                slide_content=slide_content,
+                available_layouts="\n".join(
+                    candidate.overview for candidate in layouts
+                ),
+                functional_layouts=self.functional_keys,
+            )
+            layout = self._match_layout(slide, layout_selection["layout"], layouts)
+        slide.layout = layout.title
+        return self.edit_slide(slide, layout, slide_content, slide_description=header)
+
+    def organize_document(self, source_doc: Document):
+        """
+        Extract and cache the key points of all subsections of the document ahead of generating slides.
+        """
+        assert (
+            self.key_points_cache_dir is not None
+        ), "key_points_cache_dir is required to organize the document ahead"
+        content_organizer = self.staffs["content_organizer"].fork()
+        for subsection in source_doc.subsections:
+            try:
+                self._subsection_key_points(content_organizer, subsection)
+            except Exception as e:
+                logger.warning(
+                    "Failed to organize subsection %s, error: %s", subsection.title, e
+                )
+        self.staffs["content_organizer"].merge(content_organizer)
+
+    def _organize_content(
+        self, slide: SlideContext, outline_item: OutlineItem, content_source: str
+    ) -> list:
+        """
+        Extract the key points of the slide, assembled from the key points of its subsections if they are cached.
+        """
+        content_organizer = slide.staffs["content_organizer"]
+        if self.key_points_cache_dir is None:
+            return content_organizer(content_source=content_source)
+        key_points = []
+        for subsection in slide.deck.source_doc.retrieve(outline_item.indexs):
+            key_points.extend(
+                self._subsection_key_points(content_organizer, subsection)
+            )
+        return key_points
+
+    def _subsection_key_points(
+        self, content_organizer: Agent, subsection: SubSection
+    ) -> list:
+        cache_key = self._key_points_key(subsection, content_organizer.model)
+        key_points = self._load_key_points(cache_key)
+        if key_points is None:
+            key_points = self._save_key_points(
+                cache_key,
+                content_organizer(content_source=subsection.content_source),
+            )
+        return key_points
 
     def edit_slide(
         self,
+        slide: SlideContext,
         layout: Layout,
         slide_content: str,
         slide_description: str,
@@ -304,6 +845,7 @@ class PPTAgent(PPTGen):
         Synergize Agents to generate a slide.
 
         Args:
+            slide (SlideContext): The context of the slide.
             layout (Layout): The layout data.
             slide_content (str): The slide content.
             slide_description (str): The description of the slide.
@@ -312,24 +854,37 @@ class PPTAgent(PPTGen):
             tuple[SlidePage, CodeExecutor]: The generated slide and code executor.
         """
         code_executor = CodeExecutor(self.retry_times)
-        editor_output = self.staffs["editor"](
-            outline=self.simple_outline,
+        editor_output = slide.staffs["editor"](
+            outline=slide.deck.simple_outline,
             slide_description=slide_description,
             schema=layout.content_schema,
-            metadata=self.source_doc.metainfo,
+            metadata=slide.deck.source_doc.metainfo,
             slide_content=slide_content,
         )
-        command_list = self._generate_commands(editor_output, layout)
-        template_id = layout.get_slide_id(editor_output)
-        edit_actions = self.staffs["coder"](
-            api_docs=code_executor.get_apis_docs(API_TYPES.Agent.value),
-            edit_target=self.presentation.slides[template_id - 1].to_html(),
-            command_list="\n".join([str(i) for i in command_list]),
+        command_list, editor_output = self._generate_commands(
+            slide, editor_output, layout
         )
+        template_id = layout.get_slide_id(editor_output)
+        template_slide = self.presentation.slides[template_id - 1]
+        # only ask the coder when the commands can't be mapped to api calls directly
+        coder_turns = 0
+        edit_actions = synthesize_actions(template_slide, command_list)
+        if edit_actions is None:
+            edit_actions = slide.staffs["coder"](
+                api_docs=code_executor.get_apis_docs(API_TYPES.Agent.value),
+                edit_target=template_slide.to_html(),
+                command_list="\n".join([str(i) for i in command_list]),
+            )
+            coder_turns += 1
+        edit_slide: Optional[SlidePage] = None
         for error_idx in range(self.retry_times):
-            edit_slide: SlidePage = deepcopy(self.presentation.slides[template_id - 1])
+            # continue from the failed api call if the corrected actions allow it
+            if edit_slide is None or not code_executor.resumable(
+                edit_actions, edit_slide
+            ):
+                edit_slide = deepcopy(template_slide)
             feedback = code_executor.execute_actions(
-                edit_actions, edit_slide, self.source_doc
+                edit_actions, edit_slide, slide.deck.source_doc
             )
             if feedback is None:
                 break
@@ -339,25 +894,55 @@ class PPTAgent(PPTGen):
                 self.retry_times,
                 str(feedback),
             )
-            if error_idx == self.retry_times:
-                raise Exception(
-                    f"Failed to generate slide, tried too many times at editing\ntraceback: {feedback[1]}"
+            if error_idx == self.retry_times - 1:
+                break
+            if coder_turns == 0:
+                edit_actions = slide.staffs["coder"](
+                    api_docs=code_executor.get_apis_docs(API_TYPES.Agent.value),
+                    edit_target=template_slide.to_html(),
+                    command_list="\n".join([str(i) for i in command_list]),
                 )
-            edit_actions = self.staffs["coder"].retry(*feedback, error_idx + 1)
-        self.empty_prs.build_slide(edit_slide)
+            else:
+                edit_actions = slide.staffs["coder"].retry(*feedback, coder_turns)
+            coder_turns += 1
+        if feedback is not None:
+            raise Exception(
+                f"Failed to generate slide, tried too many times at editing\ntraceback: {feedback[1]}"
+            )
+        resize_actions = layout.resize_actions(editor_output)
+        if feedback is None and resize_actions:
+            # apply the font sizes shrunk to fit the text boxes after the edits, replayed with the actions on resume
+            edit_actions = extract_code(edit_actions) + "\n" + resize_actions
+            feedback = code_executor.execute_actions(
+                edit_actions, edit_slide, slide.deck.source_doc
+            )
+            if feedback is not None:
+                raise Exception(f"Failed to fit the text of the slide: {feedback[1]}")
+        slide.deck.build_slide(edit_slide)
+        slide.checkpoint = {
+            "layout": layout.title,
+            "template_id": template_id,
+            "editor_output": editor_output,
+            "command_list": command_list,
+            "actions": edit_actions,
+            "html": edit_slide.to_html(),
+        }
         return edit_slide, code_executor
 
-    def _generate_commands(self, editor_output: dict, layout: Layout, retry: int = 0):
+    def _generate_commands(
+        self, slide: SlideContext, editor_output: dict, layout: Layout, retry: int = 0
+    ):
         """
         Generate commands for editing the slide content.
 
         Args:
+            slide (SlideContext): The context of the slide.
             editor_output (dict): The editor output.
             layout (Layout): The layout object containing content schema.
             retry (int, optional): The number of retries. Defaults to 0.
 
         Returns:
-            list: A list of commands.
+            tuple[list, dict]: A list of commands and the validated editor output.
 
         Raises:
             Exception: If command generation fails.
@@ -365,16 +950,16 @@ class PPTAgent(PPTGen):
         command_list = []
         try:
             layout.validate(
-                editor_output, self.length_factor, self.source_doc.image_dir
+                editor_output, self.length_factor, slide.deck.source_doc.image_dir
             )
         except Exception as e:
             if retry < self.retry_times:
-                new_output = self.staffs["editor"].retry(
+                new_output = slide.staffs["editor"].retry(
                     e,
                     traceback.format_exc(),
                     retry + 1,
                 )
-                return self._generate_commands(new_output, layout, retry + 1)
+                return self._generate_commands(slide, new_output, layout, retry + 1)
             else:
                 raise Exception(
                     f"Failed to generate commands, tried too many times at editing\ntraceback: {e}"
@@ -401,7 +986,7 @@ class PPTAgent(PPTGen):
             )
 
         assert len(command_list) > 0, "No commands generated"
-        return command_list
+        return command_list, editor_output
 
 
 class PPTAgentAsync(PPTGen):
@@ -439,14 +1024,23 @@ class PPTAgentAsync(PPTGen):
         source_doc: Document,
         num_slides: Optional[int] = None,
         outline: Optional[list[OutlineItem]] = None,
+        resume: bool = False,
+        regenerate: Optional[list[int]] = None,
+        checkpoint: bool = False,
     ):
         """
         Asynchronously generate a PowerPoint presentation.
+        The state of generation is kept in a DeckContext, so presentations can be generated concurrently.
 
         Args:
             source_doc (Document): The source document.
             num_slides (Optional[int]): The number of slides to generate.
             outline (Optional[List[OutlineItem]]): The outline of the presentation.
+            resume (bool): Whether to reuse the outline and slides checkpointed by previous runs in the run directory,
+                slides are reused as long as their outline items are unchanged, so an edited outline only regenerates the edited slides.
+            regenerate (Optional[list[int]]): The indices of the outline items whose slides are regenerated even if they are checkpointed.
+            checkpoint (bool): Whether to checkpoint the outline and slides in the run directory so the run can be resumed,
+                implied by `resume`.
 
         Returns:
             tuple: A tuple containing the presentation object and history.
@@ -457,63 +1051,107 @@ class PPTAgentAsync(PPTGen):
         assert (
             self._initialized
         ), "AsyncPPTAgent not initialized, call `set_reference` first"
-        self.source_doc = source_doc
+        deck = self.new_deck(source_doc, checkpoint or resume)
         succ_flag = True
+        if outline is None and resume:
+            outline = self._restore_outline(deck)
         if outline is None:
-            self.outline = await self.generate_outline(num_slides, source_doc)
-        else:
-            self.outline = outline
-        self.simple_outline = "\n".join(
-            [
-                f"Slide {slide_idx+1}: {item.purpose}"
-                for slide_idx, item in enumerate(self.outline)
-            ]
+            outline = await self.generate_outline(num_slides, source_doc, deck)
+        deck.outline = outline
+        deck.save_checkpoint(
+            "outline", {"outline": [asdict(outline_item) for outline_item in outline]}
         )
 
-        slide_tasks = []
-        for slide_idx, outline_item in enumerate(self.outline):
-            if self.force_pages and slide_idx == num_slides:
+        if self._use_layout_embeddings and self.layout_embeddings is None:
+            self.layout_embeddings = await self.text_embedder.get_embedding(
+                [layout.overview for layout in self.layouts.values()]
+            )
+        pending = [
+            slide_idx
+            for slide_idx in range(len(deck.outline))
+            if not (
+                self.force_pages and num_slides is not None and slide_idx >= num_slides
+            )
+        ]
+        excluded_layouts = {slide_idx: set() for slide_idx in pending}
+        slide_results = {}
+        if resume:
+            for slide_idx in pending:
+                if slide_idx in (regenerate or ()):
+                    continue
+                restored = self._restore_slide(deck, slide_idx)
+                if restored is not None:
+                    slide_results[slide_idx] = restored
+            pending = [idx for idx in pending if idx not in slide_results]
+        retry_budget = self.slide_retry_budget
+        attempt = 0
+        # failed slides are re-queued with the layouts they failed on excluded
+        while True:
+            slides = [
+                deck.new_slide(slide_idx, excluded_layouts[slide_idx])
+                for slide_idx in pending
+            ]
+            results = await asyncio.gather(
+                *[
+                    self._generate_slide(slide, deck.outline[slide.slide_idx])
+                    for slide in slides
+                ],
+                return_exceptions=True,
+            )
+            failed = []
+            for slide, result in zip(slides, results):
+                if not isinstance(result, Exception):
+                    slide_results[slide.slide_idx] = result
+                    deck.save_slide(slide)
+                    continue
+                logger.warning(
+                    "Failed to generate slide %d, tried %d times, error: %s",
+                    slide.slide_idx + 1,
+                    attempt + 1,
+                    str(result),
+                )
+                if slide.layout is not None:
+                    excluded_layouts[slide.slide_idx].add(slide.layout)
+                failed.append(slide.slide_idx)
+            if len(failed) == 0 or retry_budget == 0:
                 break
-            slide_tasks.append(self._generate_slide(slide_idx, outline_item))
-
-        slide_results = await asyncio.gather(*slide_tasks, return_exceptions=True)
+            pending = failed[:retry_budget]
+            retry_budget -= len(pending)
+            await asyncio.sleep(self.retry_backoff * 2**attempt)
+            attempt += 1
 
         generated_slides = []
         code_executors = []
-        for result in slide_results:
-            if isinstance(result, Exception):
+        for slide_idx in sorted(excluded_layouts):
+            if slide_idx not in slide_results:
                 logger.warning(
-                    "Failed to generate slide, error_exit=%s, error: %s",
-                    self.error_exit,
-                    str(result),
+                    "Gave up slide %d, error_exit=%s", slide_idx + 1, self.error_exit
                 )
                 if self.error_exit:
                     succ_flag = False
                     break
                 continue
-            if result is not None:
-                slide, code_executor = result
-                generated_slides.append(slide)
-                code_executors.append(code_executor)
+            slide, code_executor = slide_results[slide_idx]
+            generated_slides.append(slide)
+            code_executors.append(code_executor)
 
         # Collect history data
-        history = self._collect_history(
+        history = deck.collect_history(
             sum(code_executors, start=CodeExecutor(self.retry_times))
         )
 
         if succ_flag:
-            self.empty_prs.slides = generated_slides
-            prs = self.empty_prs
+            deck.empty_prs.slides = generated_slides
+            prs = deck.empty_prs
         else:
             prs = None
-
-        self.empty_prs = deepcopy(self.presentation)
         return prs, history
 
     async def generate_outline(
         self,
         num_slides: int,
         source_doc: Document,
+        deck: Optional[DeckContext] = None,
     ):
         """
         Asynchronously generate an outline for the presentation.
@@ -521,19 +1159,54 @@ class PPTAgentAsync(PPTGen):
         assert (
             self._initialized
         ), "AsyncPPTAgent not initialized, call `set_reference` first"
+        planner = (deck or self).staffs["planner"]
+        cache_file = self._outline_cache_file(source_doc, num_slides, planner.model)
+        outline = self._load_outline(cache_file)
+        if outline is not None:
+            return outline
+        section_plans = None
+        if self.section_planning:
+            section_plans = self._split_sections(source_doc, num_slides)
+        if section_plans is None:
+            section_plans = [(num_slides, source_doc.overview, self.functional_keys)]
+        # sections are planned concurrently and merged in the order of the document
+        section_outlines = await asyncio.gather(
+            *[
+                self._plan_section(planner, source_doc, *section_plan)
+                for section_plan in section_plans
+            ]
+        )
+        outline = sum(section_outlines, start=[])
+        self._save_outline(cache_file, outline)
+        return outline
 
-        outline = await self.staffs["planner"](
+    async def _plan_section(
+        self,
+        planner: AsyncAgent,
+        source_doc: Document,
+        num_slides: int,
+        document_overview: dict,
+        functional_layouts: list[str],
+    ) -> list[OutlineItem]:
+        """
+        Asynchronously plan the slides of a part of the document with a fork of the planner.
+        """
+        section_planner = planner.fork()
+        outline = await section_planner(
             num_slides=num_slides,
-            document_overview=source_doc.overview,
-            functional_layouts=self.functional_keys,
+            document_overview=document_overview,
+            functional_layouts=functional_layouts,
         )
-        outline = await self._valid_outline(outline, source_doc)
-
-        # Return the outline directly instead of saving to file
+        outline = await self._valid_outline(outline, source_doc, section_planner)
+        planner.merge(section_planner)
         return outline
 
     async def _valid_outline(
-        self, outline: list[dict], source_doc: Document, retry: int = 0
+        self,
+        outline: list[dict],
+        source_doc: Document,
+        planner: AsyncAgent,
+        retry: int = 0,
     ) -> list[OutlineItem]:
         """
         Asynchronously validate the generated outline.
@@ -551,84 +1224,263 @@ class PPTAgentAsync(PPTGen):
                 str(e),
             )
             if retry < self.retry_times:
-                new_outline = await self.staffs["planner"].retry(
+                new_outline = await planner.retry(
                     str(e), traceback.format_exc(), retry + 1
                 )
-                return await self._valid_outline(new_outline, source_doc, retry + 1)
+                return await self._valid_outline(
+                    new_outline, source_doc, planner, retry + 1
+                )
             else:
                 raise ValueError("Failed to generate outline, tried too many times")
 
     async def _generate_slide(
-        self, slide_idx: int, outline_item: OutlineItem
+        self, slide: SlideContext, outline_item: OutlineItem
     ) -> tuple[SlidePage, CodeExecutor]:
         """
         Asynchronously generate a slide from the outline item.
+        Layouts are shortlisted and their template slides rendered while organizing the content.
         """
         header, content_source, images = outline_item.retrieve(
-            slide_idx, self.source_doc
-        )
-        available_layouts = "\n".join(
-            [layout.overview for layout in self.layouts.values()]
+            slide.slide_idx, slide.deck.source_doc
         )
-        key_points = await self.staffs["content_organizer"](
-            content_source=content_source
+        (layouts, layout), key_points = await asyncio.gather(
+            self._prepare_layouts(slide, header, content_source, images),
+            self._organize_content(slide, outline_item, content_source),
         )
         slide_content = (
             json.dumps(key_points, indent=2, ensure_ascii=False)
             + "\nImages:\n"
             + images
         )
-        layout_selection = await self.staffs["layout_selector"](
-            outline=self.simple_outline,
+        if layout is not None:
+            slide.layout = layout.title
+            return await self.edit_slide(
+                slide, layout, slide_content, slide_description=header
+            )
+
+        layout_selection = await slide.staffs["layout_selector"](
+            outline=slide.deck.simple_outline,
             slide_description=header,
             slide_content=slide_content,
-            available_layouts=available_layouts,
+            available_layouts="\n".join(candidate.overview for candidate in layouts),
             functional_layouts=self.functional_keys,
         )
-        layout = max(
-            self.layouts.keys(),
-            key=lambda x: edit_distance(x, layout_selection["layout"]),
+        layout = self._match_layout(slide, layout_selection["layout"], layouts)
+        slide.layout = layout.title
+        candidates = [layout]
+        if self.race_layouts and self._use_layout_embeddings:
+            candidates += [
+                candidate for candidate in layouts if candidate is not layout
+            ][:1]
+        return await self._race_edit_slide(slide, candidates, slide_content, header)
+
+    async def organize_document(self, source_doc: Document):
+        """
+        Asynchronously extract and cache the key points of all subsections of the document ahead of generating slides.
+        """
+        assert (
+            self.key_points_cache_dir is not None
+        ), "key_points_cache_dir is required to organize the document ahead"
+        # subsections are organized concurrently, each by its own fork of the agent
+        content_organizers = [
+            self.staffs["content_organizer"].fork() for _ in source_doc.subsections
+        ]
+        results = await asyncio.gather(
+            *[
+                self._subsection_key_points(content_organizer, subsection)
+                for content_organizer, subsection in zip(
+                    content_organizers, source_doc.subsections
+                )
+            ],
+            return_exceptions=True,
         )
-        return await self.edit_slide(
-            self.layouts[layout], slide_content, slide_description=header
+        for content_organizer in content_organizers:
+            self.staffs["content_organizer"].merge(content_organizer)
+        # failed subsections are extracted again by the slides using them
+        for subsection, result in zip(source_doc.subsections, results):
+            if isinstance(result, Exception):
+                logger.warning(
+                    "Failed to organize subsection %s, error: %s",
+                    subsection.title,
+                    result,
+                )
+
+    async def _organize_content(
+        self, slide: SlideContext, outline_item: OutlineItem, content_source: str
+    ) -> list:
+        """
+        Asynchronously extract the key points of the slide, assembled from the key points of its subsections if they are cached.
+        """
+        content_organizer = slide.staffs["content_organizer"]
+        if self.key_points_cache_dir is None:
+            return await content_organizer(content_source=content_source)
+        subsection_key_points = await asyncio.gather(
+            *[
+                self._subsection_key_points(content_organizer, subsection)
+                for subsection in slide.deck.source_doc.retrieve(outline_item.indexs)
+            ]
+        )
+        return sum(subsection_key_points, start=[])
+
+    async def _subsection_key_points(
+        self, content_organizer: AsyncAgent, subsection: SubSection
+    ) -> list:
+        cache_key = self._key_points_key(subsection, content_organizer.model)
+        key_points = self._load_key_points(cache_key)
+        if key_points is not None:
+            return key_points
+        # slides sharing the subsection wait for the same extraction, a cancelled slide leaves it running for the others
+        if cache_key not in self._key_points_tasks:
+            task = asyncio.create_task(
+                self._extract_key_points(content_organizer, subsection, cache_key)
+            )
+            task.add_done_callback(
+                lambda _: self._key_points_tasks.pop(cache_key, None)
+            )
+            self._key_points_tasks[cache_key] = task
+        return await asyncio.shield(self._key_points_tasks[cache_key])
+
+    async def _extract_key_points(
+        self, content_organizer: AsyncAgent, subsection: SubSection, cache_key: str
+    ) -> list:
+        key_points = await content_organizer(content_source=subsection.content_source)
+        return self._save_key_points(cache_key, key_points)
+
+    async def _prepare_layouts(
+        self, slide: SlideContext, header: str, content_source: str, images: str
+    ) -> tuple[list[Layout], Optional[Layout]]:
+        """
+        Shortlist the layouts for a slide and prefetch the HTML of their template slides.
+        """
+        query_embedding = None
+        if self._use_layout_embeddings:
+            query_embedding = await self.text_embedder.get_embedding(
+                self._layout_query(header, content_source, images)
+            )
+        layouts, layout = self._shortlist_layouts(
+            query_embedding, len(images) != 0, slide.excluded_layouts
         )
+        for candidate in layouts[: self.layout_top_k]:
+            template_ids = [candidate.slide_id]
+            if candidate.vary_mapping is not None:
+                template_ids += candidate.vary_mapping.values()
+            for template_id in template_ids:
+                self._get_template_html(slide.deck, template_id)
+        return layouts, layout
+
+    def _get_template_html(self, deck: DeckContext, template_id: int) -> asyncio.Task:
+        """
+        Get the task rendering the HTML of a template slide, shared by all slides of the presentation.
+        """
+        if template_id not in deck.template_html:
+            deck.template_html[template_id] = asyncio.create_task(
+                asyncio.to_thread(self.presentation.slides[template_id - 1].to_html)
+            )
+        return deck.template_html[template_id]
+
+    async def _race_edit_slide(
+        self,
+        slide: SlideContext,
+        layouts: list[Layout],
+        slide_content: str,
+        slide_description: str,
+    ) -> tuple[SlidePage, CodeExecutor]:
+        """
+        Edit the slide with the layouts concurrently, return the first successful one and cancel the others.
+        """
+        # each candidate works with its own agents so their histories are not mixed up
+        candidates = [slide.deck.new_slide(slide.slide_idx) for _ in layouts]
+        tasks = {
+            asyncio.create_task(
+                self.edit_slide(
+                    candidate, layout, slide_content, slide_description, build=False
+                )
+            ): (candidate, layout)
+            for candidate, layout in zip(candidates, layouts)
+        }
+        pending = set(tasks)
+        try:
+            while len(pending) != 0:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        # only the winner is built, checkpointed and kept in the history of the slide
+                        winner, layout = tasks[task]
+                        for name, agent in winner.staffs.items():
+                            slide.staffs[name].merge(agent)
+                        slide.layout = layout.title
+                        slide.checkpoint = winner.checkpoint
+                        edit_slide, code_executor = task.result()
+                        slide.deck.build_slide(edit_slide)
+                        return edit_slide, code_executor
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            candidate_ids = {id(candidate) for candidate in candidates}
+            with slide.deck.lock:
+                slide.deck.slides = [
+                    other
+                    for other in slide.deck.slides
+                    if id(other) not in candidate_ids
+                ]
 
     async def edit_slide(
         self,
+        slide: SlideContext,
         layout: Layout,
         slide_content: str,
         slide_description: str,
+        build: bool = True,
     ) -> tuple[SlidePage, CodeExecutor]:
         """
         Asynchronously synergize Agents to generate a slide.
 
         Args:
+            slide (SlideContext): The context of the slide.
             layout (Layout): The layout data.
             slide_content (str): The slide content.
             slide_description (str): The description of the slide.
+            build (bool): Whether to build the slide in the presentation of the deck, left to the caller when racing layouts.
 
         Returns:
             tuple[SlidePage, CodeExecutor]: The generated slide and code executor.
         """
         code_executor = CodeExecutor(self.retry_times)
-        editor_output = await self.staffs["editor"](
-            outline=self.simple_outline,
+        editor_output = await slide.staffs["editor"](
+            outline=slide.deck.simple_outline,
             slide_description=slide_description,
-            metadata=self.source_doc.metainfo,
+            metadata=slide.deck.source_doc.metainfo,
             slide_content=slide_content,
             schema=layout.content_schema,
         )
-        command_list = await self._generate_commands(editor_output, layout)
-        template_id = layout.get_slide_id(editor_output)
-        edit_actions = await self.staffs["coder"](
-            api_docs=code_executor.get_apis_docs(API_TYPES.Agent.value),
-            edit_target=self.presentation.slides[template_id - 1].to_html(),
-            command_list="\n".join([str(i) for i in command_list]),
+        command_list, editor_output = await self._generate_commands(
+            slide, editor_output, layout
         )
+        template_id = layout.get_slide_id(editor_output)
+        template_slide = self.presentation.slides[template_id - 1]
+        # only ask the coder when the commands can't be mapped to api calls directly
+        coder_turns = 0
+        edit_actions = synthesize_actions(template_slide, command_list)
+        if edit_actions is None:
+            edit_actions = await slide.staffs["coder"](
+                api_docs=code_executor.get_apis_docs(API_TYPES.Agent.value),
+                edit_target=await self._get_template_html(slide.deck, template_id),
+                command_list="\n".join([str(i) for i in command_list]),
+            )
+            coder_turns += 1
+        edit_slide: Optional[SlidePage] = None
         for error_idx in range(self.retry_times):
-            edit_slide: SlidePage = deepcopy(self.presentation.slides[template_id - 1])
+            # continue from the failed api call if the corrected actions allow it
+            if edit_slide is None or not code_executor.resumable(
+                edit_actions, edit_slide
+            ):
+                edit_slide = deepcopy(template_slide)
             feedback = code_executor.execute_actions(
-                edit_actions, edit_slide, self.source_doc
+                edit_actions, edit_slide, slide.deck.source_doc
             )
             if feedback is None:
                 break
@@ -639,27 +1491,56 @@ class PPTAgentAsync(PPTGen):
                 str(feedback),
             )
 
-            if error_idx == self.retry_times:
-                raise Exception(
-                    f"Failed to generate slide, tried too many times at editing\ntraceback: {feedback[1]}"
+            if error_idx == self.retry_times - 1:
+                break
+            if coder_turns == 0:
+                edit_actions = await slide.staffs["coder"](
+                    api_docs=code_executor.get_apis_docs(API_TYPES.Agent.value),
+                    edit_target=await self._get_template_html(slide.deck, template_id),
+                    command_list="\n".join([str(i) for i in command_list]),
                 )
-            edit_actions = await self.staffs["coder"].retry(*feedback, error_idx + 1)
-        self.empty_prs.build_slide(edit_slide)
+            else:
+                edit_actions = await slide.staffs["coder"].retry(*feedback, coder_turns)
+            coder_turns += 1
+        if feedback is not None:
+            raise Exception(
+                f"Failed to generate slide, tried too many times at editing\ntraceback: {feedback[1]}"
+            )
+        resize_actions = layout.resize_actions(editor_output)
+        if feedback is None and resize_actions:
+            # apply the font sizes shrunk to fit the text boxes after the edits, replayed with the actions on resume
+            edit_actions = extract_code(edit_actions) + "\n" + resize_actions
+            feedback = code_executor.execute_actions(
+                edit_actions, edit_slide, slide.deck.source_doc
+            )
+            if feedback is not None:
+                raise Exception(f"Failed to fit the text of the slide: {feedback[1]}")
+        if build:
+            slide.deck.build_slide(edit_slide)
+        slide.checkpoint = {
+            "layout": layout.title,
+            "template_id": template_id,
+            "editor_output": editor_output,
+            "command_list": command_list,
+            "actions": edit_actions,
+            "html": await asyncio.to_thread(edit_slide.to_html),
+        }
         return edit_slide, code_executor
 
     async def _generate_commands(
-        self, editor_output: dict, layout: Layout, retry: int = 0
+        self, slide: SlideContext, editor_output: dict, layout: Layout, retry: int = 0
     ):
         """
         Asynchronously generate commands for editing the slide content.
 
         Args:
+            slide (SlideContext): The context of the slide.
             editor_output (dict): The editor output.
             layout (Layout): The layout object containing content schema.
             retry (int, optional): The number of retries. Defaults to 0.
 
         Returns:
-            list: A list of commands.
+            tuple[list, dict]: A list of commands and the validated editor output.
 
         Raises:
             Exception: If command generation fails.
@@ -667,16 +1548,18 @@ class PPTAgentAsync(PPTGen):
         command_list = []
         try:
             layout.validate(
-                editor_output, self.length_factor, self.source_doc.image_dir
+                editor_output, self.length_factor, slide.deck.source_doc.image_dir
             )
         except Exception as e:
             if retry < self.retry_times:
-                new_output = await self.staffs["editor"].retry(
+                new_output = await slide.staffs["editor"].retry(
                     e,
                     traceback.format_exc(),
                     retry + 1,
                 )
-                return await self._generate_commands(new_output, layout, retry + 1)
+                return await self._generate_commands(
+                    slide, new_output, layout, retry + 1
+                )
             else:
                 raise Exception(
                     f"Failed to generate commands, tried too many times at editing\ntraceback: {e}"
@@ -703,4 +1586,4 @@ class PPTAgentAsync(PPTGen):
             )
 
         assert len(command_list) > 0, "No commands generated"
-        return command_list
+        return command_list, editor_output
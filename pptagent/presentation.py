@@ -1,16 +1,31 @@
+import os
+import threading
 import traceback
 from collections.abc import Generator
-from typing import Optional
+from copy import copy, deepcopy
+from io import BytesIO
+from typing import IO, Optional
 
 from packaging.version import Version
+from PIL import Image
 from pptx import Presentation as PPTXPre
 from pptx import __version__ as PPTXVersion
 from pptx.shapes.base import BaseShape
 from pptx.shapes.group import GroupShape as PPTXGroupShape
 from pptx.slide import Slide as PPTXSlide
 
-from pptagent.shapes import Background, GroupShape, Picture, ShapeElement, StyleArg, T
-from pptagent.utils import Config, get_logger
+from pptagent.preview import SlideRenderer
+from pptagent.shapes import (
+    IMAGE_PARTS,
+    Background,
+    EditTransaction,
+    GroupShape,
+    Picture,
+    ShapeElement,
+    StyleArg,
+    T,
+)
+from pptagent.utils import Config, get_logger, pjoin
 
 PPTXVersion, Mark = PPTXVersion.split("+")
 assert (
@@ -21,6 +36,9 @@ assert (
 
 logger = get_logger(__name__)
 
+# template slides are rendered in worker threads, their caches are replaced under the lock instead of mutated
+CACHE_LOCK = threading.Lock()
+
 
 class SlidePage:
     """
@@ -62,16 +80,40 @@ class SlidePage:
         self.slide_title = slide_title
         self.slide_width = slide_width
         self.slide_height = slide_height
-
-        # Assign group labels to group shapes
-        groups_shapes_labels = []
+        self._shape_index: dict[int, ShapeElement] = {}
+        self._type_index: dict[type, list[ShapeElement]] = {}
+        self._text_content: Optional[str] = None
+        self._text_length: Optional[int] = None
+        # the HTML of each top-level shape by style arguments, shapes are rendered again only after edits
+        self._html_cache: dict[StyleArg, dict[int, str]] = {}
+        self._cache_version = 0
+        self._compact_cache: dict[StyleArg, str] = {}
+        self._root_index: dict[int, int] = {}
+        for root in self.shapes:
+            for shape in root if isinstance(root, GroupShape) else [root]:
+                self._shape_index.setdefault(shape.shape_idx, shape)
+                self._root_index.setdefault(shape.shape_idx, root.shape_idx)
+
+        # Assign group labels to group shapes, groups of the same structure share a label
+        group_labels = {}
         for shape in self.shape_filter(GroupShape):
-            for group_shape in groups_shapes_labels:
-                if group_shape == shape:
-                    shape.group_label = group_shape.group_label
-                    continue
-            groups_shapes_labels.append(shape)
-            shape.group_label = f"group_{len(groups_shapes_labels)}"
+            if shape.structure not in group_labels:
+                group_labels[shape.structure] = f"group_{len(group_labels) + 1}"
+            shape.group_label = group_labels[shape.structure]
+
+    def __deepcopy__(self, memo: dict) -> "SlidePage":
+        """
+        Copy the slide page, the caches are shared with the copy as they are never mutated in place.
+        """
+        with CACHE_LOCK:
+            state = dict(vars(self))
+        slide = copy(self)
+        memo[id(self)] = slide
+        for key, value in state.items():
+            if key not in ("_html_cache", "_compact_cache"):
+                value = deepcopy(value, memo)
+            setattr(slide, key, value)
+        return slide
 
     @classmethod
     def from_slide(
@@ -147,12 +189,13 @@ class SlidePage:
         for background in self.backgrounds:
             background.build(slide)
 
-        # Build shapes and apply closures
+        # Build shapes and apply closures, the closures of a shape share a transaction
         for shape in self.shapes:
             build_shape = shape.build(slide)
+            transaction = EditTransaction(build_shape)
             for closure in shape.closures:
                 try:
-                    closure.apply(build_shape)
+                    closure.apply(transaction)
                 except Exception as e:
                     raise ValueError(f"Failed to apply closures to slides: {e}")
         return slide
@@ -171,13 +214,92 @@ class SlidePage:
             T: The filtered shapes.
         """
         if shapes is None:
-            shapes = self.shapes
+            indexed = self._type_index.get(shape_type)
+            if indexed is None:
+                indexed = list(self.shape_filter(shape_type, self.shapes))
+                with CACHE_LOCK:
+                    self._type_index = self._type_index | {shape_type: indexed}
+            # iterate over a copy, so shapes can be removed while filtering
+            yield from tuple(indexed)
+            return
         for shape in shapes:
             if isinstance(shape, shape_type):
                 yield shape
             elif isinstance(shape, GroupShape):
                 yield from self.shape_filter(shape_type, shape.data)
 
+    def get_shape(self, shape_idx: int) -> Optional[ShapeElement]:
+        """
+        Get a shape, excluding group shapes, by its index.
+
+        Args:
+            shape_idx (int): The index of the shape.
+
+        Returns:
+            Optional[ShapeElement]: The shape, or None if it is not found.
+        """
+        return self._shape_index.get(shape_idx)
+
+    def remove_shape(self, shape: ShapeElement):
+        """
+        Remove a shape from the slide page or its group, keeping the shape index up to date.
+
+        Args:
+            shape (ShapeElement): The shape to remove.
+
+        Raises:
+            ValueError: If the shape is not in the slide page.
+        """
+        parents = [self.shapes]
+        while len(parents) != 0:
+            shapes = parents.pop()
+            if any(s is shape for s in shapes):
+                break
+            parents.extend(s.data for s in shapes if isinstance(s, GroupShape))
+        else:
+            raise ValueError(
+                f"Shape {shape.shape_idx} is not in slide {self.slide_idx}"
+            )
+        self.clear_cache(shape)
+        shapes[:] = [s for s in shapes if s is not shape]
+        removed = [shape, *shape] if isinstance(shape, GroupShape) else [shape]
+        for s in removed:
+            if self._shape_index.get(s.shape_idx) is s:
+                del self._shape_index[s.shape_idx]
+                self._root_index.pop(s.shape_idx, None)
+        removed_ids = {id(s) for s in removed}
+        with CACHE_LOCK:
+            self._type_index = {
+                shape_type: [s for s in indexed if id(s) not in removed_ids]
+                for shape_type, indexed in self._type_index.items()
+            }
+
+    def clear_cache(self, shape: Optional[ShapeElement] = None):
+        """
+        Clear the cached text and HTML of the slide page, called after its shapes are edited.
+
+        Args:
+            shape (Optional[ShapeElement]): The edited shape, only the HTML of it or its group is cleared.
+                The HTML of all shapes is cleared if None.
+        """
+        self._text_content = None
+        self._text_length = None
+        with CACHE_LOCK:
+            # renderings started before the edit are not published
+            self._cache_version += 1
+            # the classes of the compact format are numbered across the slide, so it is rendered again as a whole
+            self._compact_cache = {}
+            if shape is None:
+                self._html_cache = {}
+                return
+            root_idx = self._root_index.get(shape.shape_idx, shape.shape_idx)
+            self._html_cache = {
+                style_args: {
+                    idx: html for idx, html in rendered.items() if idx != root_idx
+                }
+                for style_args, rendered in self._html_cache.items()
+            }
+
     def get_content_type(self) -> str:
         """
         Get the content type of the slide.
@@ -191,7 +313,7 @@ class SlidePage:
 
     def to_html(self, style_args: Optional[StyleArg] = None, **kwargs) -> str:
         """
-        Represent the slide page in HTML.
+        Represent the slide page in HTML, or in the compact format if `style_args.compact`.
 
         Args:
             style_args (Optional[StyleArg]): The style arguments for HTML conversion.
@@ -202,16 +324,72 @@ class SlidePage:
         """
         if style_args is None:
             style_args = StyleArg(**kwargs)
+        if style_args.compact:
+            return self.to_compact(style_args)
+        version = self._cache_version
+        rendered = self._html_cache.get(style_args, {})
+        missing = [shape for shape in self.shapes if shape.shape_idx not in rendered]
+        if len(missing) != 0:
+            rendered = rendered | {
+                shape.shape_idx: shape.to_html(style_args) for shape in missing
+            }
+            with CACHE_LOCK:
+                if version == self._cache_version:
+                    self._html_cache = self._html_cache | {style_args: rendered}
         return "".join(
             [
                 "<!DOCTYPE html>\n<html>\n",
                 (f"<title>{self.slide_title}</title>\n" if self.slide_title else ""),
                 f'<body style="width:{self.slide_width}pt; height:{self.slide_height}pt;">\n',
-                "\n".join([shape.to_html(style_args) for shape in self.shapes]),
+                "\n".join([rendered[shape.shape_idx] for shape in self.shapes]),
                 "</body>\n</html>\n",
             ]
         )
 
+    def to_compact(self, style_args: Optional[StyleArg] = None, **kwargs) -> str:
+        """
+        Represent the slide page in the compact format, see `StyleArg`.
+
+        Args:
+            style_args (Optional[StyleArg]): The style arguments for conversion.
+            **kwargs: Additional arguments.
+
+        Returns:
+            str: The compact representation of the slide page.
+        """
+        if style_args is None:
+            style_args = StyleArg(**kwargs)
+        compact = self._compact_cache.get(style_args)
+        if compact is not None:
+            return compact
+        version = self._cache_version
+        classes = {}
+        shapes = [shape.to_compact(style_args, classes) for shape in self.shapes]
+        compact = "\n".join(
+            [
+                f"slide size={self.slide_width}x{self.slide_height}"
+                + (f" title='{self.slide_title}'" if self.slide_title else ""),
+                *[f".{name} {style}" for style, name in classes.items()],
+                *[shape for shape in shapes if shape],
+            ]
+        )
+        with CACHE_LOCK:
+            if version == self._cache_version:
+                self._compact_cache = self._compact_cache | {style_args: compact}
+        return compact
+
+    def to_image(self, width: int = 960) -> Image.Image:
+        """
+        Render a preview of the slide page without LibreOffice.
+
+        Args:
+            width (int): The width of the image in pixels.
+
+        Returns:
+            Image.Image: The rendered preview.
+        """
+        return SlideRenderer(self.slide_width, self.slide_height, width).render(self)
+
     def to_text(self, show_image: bool = False) -> str:
         """
         Represent the slide page in text.
@@ -225,13 +403,15 @@ class SlidePage:
         Raises:
             ValueError: If an image caption is not found.
         """
-        text_content = "\n".join(
-            [
-                shape.text_frame.text.strip()
-                for shape in self.shapes
-                if shape.text_frame.is_textframe
-            ]
-        )
+        if self._text_content is None:
+            self._text_content = "\n".join(
+                [
+                    shape.text_frame.text.strip()
+                    for shape in self.shapes
+                    if shape.text_frame.is_textframe
+                ]
+            )
+        text_content = self._text_content
         if show_image:
             for image in self.shape_filter(Picture):
                 if image.caption is None:
@@ -249,7 +429,9 @@ class SlidePage:
         Returns:
             int: The length of the text.
         """
-        return sum([len(shape.text_frame) for shape in self.shapes])
+        if self._text_length is None:
+            self._text_length = sum([len(shape.text_frame) for shape in self.shapes])
+        return self._text_length
 
     def __iter__(self):
         """
@@ -366,12 +548,13 @@ class Presentation:
             slides, error_history, slide_width, slide_height, file_path, num_pages
         )
 
-    def save(self, file_path: str, layout_only: bool = False) -> None:
+    def save(self, file_path: str | IO[bytes], layout_only: bool = False) -> None:
         """
         Save the presentation to a file.
 
         Args:
-            file_path (str): The path to save the presentation to.
+            file_path (str | IO[bytes]): The path or the binary stream to save the presentation to,
+                the stream is not required to be seekable so the package can be streamed while it's written.
             layout_only (bool): Whether to save only the layout.
         """
         self.clear_slides()
@@ -383,6 +566,20 @@ class Presentation:
                 self.clear_text(pptx_slide.shapes)
         self.prs.save(file_path)
 
+    def to_bytes(self, layout_only: bool = False) -> bytes:
+        """
+        Save the presentation in memory.
+
+        Args:
+            layout_only (bool): Whether to save only the layout.
+
+        Returns:
+            bytes: The content of the pptx file.
+        """
+        stream = BytesIO()
+        self.save(stream, layout_only)
+        return stream.getvalue()
+
     def build_slide(self, slide: SlidePage) -> PPTXSlide:
         """
         Build a slide in the presentation.
@@ -399,6 +596,7 @@ class Presentation:
             rId = self.prs.slides._sldIdLst[0].rId
             self.prs.part.drop_rel(rId)
             del self.prs.slides._sldIdLst[0]
+        IMAGE_PARTS.pop(self.prs.part.package, None)
 
     def clear_images(self, shapes: list[ShapeElement]):
         for shape in shapes:
@@ -416,6 +614,26 @@ class Presentation:
                     for run in para.runs:
                         run.text = "a" * len(run.text)
 
+    def to_images(self, output_dir: str, width: int = 960) -> list[str]:
+        """
+        Render previews of the slides without LibreOffice.
+        Images are named like `ppt_to_images`, numbered by their position in `slides`.
+
+        Args:
+            output_dir (str): The directory to save the images to.
+            width (int): The width of the images in pixels.
+
+        Returns:
+            list[str]: The paths of the saved images.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        renderer = SlideRenderer(self.slide_width.pt, self.slide_height.pt, width)
+        image_paths = []
+        for i, slide in enumerate(self.slides, 1):
+            image_paths.append(pjoin(output_dir, f"slide_{i:04d}.jpg"))
+            renderer.render(slide).save(image_paths[-1])
+        return image_paths
+
     def to_text(self, show_image: bool = False) -> str:
         """
         Represent the presentation in text.
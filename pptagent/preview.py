@@ -0,0 +1,254 @@
+import os
+import re
+from functools import lru_cache
+from itertools import accumulate
+from typing import Optional
+
+from PIL import Image, ImageDraw, ImageFont
+from pptx.enum.dml import MSO_FILL_TYPE
+
+from pptagent.shapes import (
+    Fill,
+    GroupShape,
+    Picture,
+    SemanticPicture,
+    ShapeElement,
+    TextFrame,
+)
+from pptagent.utils import get_logger, pexists
+
+logger = get_logger(__name__)
+
+PREVIEW_FONT = os.environ.get("PREVIEW_FONT", "DejaVuSans.ttf")
+DEFAULT_FONT_SIZE = 18
+LINE_SPACING = 1.2
+PLACEHOLDER_COLOR = "#D9D9D9"
+OUTLINE_COLOR = "#A6A6A6"
+RGB_COLOR = re.compile(r'<a:srgbClr val="([0-9A-Fa-f]{6})"')
+
+
+@lru_cache(maxsize=64)
+def _load_font(size: int) -> ImageFont.FreeTypeFont:
+    try:
+        return ImageFont.truetype(PREVIEW_FONT, size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=8192)
+def _load_glyph(size: int, char: str) -> tuple[Image.Image, tuple[int, int], float]:
+    """
+    Rasterize a glyph once, drawing text glyph by glyph from the cache is
+    several times faster than letting FreeType render every line.
+    """
+    font = _load_font(size)
+    left, top, right, bottom = font.getbbox(char)
+    mask = Image.new("L", (max(1, right - left), max(1, bottom - top)))
+    ImageDraw.Draw(mask).text((-left, -top), char, font=font, fill=255)
+    return mask, (left, top), font.getlength(char)
+
+
+def text_width(size: int, text: str) -> float:
+    """
+    Get the width of a text in pixels, rendered at the font size in pixels.
+    """
+    return sum(_load_glyph(size, char)[2] for char in text)
+
+
+def _text_mask(size: int, text: str) -> Image.Image:
+    ascent, descent = _load_font(size).getmetrics()
+    mask = Image.new(
+        "L", (max(1, round(text_width(size, text)) + size), ascent + descent)
+    )
+    x = 0
+    for char in text:
+        glyph, (left, top), advance = _load_glyph(size, char)
+        mask.paste(glyph, (round(x) + left, top))
+        x += advance
+    return mask
+
+
+@lru_cache(maxsize=256)
+def _load_image(path: str, mtime_ns: int, size: tuple[int, int]) -> Image.Image:
+    with Image.open(path) as image:
+        # decode JPEGs at a reduced scale, thumbnails never need the full resolution
+        image.draft("RGB", size)
+        return image.convert("RGBA").resize(size)
+
+
+def _fill_color(fill: Optional[Fill]) -> Optional[str]:
+    """
+    Get the color of a fill, theme colors are approximated by a placeholder color.
+    """
+    if fill is None or fill.fill_type in [MSO_FILL_TYPE.BACKGROUND, None]:
+        return None
+    if fill.fill_type == MSO_FILL_TYPE.PICTURE:
+        return PLACEHOLDER_COLOR
+    match = RGB_COLOR.search(fill.fill_xml or "")
+    if match is None:
+        return PLACEHOLDER_COLOR
+    return "#" + match.group(1)
+
+
+class SlideRenderer:
+    """
+    Draw slides from their shape model with PIL, an approximate but layout-faithful
+    preview that does not need LibreOffice.
+    """
+
+    def __init__(self, slide_width: float, slide_height: float, width: int = 960):
+        """
+        Initialize the SlideRenderer.
+
+        Args:
+            slide_width (float): The width of the slides in points.
+            slide_height (float): The height of the slides in points.
+            width (int): The width of the rendered images in pixels.
+        """
+        self.scale = width / slide_width
+        self.size = (width, max(1, round(slide_height * self.scale)))
+
+    def render(self, slide) -> Image.Image:
+        """
+        Render a slide page to an image.
+
+        Args:
+            slide (SlidePage): The slide page to render.
+
+        Returns:
+            Image.Image: The rendered slide.
+        """
+        canvas = Image.new("RGB", self.size, "white")
+        draw = ImageDraw.Draw(canvas)
+        for background in slide.backgrounds:
+            if isinstance(background, Picture):
+                self.draw_shape(canvas, draw, background)
+            elif background.fill_type == MSO_FILL_TYPE.PICTURE:
+                self.paste_image(canvas, background.image_path, (0, 0, *self.size))
+            elif (color := _fill_color(background)) is not None:
+                draw.rectangle((0, 0, *self.size), fill=color)
+        for shape in slide.shapes:
+            self.draw_shape(canvas, draw, shape)
+        return canvas
+
+    def bounds(self, shape: ShapeElement) -> tuple[int, int, int, int]:
+        """
+        Get the pixel bounds of a shape.
+        """
+        left, top = shape.left * self.scale, shape.top * self.scale
+        return (
+            round(left),
+            round(top),
+            round(left + shape.width * self.scale),
+            round(top + shape.height * self.scale),
+        )
+
+    def draw_shape(
+        self, canvas: Image.Image, draw: ImageDraw.ImageDraw, shape: ShapeElement
+    ):
+        """
+        Draw a shape and its text frame on the canvas.
+        """
+        if isinstance(shape, GroupShape):
+            for sub_shape in shape.data:
+                self.draw_shape(canvas, draw, sub_shape)
+            return
+        box = self.bounds(shape)
+        if box[2] <= box[0] or box[3] <= box[1]:
+            return
+        fill = getattr(shape, "fill", None)
+        line = getattr(shape, "line", None)
+        outline = _fill_color(line.fill) if line is not None else None
+        if isinstance(shape, Picture):
+            self.paste_image(canvas, shape.img_path, box)
+        elif isinstance(shape, SemanticPicture):
+            draw.rectangle(box, fill=PLACEHOLDER_COLOR, outline=OUTLINE_COLOR)
+        elif fill is not None and fill.fill_type == MSO_FILL_TYPE.PICTURE:
+            self.paste_image(canvas, fill.image_path, box)
+        elif (color := _fill_color(fill)) is not None or outline is not None:
+            draw.rectangle(box, fill=color, outline=outline)
+        if shape.text_frame.is_textframe:
+            self.draw_text(draw, shape.text_frame, box)
+
+    def paste_image(
+        self, canvas: Image.Image, path: Optional[str], box: tuple[int, int, int, int]
+    ):
+        """
+        Paste an image scaled into the box, missing images are drawn as placeholders.
+        """
+        size = (box[2] - box[0], box[3] - box[1])
+        if path is None or not pexists(path):
+            draw = ImageDraw.Draw(canvas)
+            draw.rectangle(box, fill=PLACEHOLDER_COLOR, outline=OUTLINE_COLOR)
+            draw.line(box, fill=OUTLINE_COLOR)
+            return
+        try:
+            image = _load_image(path, os.stat(path).st_mtime_ns, size)
+        except Exception as e:
+            logger.debug("Failed to load image %s for preview: %s", path, e)
+            ImageDraw.Draw(canvas).rectangle(box, fill=PLACEHOLDER_COLOR)
+            return
+        canvas.paste(image, box[:2], image)
+
+    def draw_text(
+        self,
+        draw: ImageDraw.ImageDraw,
+        text_frame: TextFrame,
+        box: tuple[int, int, int, int],
+    ):
+        """
+        Draw the paragraphs of a text frame, wrapped by words and clipped to the box.
+        """
+        y = box[1]
+        for para in text_frame.paragraphs:
+            if para.idx == -1:
+                continue
+            size = (
+                para.font.get("size")
+                or text_frame.font.get("size")
+                or DEFAULT_FONT_SIZE
+            )
+            font_size = max(1, round(size * self.scale))
+            color = para.font.get("color") or text_frame.font.get("color")
+            if not (isinstance(color, str) and len(color) == 6):
+                color = "000000"
+            line_height = size * self.scale * LINE_SPACING
+            text = ("• " if para.bullet else "") + para.text
+            for line in self.wrap(text, font_size, box[2] - box[0]):
+                if y + line_height > box[3]:
+                    return
+                draw.bitmap(
+                    (box[0], round(y)), _text_mask(font_size, line), fill="#" + color
+                )
+                y += line_height
+
+    @staticmethod
+    def wrap(text: str, font_size: int, width: float) -> list[str]:
+        """
+        Wrap the text into lines fitting the width, breaking between words
+        and inside words too long for a line, as CJK text has no spaces.
+        """
+        lines = []
+        space_width = text_width(font_size, " ")
+        for segment in text.splitlines() or [""]:
+            line, line_width = "", 0.0
+            for word in segment.split(" "):
+                word_width = text_width(font_size, word)
+                if not line:
+                    line, line_width = word, word_width
+                elif line_width + space_width + word_width > width:
+                    lines.append(line)
+                    line, line_width = word, word_width
+                else:
+                    line += " " + word
+                    line_width += space_width + word_width
+                while len(line) > 1 and line_width > width:
+                    advances = accumulate(
+                        _load_glyph(font_size, char)[2] for char in line
+                    )
+                    split = max(1, sum(advance <= width for advance in advances))
+                    lines.append(line[:split])
+                    line = line[split:]
+                    line_width = text_width(font_size, line)
+            lines.append(line)
+        return lines
@@ -1,6 +1,13 @@
+import hashlib
+import os
 import re
+import sys
+import zlib
+from copy import deepcopy
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Callable, Optional, TypeVar, Union
+from weakref import WeakKeyDictionary
 
 from lxml import etree
 from pptx.chart.chart import Chart as PPTXChart
@@ -8,7 +15,10 @@ from pptx.dml.fill import FillFormat
 from pptx.dml.line import LineFormat
 from pptx.enum.dml import MSO_FILL_TYPE
 from pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
 from pptx.oxml import parse_xml
+from pptx.package import Package
+from pptx.parts.image import ImagePart
 from pptx.parts.slide import SlidePart
 from pptx.shapes.autoshape import Shape as PPTXAutoShape
 from pptx.shapes.base import BaseShape
@@ -35,12 +45,72 @@ from pptagent.utils import (
 
 INDENT = "\t"
 T = TypeVar("T", bound="ShapeElement")
+CLOSURE_KEYS = ("clone", "replace", "delete", "style", "merge")
+# keep the XML of shapes compressed in memory, for workers holding many templates
+COMPRESS_XML = os.environ.get("COMPRESS_XML", "0") == "1"
+# image parts of a package by sha1, dropped by `Presentation.clear_slides` as the parts may be unreachable then
+IMAGE_PARTS: WeakKeyDictionary[Package, dict[str, ImagePart]] = WeakKeyDictionary()
+# serialize slides in the compact format by default, to save prompt tokens of the coder and induction
+COMPACT_SLIDES = os.environ.get("COMPACT_SLIDES", "0") == "1"
 
 
-@dataclass
+@lru_cache(maxsize=1024)
+def _parse_xml(xml: str, oxml: bool = True) -> etree._Element:
+    return parse_xml(xml) if oxml else etree.fromstring(xml)
+
+
+def clone_xml(xml: str, oxml: bool = True) -> etree._Element:
+    """
+    Get a copy of the parsed XML, the parsed element is cached as the template so it's only parsed once.
+
+    Args:
+        xml (str): The XML string.
+        oxml (bool): Whether to parse with the parser of python-pptx, which creates its custom element classes.
+    """
+    # the XmlString of python-pptx is not hashable
+    return deepcopy(_parse_xml(str(xml), oxml))
+
+
+@lru_cache(maxsize=1024)
+def _image_sha1(image_path: str, mtime_ns: int) -> str:
+    """
+    Hash an image file like python-pptx, only the hash is cached so image blobs are kept by their packages alone.
+    """
+    with open(image_path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def get_or_add_image_part(part: SlidePart, image_path: str) -> tuple[ImagePart, str]:
+    """
+    Get the image part of the image related to the slide part, an image file is only hashed once,
+    and found by its sha1 instead of hashing all image parts of the package like python-pptx does.
+
+    Returns:
+        tuple[ImagePart, str]: The image part and its relationship id.
+    """
+    sha1 = _image_sha1(image_path, os.stat(image_path).st_mtime_ns)
+    image_parts = IMAGE_PARTS.setdefault(part.package, {})
+    if sha1 not in image_parts:
+        image_parts[sha1] = part.package.get_or_add_image_part(image_path)
+    return image_parts[sha1], part.relate_to(image_parts[sha1], RT.IMAGE)
+
+
+def intern_strings(d: dict) -> dict:
+    """
+    Intern the keys and string values of a style dict, as they repeat across shapes and paragraphs.
+    """
+    return {
+        sys.intern(k): sys.intern(v) if isinstance(v, str) else v for k, v in d.items()
+    }
+
+
+@dataclass(frozen=True)
 class StyleArg:
     """
     A class to represent style arguments for HTML conversion.
+    With `compact`, slides are serialized in the compact format instead of HTML:
+    one line per element as `tag#id.class attr=value: text`, nested by indentation,
+    with the font styles deduplicated into classes listed before the elements.
     """
 
     paragraph_id: bool = True
@@ -54,6 +124,7 @@ class StyleArg:
     show_image: bool = True
     show_content: bool = True
     show_semantic_name: bool = False
+    compact: bool = COMPACT_SLIDES
 
     @classmethod
     def all_true(cls) -> "StyleArg":
@@ -71,11 +142,31 @@ class StyleArg:
         )
 
 
+def style_class(classes: dict[str, str], style: str) -> str:
+    """
+    Get the class of a style in the compact format, registering the style if it is new.
+
+    Args:
+        classes (dict[str, str]): The classes of the slide by their styles.
+        style (str): The style string.
+
+    Returns:
+        str: The class selector, or an empty string if the style is empty.
+    """
+    if not style:
+        return ""
+    if style not in classes:
+        classes[style] = f"s{len(classes) + 1}"
+    return "." + classes[style]
+
+
 class Fill:
     """
     A class to represent a fill.
     """
 
+    __slots__ = ("fill_type", "fill_str", "fill_xml", "image_path")
+
     def __init__(
         self,
         fill_type: MSO_FILL_TYPE,
@@ -114,10 +205,10 @@ class Fill:
             return
         if self.fill_type == MSO_FILL_TYPE.PICTURE:
             fill.blip()
-            _, rId = part.get_or_add_image_part(self.image_path)
+            _, rId = get_or_add_image_part(part, self.image_path)
             fill.rId = rId
         else:
-            new_element = etree.fromstring(self.fill_xml)
+            new_element = clone_xml(self.fill_xml, oxml=False)
             fill._xPr.getparent().replace(fill._xPr, new_element)
 
     def to_html(self, style_args: StyleArg) -> str:
@@ -131,6 +222,8 @@ class Line:
     A class to represent a line.
     """
 
+    __slots__ = ("fill", "line_width", "line_dash_style")
+
     def __init__(self, fill: Fill, line_width: float, line_dash_style: str):
         self.fill = fill
         self.line_width = line_width
@@ -162,6 +255,8 @@ class Background(Fill):
     A class to represent a slide background.
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_slide(cls, slide: PPTXSlide, config: Config) -> "Background":
         """
@@ -191,7 +286,7 @@ class Background(Fill):
         """
 
 
-@dataclass
+@dataclass(slots=True)
 class Closure:
     """
     A class to represent a closure that can be applied to a shape.
@@ -200,12 +295,12 @@ class Closure:
     closure: Callable
     paragraph_id: int = -1
 
-    def apply(self, shape: BaseShape) -> None:
+    def apply(self, shape: Union[BaseShape, "EditTransaction"]) -> None:
         """
         Apply the closure to a shape.
 
         Args:
-            shape (BaseShape): The shape to apply the closure to.
+            shape (BaseShape | EditTransaction): The shape to apply the closure to, or its edit transaction.
         """
         self.closure(shape)
 
@@ -223,11 +318,61 @@ class Closure:
             return self.paragraph_id > other.paragraph_id
 
 
+class EditTransaction:
+    """
+    The closures of a shape applied as one transaction on its XML tree.
+    Paragraphs are collected once and kept in sync by the clones and deletions of the closures,
+    other attributes are delegated to the shape.
+    """
+
+    __slots__ = ("shape", "_paragraphs")
+
+    def __init__(self, shape: BaseShape):
+        self.shape = shape
+        self._paragraphs: Optional[list[_Paragraph]] = None
+
+    @classmethod
+    def wrap(cls, shape: Union[BaseShape, "EditTransaction"]) -> "EditTransaction":
+        """
+        Get the transaction of a shape, closures can also be applied to shapes directly.
+        """
+        if isinstance(shape, EditTransaction):
+            return shape
+        return cls(shape)
+
+    @property
+    def paragraphs(self) -> list[_Paragraph]:
+        if self._paragraphs is None:
+            self._paragraphs = list(self.shape.text_frame.paragraphs)
+        return self._paragraphs
+
+    def clone_paragraph(self, paragraph_id: int) -> None:
+        """
+        Append a copy of a paragraph after the last paragraph.
+        """
+        para = self.paragraphs[paragraph_id]
+        element = deepcopy(para._p)
+        self.paragraphs[-1]._p.addnext(element)
+        self.paragraphs.append(_Paragraph(element, para._parent))
+
+    def delete_paragraph(self, paragraph_id: int) -> None:
+        """
+        Remove a paragraph, the following paragraphs are shifted like in the text frame.
+        """
+        para = self.paragraphs.pop(paragraph_id)
+        para._p.getparent().remove(para._p)
+
+    def __getattr__(self, name: str):
+        return getattr(self.shape, name)
+
+
 class Paragraph:
     """
     A class to represent a paragraph in a text frame.
     """
 
+    __slots__ = ("idx", "real_idx", "bullet", "font", "text")
+
     def __init__(self, paragraph: _Paragraph, idx: int):
         """
         Initialize a Paragraph.
@@ -243,8 +388,8 @@ class Paragraph:
         if run is None:
             self.idx = -1
             return
-        self.font = merge_dict(
-            object_to_dict(paragraph.font), [object_to_dict(run.font)]
+        self.font = intern_strings(
+            merge_dict(object_to_dict(paragraph.font), [object_to_dict(run.font)])
         )
         self.text = re.sub(r"(_x000B_|\\x0b)", " ", paragraph.text)
 
@@ -273,6 +418,30 @@ class Paragraph:
             style_str += f" bullet-type='{self.bullet}'"
         return f"<{tag}{id_str}{style_str}>{self.text}</{tag}>"
 
+    def to_compact(self, style_args: StyleArg, classes: dict[str, str]) -> str:
+        """
+        Convert the paragraph to the compact format.
+
+        Args:
+            style_args (StyleArg): The style arguments for conversion.
+            classes (dict[str, str]): The classes of the slide by their styles.
+
+        Returns:
+            str: The compact representation of the paragraph.
+
+        Raises:
+            ValueError: If the paragraph is not valid.
+        """
+        if self.idx == -1:
+            raise ValueError(f"paragraph {self.idx} is not valid")
+        tag = "li" if self.bullet else "p"
+        id_str = f"#{self.idx}" if style_args.paragraph_id else ""
+        if style_args.font_style:
+            id_str += style_class(classes, get_font_style(self.font))
+        if self.bullet:
+            id_str += f" bullet={self.bullet}"
+        return f"{tag}{id_str}: {self.text}"
+
     def __repr__(self) -> str:
         """
         Get a string representation of the paragraph.
@@ -288,6 +457,8 @@ class TextFrame:
     A class to represent a text frame in a shape.
     """
 
+    __slots__ = ("is_textframe", "paragraphs", "level", "text", "font")
+
     def __init__(self, shape: BaseShape, level: int):
         """
         Initialize a TextFrame.
@@ -315,9 +486,11 @@ class TextFrame:
         self.level = level
         self.text = shape.text
         self.is_textframe = True
-        self.font = merge_dict(
-            object_to_dict(shape.text_frame.font),
-            [para.font for para in self.paragraphs if para.idx != -1],
+        self.font = intern_strings(
+            merge_dict(
+                object_to_dict(shape.text_frame.font),
+                [para.font for para in self.paragraphs if para.idx != -1],
+            )
         )
 
     def to_html(self, style_args: StyleArg) -> str:
@@ -337,6 +510,27 @@ class TextFrame:
         ]
         return "\n".join([INDENT * self.level + repr for repr in repr_list])
 
+    def to_compact(self, style_args: StyleArg, classes: dict[str, str]) -> str:
+        """
+        Convert the text frame to the compact format.
+
+        Args:
+            style_args (StyleArg): The style arguments for conversion.
+            classes (dict[str, str]): The classes of the slide by their styles.
+
+        Returns:
+            str: The compact representation of the text frame.
+        """
+        if not self.is_textframe:
+            return ""
+        return "\n".join(
+            [
+                INDENT * self.level + para.to_compact(style_args, classes)
+                for para in self.paragraphs
+                if para.idx != -1
+            ]
+        )
+
     def __repr__(self) -> str:
         """
         Get a string representation of the text frame.
@@ -365,6 +559,20 @@ class ShapeElement:
     Base class for shape elements in a presentation.
     """
 
+    __slots__ = (
+        "slide_idx",
+        "shape_idx",
+        "style",
+        "data",
+        "text_frame",
+        "_closure_map",
+        "slide_area",
+        "level",
+        "_xml",
+        "fill",
+        "line",
+    )
+
     def __init__(
         self,
         slide_idx: int,
@@ -389,13 +597,11 @@ class ShapeElement:
         """
         self.slide_idx = slide_idx
         self.shape_idx = shape_idx
-        self.style = style
+        self.style = intern_strings(style)
         self.data = data
         self.text_frame = text_frame
-        self._closure_keys = ["clone", "replace", "delete", "style", "merge"]
-        self._closures: dict[str, list[Closure]] = {
-            key: [] for key in self._closure_keys
-        }
+        # created when the first closure is added, most shapes are never edited
+        self._closure_map: Optional[dict[str, list[Closure]]] = None
         self.slide_area = slide_area
         self.level = level
         self.xml = None  # Will be set in from_shape
@@ -488,7 +694,7 @@ class ShapeElement:
             BaseShape: The built shape.
         """
         shape = slide.shapes._shape_factory(
-            slide.shapes._spTree.insert_element_before(parse_xml(self.xml), "p:extLst")
+            slide.shapes._spTree.insert_element_before(clone_xml(self.xml), "p:extLst")
         )
         if getattr(shape, "fill", None) is not None:
             self.fill.build(shape.fill, shape.part)
@@ -496,6 +702,22 @@ class ShapeElement:
             self.line.build(shape.line, shape.part)
         return shape
 
+    @property
+    def xml(self) -> Optional[str]:
+        """
+        Get the XML of the shape, which is kept compressed if `COMPRESS_XML` is set.
+        """
+        if isinstance(self._xml, bytes):
+            return zlib.decompress(self._xml).decode()
+        return self._xml
+
+    @xml.setter
+    def xml(self, xml: Optional[str]) -> None:
+        if COMPRESS_XML and xml is not None:
+            self._xml = zlib.compress(xml.encode())
+        else:
+            self._xml = xml
+
     def __repr__(self) -> str:
         """
         Get a string representation of the shape element.
@@ -522,6 +744,24 @@ class ShapeElement:
             f"to_html not implemented for {self.__class__.__name__}"
         )
 
+    def to_compact(self, style_args: StyleArg, classes: dict[str, str]) -> str:
+        """
+        Convert the shape element to the compact format.
+
+        Args:
+            style_args (StyleArg): The style arguments for conversion.
+            classes (dict[str, str]): The classes of the slide by their styles.
+
+        Returns:
+            str: The compact representation of the shape element.
+
+        Raises:
+            NotImplementedError: If not implemented in a subclass.
+        """
+        raise NotImplementedError(
+            f"to_compact not implemented for {self.__class__.__name__}"
+        )
+
     @property
     def closures(self) -> list[Closure]:
         """
@@ -530,6 +770,8 @@ class ShapeElement:
         Returns:
             List[Closure]: A list of closures.
         """
+        if self._closure_map is None:
+            return []
         closures = []
         closures.extend(sorted(self._closures["clone"]))
         closures.extend(self._closures["replace"] + self._closures["style"])
@@ -537,6 +779,15 @@ class ShapeElement:
         closures.extend(self._closures["merge"])
         return closures
 
+    @property
+    def _closures(self) -> dict[str, list[Closure]]:
+        """
+        Get the closures of the shape element by their keys.
+        """
+        if self._closure_map is None:
+            self._closure_map = {key: [] for key in CLOSURE_KEYS}
+        return self._closure_map
+
     @property
     def indent(self) -> str:
         """
@@ -699,12 +950,40 @@ class ShapeElement:
 
         return id_str
 
+    def get_compact_attrs(self, style_args: StyleArg, classes: dict[str, str]) -> str:
+        """
+        Get the id, class and attributes of the shape element in the compact format.
+
+        Args:
+            style_args (StyleArg): The style arguments for conversion.
+            classes (dict[str, str]): The classes of the slide by their styles.
+
+        Returns:
+            str: The attribute string.
+        """
+        attrs = f"#{self.shape_idx}" if style_args.element_id else ""
+        if style_args.font_style and self.text_frame.is_textframe:
+            attrs += style_class(classes, get_font_style(self.text_frame.font))
+        if style_args.area:
+            attrs += f" area={self.area*100/self.slide_area:.2f}%"
+        if style_args.show_name:
+            attrs += f" name='{self.style['name']}'"
+        if style_args.show_semantic_name and self.semantic_name is not None:
+            attrs += f" semantic='{self.semantic_name}'"
+        if style_args.size:
+            attrs += f" size={self.width}x{self.height}"
+        if style_args.geometry:
+            attrs += f" pos={self.left},{self.top}"
+        return attrs
+
 
 class UnsupportedShape(ShapeElement):
     """
     A class to represent an unsupported shape.
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_shape(
         cls,
@@ -728,6 +1007,8 @@ class TextBox(ShapeElement):
     A class to represent a text box shape.
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_shape(
         cls,
@@ -767,12 +1048,30 @@ class TextBox(ShapeElement):
             + f"\n{self.indent}</div>\n"
         )
 
+    def to_compact(self, style_args: StyleArg, classes: dict[str, str]) -> str:
+        """
+        Convert the text box to the compact format.
+
+        Args:
+            style_args (StyleArg): The style arguments for conversion.
+            classes (dict[str, str]): The classes of the slide by their styles.
+
+        Returns:
+            str: The compact representation of the text box.
+        """
+        line = f"{self.indent}div{self.get_compact_attrs(style_args, classes)}"
+        if not style_args.show_content or not self.text_frame.is_textframe:
+            return line
+        return line + "\n" + self.text_frame.to_compact(style_args, classes)
+
 
 class Picture(ShapeElement):
     """
     A class to represent a picture shape.
     """
 
+    __slots__ = ("row", "col")
+
     @classmethod
     def from_shape(
         cls,
@@ -836,9 +1135,17 @@ class Picture(ShapeElement):
                 self.row, self.col, **self.style["shape_bounds"]
             )
 
-        shape = slide.shapes.add_picture(
-            self.img_path,
-            **self.style["shape_bounds"],
+        image_part, rId = get_or_add_image_part(slide.part, self.img_path)
+        shape_bounds = self.style["shape_bounds"]
+        shape = slide.shapes._shape_factory(
+            slide.shapes._add_pic_from_image_part(
+                image_part,
+                rId,
+                shape_bounds["left"],
+                shape_bounds["top"],
+                shape_bounds["width"],
+                shape_bounds["height"],
+            )
         )
 
         # Set properties
@@ -934,12 +1241,36 @@ class Picture(ShapeElement):
             + f"<img {self.get_inline_style(style_args)} alt='{self.caption}'/>"
         )
 
+    def to_compact(self, style_args: StyleArg, classes: dict[str, str]) -> str:
+        """
+        Convert the picture to the compact format.
+
+        Args:
+            style_args (StyleArg): The style arguments for conversion.
+            classes (dict[str, str]): The classes of the slide by their styles.
+
+        Returns:
+            str: The compact representation of the picture.
+
+        Raises:
+            ValueError: If the caption is not found.
+        """
+        if not style_args.show_image:
+            return ""
+        if self.caption is None:
+            raise ValueError(
+                f"Caption not found for picture {self.shape_idx} of slide {self.slide_idx}"
+            )
+        return f"{self.indent}img{self.get_compact_attrs(style_args, classes)} alt='{self.caption}'"
+
 
 class Placeholder(ShapeElement):
     """
     A class to represent a placeholder shape.
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_shape(
         cls,
@@ -1000,6 +1331,8 @@ class GroupShape(ShapeElement):
     A class to represent a group shape.
     """
 
+    __slots__ = ("_group_label",)
+
     @classmethod
     def from_shape(
         cls,
@@ -1076,12 +1409,19 @@ class GroupShape(ShapeElement):
         Returns:
             bool: True if the group shapes are equal, False otherwise.
         """
-        if not isinstance(__value, GroupShape) or len(self.data) != len(__value.data):
+        if not isinstance(__value, GroupShape):
             return False
-        for shape1, shape2 in zip(self.data, __value.data):
-            if isinstance(shape1, type(shape2)):
-                return False
-        return True
+        return self.structure == __value.structure
+
+    @property
+    def structure(self) -> tuple[type, ...]:
+        """
+        Get the structure of the group shape, the types of its shapes.
+
+        Returns:
+            tuple[type, ...]: The types of the shapes in the group.
+        """
+        return tuple(type(shape) for shape in self.data)
 
     def __repr__(self) -> str:
         """
@@ -1114,6 +1454,24 @@ class GroupShape(ShapeElement):
             + "</div>\n"
         )
 
+    def to_compact(self, style_args: StyleArg, classes: dict[str, str]) -> str:
+        """
+        Convert the group shape to the compact format.
+
+        Args:
+            style_args (StyleArg): The style arguments for conversion.
+            classes (dict[str, str]): The classes of the slide by their styles.
+
+        Returns:
+            str: The compact representation of the group shape.
+        """
+        lines = [
+            f"{self.indent}div{self.get_compact_attrs(style_args, classes)} group={self.group_label}"
+        ]
+        if style_args.show_content:
+            lines.extend(shape.to_compact(style_args, classes) for shape in self.data)
+        return "\n".join([line for line in lines if line])
+
     @property
     def group_label(self) -> str:
         """
@@ -1140,6 +1498,8 @@ class FreeShape(ShapeElement):
     A class to represent a free shape.
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_shape(
         cls,
@@ -1177,12 +1537,30 @@ class FreeShape(ShapeElement):
             + f"\n{self.indent}</div>"
         )
 
+    def to_compact(self, style_args: StyleArg, classes: dict[str, str]) -> str:
+        """
+        Convert the free shape to the compact format.
+
+        Args:
+            style_args (StyleArg): The style arguments for conversion.
+            classes (dict[str, str]): The classes of the slide by their styles.
+
+        Returns:
+            str: The compact representation of the free shape.
+        """
+        line = f"{self.indent}div{self.get_compact_attrs(style_args, classes)}"
+        if not self.text_frame.is_textframe:
+            return line
+        return line + "\n" + self.text_frame.to_compact(style_args, classes)
+
 
 class SemanticPicture(ShapeElement):
     """
     A class to represent a semantic picture (table, chart, etc.).
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_shape(
         cls,
@@ -0,0 +1,159 @@
+import math
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from pptagent.preview import LINE_SPACING, SlideRenderer
+from pptagent.shapes import ShapeElement
+
+# the default insets of text frames in points, 0.1 inch horizontally and 0.05 inch vertically
+INSET_X = 7.2
+INSET_Y = 3.6
+# text is measured at this size and scaled, so small fonts are not skewed by glyph rounding
+REFERENCE_SIZE = 100
+MIN_FONT_SCALE = 0.75
+# the largest part of the text that can be dropped by truncation before asking the editor to rewrite it
+MAX_TRUNCATION = 0.3
+SENTENCE_END = re.compile(r"(?<=[.!?;。！？；])\s*")
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Split a text into sentences, keeping the punctuation and whitespace of each sentence.
+    """
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        if match.end() == start or match.end() == len(text):
+            continue
+        sentences.append(text[start : match.end()])
+        start = match.end()
+    sentences.append(text[start:])
+    return [sentence for sentence in sentences if sentence.strip()]
+
+
+@dataclass
+class TextArea:
+    """
+    The text box of a text element in its template slide, measured in points.
+    """
+
+    shape_idx: int
+    width: float
+    height: float
+    font_size: float
+
+    @classmethod
+    def from_shape(cls, shape: ShapeElement) -> Optional["TextArea"]:
+        """
+        Get the text area of a shape, with the font size of its text frame or its largest paragraph.
+
+        Returns:
+            Optional[TextArea]: The text area, or None if the font size is inherited from the layout and unknown.
+        """
+        sizes = [
+            para.font.get("size")
+            for para in shape.text_frame.paragraphs
+            if para.idx != -1 and para.font.get("size")
+        ]
+        font_size = shape.text_frame.font.get("size") or max(sizes, default=None)
+        if font_size is None:
+            return None
+        return cls(
+            shape.shape_idx,
+            max(shape.width - 2 * INSET_X, 1),
+            max(shape.height - 2 * INSET_Y, 1),
+            font_size,
+        )
+
+    def count_lines(self, text: str, font_size: Optional[float] = None) -> int:
+        """
+        Count the lines of a paragraph wrapped in the text area.
+        """
+        font_size = font_size or self.font_size
+        width = self.width * REFERENCE_SIZE / font_size
+        return len(SlideRenderer.wrap(text, REFERENCE_SIZE, width))
+
+    def text_height(self, texts: list[str], font_size: Optional[float] = None) -> float:
+        """
+        Get the height of the paragraphs in the text area.
+        """
+        font_size = font_size or self.font_size
+        lines = sum(self.count_lines(text, font_size) for text in texts)
+        return lines * font_size * LINE_SPACING
+
+    def fits(self, texts: list[str], font_size: Optional[float] = None) -> bool:
+        """
+        Check whether the paragraphs fit in the text area without overflowing.
+        """
+        return self.text_height(texts, font_size) <= self.height
+
+    def autoshrink(
+        self, texts: list[str], min_scale: float = MIN_FONT_SCALE
+    ) -> Optional[float]:
+        """
+        Get the largest font size, in steps of half a point, the paragraphs fit in.
+
+        Returns:
+            Optional[float]: The font size, or None if the paragraphs overflow even at `min_scale` of the font size.
+        """
+        # rounded down so the smallest size is not above the one `truncate` fits the text at
+        low = math.floor(self.font_size * min_scale * 2)
+        high = round(self.font_size * 2)
+        if not self.fits(texts, low / 2):
+            return None
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.fits(texts, mid / 2):
+                low = mid
+            else:
+                high = mid - 1
+        return low / 2
+
+    def truncate(
+        self, texts: list[str], font_size: Optional[float] = None
+    ) -> Optional[list[str]]:
+        """
+        Drop the trailing sentences of the longest paragraphs until the paragraphs fit.
+
+        Returns:
+            Optional[list[str]]: The truncated paragraphs,
+                or None if they can't fit without dropping more than `MAX_TRUNCATION` of the text.
+        """
+        paragraphs = [split_sentences(text) for text in texts]
+        total = sum(len(text) for text in texts)
+        while not self.fits(["".join(p).strip() for p in paragraphs], font_size):
+            candidates = [p for p in paragraphs if len(p) > 1]
+            if len(candidates) == 0:
+                return None
+            max(candidates, key=lambda p: len("".join(p))).pop()
+        truncated = ["".join(p).strip() for p in paragraphs]
+        if total - sum(len(text) for text in truncated) > total * MAX_TRUNCATION:
+            return None
+        return truncated
+
+    def fit(
+        self, texts: list[str], min_scale: float = MIN_FONT_SCALE
+    ) -> Optional[tuple[list[str], Optional[float]]]:
+        """
+        Fit the paragraphs in the text area, by shrinking the font and then truncating at sentence boundaries.
+
+        Returns:
+            Optional[tuple[list[str], Optional[float]]]: The fitted paragraphs and the shrunk font size,
+                the font size is None if the paragraphs fit as they are.
+                None if the content can not fit and should be rewritten.
+        """
+        if self.fits(texts):
+            return texts, None
+        font_size = self.autoshrink(texts, min_scale)
+        if font_size is not None:
+            return texts, font_size
+        truncated = self.truncate(texts, self.font_size * min_scale)
+        if truncated is None:
+            return None
+        if self.fits(truncated):
+            return truncated, None
+        font_size = self.autoshrink(truncated, min_scale)
+        if font_size is None:
+            return None
+        return truncated, font_size
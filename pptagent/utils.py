@@ -1,28 +1,35 @@
 import asyncio
 import logging
 import os
+import re
 import shutil
 import subprocess
 import tempfile
 import traceback
+from collections.abc import Iterable
+from dataclasses import dataclass, field
 from itertools import product
 from shutil import which
 from time import sleep, time
 from types import SimpleNamespace
-from typing import Any, Optional
+from typing import Any, Generic, Optional, TypeVar
 
 import json_repair
 import Levenshtein
+import tiktoken
 from html2image import Html2Image
 from mistune import html as markdown
 from pdf2image import convert_from_path
 from PIL import Image as PILImage
 from pptx.dml.color import RGBColor
-from pptx.oxml import parse_xml
+from pptx.oxml.ns import qn
+from pptx.oxml.xmlchemy import OxmlElement
 from pptx.parts.image import Image
 from pptx.shapes.group import GroupShape
 from pptx.text.text import _Paragraph, _Run
 from pptx.util import Length, Pt
+from rapidfuzz import process as fuzz_process
+from rapidfuzz.distance import Levenshtein as FuzzLevenshtein
 from tenacity import RetryCallState, retry, stop_after_attempt, wait_fixed
 
 
@@ -63,6 +70,8 @@ def get_logger(name="pptagent", level=None):
 
 logger = get_logger(__name__)
 
+ENCODING = tiktoken.encoding_for_model("gpt-4o")
+
 if which("soffice") is None:
     logging.warning("soffice is not installed, pptx to images conversion will not work")
 
@@ -79,6 +88,9 @@ IMAGE_EXTENSIONS: set[str] = {
     "webp",
 }
 
+# the children of field codes kept when they are converted to runs
+FIELD_RUN_TAGS = {qn("a:rPr"), qn("a:t")}
+
 # Common colors and measurements
 BLACK = RGBColor(0, 0, 0)
 YELLOW = RGBColor(255, 255, 0)
@@ -133,28 +145,34 @@ def get_font_style(font: dict[str, Any]) -> str:
     return "; ".join(styles)
 
 
-def runs_merge(paragraph: _Paragraph) -> Optional[_Run]:
+def runs_merge(paragraph: _Paragraph, convert_fields: bool = False) -> Optional[_Run]:
     """
-    Merge all runs in a paragraph into a single run.
+    Merge all runs in a paragraph into a single run, in place on the XML tree.
 
     Args:
         paragraph (_Paragraph): The paragraph to merge runs in.
+        convert_fields (bool): Whether to convert field codes, like slide numbers, into runs to edit their text.
+            Otherwise a paragraph of only field codes is left to be updated by the viewer, and its longest field is returned.
 
     Returns:
         Optional[_Run]: The merged run, or None if there are no runs.
     """
-    runs = paragraph.runs
+    p = paragraph._p
+    if convert_fields:
+        for fld in list(p.iterchildren(qn("a:fld"))):
+            r = OxmlElement("a:r")
+            r.extend([child for child in fld if child.tag in FIELD_RUN_TAGS])
+            p.replace(fld, r)
+    runs = [_Run(r, paragraph) for r in p.iterchildren(qn("a:r"))]
 
     # Handle field codes
     if len(runs) == 0:
-        runs = [
-            _Run(r, paragraph)
-            for r in parse_xml(paragraph._element.xml.replace("fld", "r")).r_lst
-        ]
+        fields = [_Run(fld, paragraph) for fld in p.iterchildren(qn("a:fld"))]
+        if len(fields) <= 1:
+            return fields[0] if fields else None
+        return max(fields, key=lambda x: len(x.text))
     if len(runs) == 1:
         return runs[0]
-    if len(runs) == 0:
-        return None
 
     # Find the run with the most text
     run = max(runs, key=lambda x: len(x.text))
@@ -208,6 +226,79 @@ def edit_distance(text1: str, text2: str) -> float:
     return 1 - Levenshtein.distance(text1, text2) / max(len(text1), len(text2))
 
 
+V = TypeVar("V")
+
+
+class FuzzyIndex(Generic[V]):
+    """
+    An index resolving (possibly inexact) names to values.
+
+    Lookups are resolved by an exact hash map first, then by a map of normalized keys,
+    and finally by a vectorized scorer computing the same similarity as `edit_distance`.
+    """
+
+    def __init__(self, items: Iterable[tuple[str, V]]):
+        """
+        Initialize the FuzzyIndex, the first value is kept for duplicated keys.
+
+        Args:
+            items (Iterable[tuple[str, V]]): The (key, value) pairs to index.
+        """
+        self.keys: list[str] = []
+        self.values: list[V] = []
+        self.exact: dict[str, V] = {}
+        self.normalized: dict[str, V] = {}
+        for key, value in items:
+            self.keys.append(key)
+            self.values.append(value)
+            self.exact.setdefault(key, value)
+            normalized = self.normalize(key)
+            if normalized:
+                self.normalized.setdefault(normalized, value)
+
+    @staticmethod
+    def normalize(key: str) -> str:
+        """
+        Normalize a key by ignoring case, punctuation and redundant whitespace.
+
+        Args:
+            key (str): The key to normalize.
+
+        Returns:
+            str: The normalized key.
+        """
+        return " ".join(re.sub(r"[^\w]+", " ", key).split()).casefold()
+
+    def match(self, key: str) -> tuple[Optional[V], float]:
+        """
+        Find the most similar value of the given key.
+
+        Args:
+            key (str): The key to look up.
+
+        Returns:
+            tuple[Optional[V], float]: The matched value and its similarity (0.0 to 1.0), or (None, 0.0) if the index is empty.
+        """
+        if key in self.exact:
+            return self.exact[key], 1.0
+        normalized = self.normalize(key)
+        if normalized in self.normalized:
+            return self.normalized[normalized], 1.0
+        result = fuzz_process.extractOne(
+            key, self.keys, scorer=FuzzLevenshtein.normalized_similarity
+        )
+        if result is None:
+            return None, 0.0
+        _, score, idx = result
+        return self.values[idx], score
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.exact
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
 def tenacity_log(retry_state: RetryCallState) -> None:
     """
     Log function for tenacity retries.
@@ -270,65 +361,192 @@ tenacity = retry(
 )
 
 
-def split_markdown_by_level(text: str, level: int = 1):
+MARKDOWN_HEADING = re.compile(r"^(#{1,6})\s+\S")
+
+
+@dataclass
+class MarkdownNode:
+    """
+    A node of the heading tree of a markdown document.
+    """
+
+    header: Optional[str]
+    level: int
+    lines: list[str] = field(default_factory=list)
+    line_tokens: list[int] = field(default_factory=list)
+    children: list["MarkdownNode"] = field(default_factory=list)
+    num_tokens: int = 0
+
+    def iter_lines(self, with_header: bool = True):
+        """
+        Iterate over the lines of this node and its descendants, in document order.
+        """
+        if with_header and self.header is not None:
+            yield self.header
+        yield from self.lines
+        for child in self.children:
+            yield from child.iter_lines()
+
+    def count_tokens(self) -> int:
+        """
+        Compute the number of tokens of this node and its descendants.
+        """
+        self.num_tokens = sum(self.line_tokens) + sum(
+            child.count_tokens() for child in self.children
+        )
+        if self.header is not None:
+            self.num_tokens += len(ENCODING.encode(self.header, disallowed_special=()))
+        return self.num_tokens
+
+
+def build_markdown_tree(markdown_text: str, max_level: int = 6) -> MarkdownNode:
     """
-    Split a markdown document into sections based on the level of headings.
+    Build the heading tree of a markdown document in a single pass.
 
     Args:
-        text (str): The markdown document to split.
-        level (int): The level of headings to split the document into.
+        markdown_text (str): The markdown document.
+        max_level (int): Headings deeper than this level are treated as plain text.
 
     Returns:
-        List[Tuple[str, str]]: A list of tuples, each containing a header and content.
-    """
-    lines = text.splitlines()
-    current_header = None
-    current_content = []
-
-    for line in lines:
-        if line.strip().startswith("#" * level + " "):
-            if sum(len(line) for line in current_content) > 128:
-                yield current_header, "\n".join(current_content)
-                current_header = line
-                current_content = []
-            else:
-                current_content.append(line)
+        MarkdownNode: The root node, which holds the text before the first heading.
+    """
+    root = MarkdownNode(None, 0)
+    stack = [root]
+    in_code_block = False
+    for line in markdown_text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("```") or stripped.startswith("~~~"):
+            in_code_block = not in_code_block
+        heading = None if in_code_block else MARKDOWN_HEADING.match(stripped)
+        if heading is not None and len(heading.group(1)) <= max_level:
+            level = len(heading.group(1))
+            while stack[-1].level >= level:
+                stack.pop()
+            node = MarkdownNode(line, level)
+            stack[-1].children.append(node)
+            stack.append(node)
         else:
-            current_content.append(line)
+            stack[-1].lines.append(line)
+            stack[-1].line_tokens.append(
+                len(ENCODING.encode(line, disallowed_special=()))
+            )
+    root.count_tokens()
+    return root
+
+
+def _split_lines(
+    lines: list[str], line_tokens: list[int], max_tokens: int
+) -> list[tuple[list[str], int]]:
+    """
+    Pack lines into pieces within the token budget, splitting at blank lines first,
+    then at line breaks, and finally inside a line if it alone exceeds the budget.
+    """
+    paragraphs: list[tuple[list[str], list[int]]] = [([], [])]
+    for line, tokens in zip(lines, line_tokens):
+        paragraphs[-1][0].append(line)
+        paragraphs[-1][1].append(tokens)
+        if not line.strip():
+            paragraphs.append(([], []))
+
+    pieces: list[tuple[list[str], int]] = []
+    current: list[str] = []
+    current_tokens = 0
+    for para_lines, para_tokens in paragraphs:
+        if sum(para_tokens) > max_tokens:
+            units = []
+            for line, tokens in zip(para_lines, para_tokens):
+                if tokens <= max_tokens:
+                    units.append(([line], tokens))
+                    continue
+                encoded = ENCODING.encode(line, disallowed_special=())
+                for start in range(0, len(encoded), max_tokens):
+                    part = encoded[start : start + max_tokens]
+                    units.append(([ENCODING.decode(part)], len(part)))
+        else:
+            units = [(para_lines, sum(para_tokens))]
+        for unit_lines, unit_tokens in units:
+            if current and current_tokens + unit_tokens > max_tokens:
+                pieces.append((current, current_tokens))
+                current, current_tokens = [], 0
+            current.extend(unit_lines)
+            current_tokens += unit_tokens
+    if current:
+        pieces.append((current, current_tokens))
+    return pieces
+
 
-    if current_content:
-        yield current_header, "\n".join(current_content)
+def _pack_markdown_node(node: MarkdownNode, max_tokens: int) -> list[dict]:
+    """
+    Collect the largest subtrees within the token budget, top-level sections are always split apart.
+    """
+    if node.level > 0 and node.num_tokens <= max_tokens:
+        return [
+            {
+                "header": node.header,
+                "content": list(node.iter_lines(with_header=False)),
+                "num_tokens": node.num_tokens,
+            }
+        ]
+    if any(line.strip() for line in node.lines):
+        pieces = _split_lines(node.lines, node.line_tokens, max_tokens)
+    elif node.header is not None:
+        # a section without body, it will be merged into its first subsection
+        pieces = [(node.lines, 0)]
+    else:
+        pieces = []
+    units = [
+        {"header": node.header, "content": lines, "num_tokens": num_tokens}
+        for lines, num_tokens in pieces
+    ]
+    for child in node.children:
+        units.extend(_pack_markdown_node(child, max_tokens))
+    return units
 
 
 def split_markdown_to_chunks(
-    markdown_text: str, max_length: int = 32768, max_level: int = 3
+    markdown_text: str,
+    max_tokens: int = 8192,
+    max_level: int = 3,
+    min_tokens: int = 32,
 ) -> list[dict[str, str]]:
     """
-    Split a markdown document into chunks of a maximum length.
+    Split a markdown document into chunks within a token budget.
+
+    The heading tree is built once, each top-level section becomes a chunk if it fits in the budget,
+    otherwise it is split recursively by its subsections, and oversized leaves are split by paragraphs.
 
     Args:
         markdown_text (str): The markdown document to split.
-        max_length (int): The maximum length of a chunk.
+        max_tokens (int): The maximum number of tokens of a chunk.
         max_level (int): The maximum level of headings to split the document into.
+        min_tokens (int): Chunks smaller than this are merged into the following chunk.
 
     Returns:
         List[Dict[str, str]]: A list of dictionaries, each containing a header and content.
-
-    Raises:
-        ValueError: If the markdown document is too long to be split into chunks.
-    """
-    for level in range(1, max_level + 1):
-        sections = []
-        for header, content in split_markdown_by_level(markdown_text, level):
-            if len(content) > max_length:
-                sections = []
-                break
-            sections.append({"header": header, "content": content})
-        if len(sections) != 0:
-            return sections
-    raise ValueError(
-        f"The markdown document is too long to be split into chunks, with max_level = {max_level} and max_length = {max_length}"
-    )
+    """
+    root = build_markdown_tree(markdown_text, max_level)
+    units = _pack_markdown_node(root, max_tokens)
+    chunks = []
+    for unit in units:
+        header_tokens = 0
+        if unit["header"] is not None:
+            header_tokens = len(ENCODING.encode(unit["header"], disallowed_special=()))
+        if (
+            chunks
+            and chunks[-1]["num_tokens"] < min_tokens
+            and chunks[-1]["num_tokens"] + header_tokens + unit["num_tokens"]
+            <= max_tokens
+        ):
+            if unit["header"] is not None:
+                chunks[-1]["content"].append(unit["header"])
+            chunks[-1]["content"].extend(unit["content"])
+            chunks[-1]["num_tokens"] += header_tokens + unit["num_tokens"]
+        else:
+            chunks.append(unit)
+    return [
+        {"header": chunk["header"], "content": "\n".join(chunk["content"])}
+        for chunk in chunks
+    ]
 
 
 TABLE_CSS = """
@@ -6,6 +6,7 @@ import os
 import sys
 import traceback
 import uuid
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime
@@ -23,16 +24,16 @@ from fastapi import (
     WebSocketDisconnect,
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from jinja2 import Template
 from marker.models import create_model_dict
 
 import pptagent.induct as induct
 import pptagent.pptgen as pptgen
-from pptagent.document import Document
+from pptagent.document import Document, OutlineItem
 from pptagent.llms import AsyncLLM
 from pptagent.model_utils import get_image_model, parse_pdf
-from pptagent.multimodal import ImageLabler
+from pptagent.multimodal import CaptionStore, ImageLabler
 from pptagent.presentation import Presentation
 from pptagent.utils import Config, get_logger, package_join, pjoin, ppt_to_images_async
 
@@ -47,12 +48,20 @@ STAGES = [
     "Success!",
 ]
 NUM_MODELS = 1 if len(sys.argv) == 1 else int(sys.argv[1])
+# worker processes for PDF parsing, each loads its own marker models on CPU
+NUM_PDF_WORKERS = int(os.environ.get("NUM_PDF_WORKERS", 1))
+# generated presentations kept in memory, downloaded by streaming instead of reading final.pptx
+MAX_PRESENTATIONS = int(os.environ.get("MAX_PRESENTATIONS", 16))
+# extract the key points of all subsections while inducting the template, including the ones no slide uses
+ORGANIZE_DOCUMENT = os.environ.get("ORGANIZE_DOCUMENT", "0") == "1"
 DEVICE = (
     "cuda"
     if torch.cuda.is_available()
     else "mps" if torch.backends.mps.is_available() else "cpu"
 )
 REFINE_TEMPLATE = Template(package_join("prompts", "document_refine.txt"))
+# captions shared across all templates and documents
+CAPTION_STORE = CaptionStore(pjoin(RUNS_DIR, "caption_cache"))
 
 # models
 language_model = AsyncLLM("gpt-4o")
@@ -73,6 +82,8 @@ app.add_middleware(
 )
 progress_store: dict[str, dict] = {}
 active_connections: dict[str, WebSocket] = {}
+# saving rebuilds the slides of a presentation, so it's locked while saving
+presentation_store: OrderedDict[str, tuple[Presentation, asyncio.Lock]] = OrderedDict()
 executor = ThreadPoolExecutor(max_workers=NUM_MODELS)
 
 
@@ -177,18 +188,68 @@ async def websocket_endpoint(websocket: WebSocket, task_id: str):
         active_connections.pop(task_id, None)
 
 
+class QueueWriter:
+    """
+    A binary stream putting the written data into an asyncio queue, written from another thread.
+    Writing blocks while the queue is full, so a slow client holds back the writer instead of buffering the package.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self.loop = loop
+        self.queue = queue
+
+    def put(self, data: Optional[bytes]):
+        asyncio.run_coroutine_threadsafe(self.queue.put(data), self.loop).result()
+
+    def write(self, data: bytes) -> int:
+        self.put(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+async def stream_presentation(prs: Presentation, lock: asyncio.Lock):
+    """
+    Stream the pptx package of the presentation while it's written.
+    """
+    queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue(maxsize=64)
+    writer = QueueWriter(asyncio.get_running_loop(), queue)
+
+    def save():
+        try:
+            prs.save(writer)
+        finally:
+            writer.put(None)
+
+    async with lock:
+        saving = asyncio.create_task(asyncio.to_thread(save))
+        chunk = b""
+        try:
+            while (chunk := await queue.get()) is not None:
+                yield chunk
+        finally:
+            # drain the queue when the client disconnects, or the writer stays blocked
+            while chunk is not None:
+                chunk = await queue.get()
+            await saving
+
+
 @app.get("/api/download")
 async def download(task_id: str):
     task_id = task_id.replace("|", "/")
     if not os.path.exists(pjoin(RUNS_DIR, task_id)):
         raise HTTPException(status_code=404, detail="Task not created yet")
-    file_path = pjoin(RUNS_DIR, task_id, "final.pptx")
-    if os.path.exists(file_path):
-        return FileResponse(
-            file_path,
+    headers = {"Content-Disposition": "attachment; filename=pptagent.pptx"}
+    if task_id in presentation_store:
+        return StreamingResponse(
+            stream_presentation(*presentation_store[task_id]),
             media_type="application/pptx",
-            headers={"Content-Disposition": "attachment; filename=pptagent.pptx"},
+            headers=headers,
         )
+    file_path = pjoin(RUNS_DIR, task_id, "final.pptx")
+    if os.path.exists(file_path):
+        return FileResponse(file_path, media_type="application/pptx", headers=headers)
     raise HTTPException(status_code=404, detail="Task not finished yet")
 
 
@@ -203,12 +264,45 @@ async def feedback(request: Request):
     return {"message": "Feedback submitted successfully"}
 
 
+@app.post("/api/regenerate")
+async def regenerate(request: Request):
+    """
+    Regenerate the selected slides of a finished task or apply an edited outline,
+    the other slides are restored from their checkpoints.
+    The `slides` are the 1-based numbers of the outline items rather than the positions in the deck,
+    which differ once slides failed to generate and were left out of the deck.
+    """
+    body = await request.json()
+    task_id = body.get("task_id")
+    if task_id is None or not os.path.exists(
+        pjoin(RUNS_DIR, task_id.replace("|", "/"), "task.json")
+    ):
+        raise HTTPException(status_code=404, detail="Task not found")
+    outline = body.get("outline")
+    if outline is not None:
+        outline = [OutlineItem(**outline_item) for outline_item in outline]
+    succ = await ppt_gen(
+        task_id,
+        rerun=True,
+        regenerate=[slide_idx - 1 for slide_idx in body.get("slides", [])],
+        outline=outline,
+    )
+    if not succ:
+        raise HTTPException(status_code=500, detail="Failed to regenerate slides")
+    return {"task_id": task_id}
+
+
 @app.get("/")
 async def hello():
     return {"message": "Hello, World!"}
 
 
-async def ppt_gen(task_id: str, rerun=False):
+async def ppt_gen(
+    task_id: str,
+    rerun=False,
+    regenerate: Optional[list[int]] = None,
+    outline: Optional[list[OutlineItem]] = None,
+):
     if DEBUG:
         importlib.reload(induct)
         importlib.reload(pptgen)
@@ -271,7 +365,7 @@ async def ppt_gen(task_id: str, rerun=False):
             )
             labler.apply_stats(image_stats)
         else:
-            await labler.caption_images_async(vision_model)
+            await labler.caption_images_async(vision_model, CAPTION_STORE)
             json.dump(
                 labler.image_stats,
                 open(pjoin(pptx_config.RUN_DIR, "image_stats.json"), "w"),
@@ -284,6 +378,8 @@ async def ppt_gen(task_id: str, rerun=False):
                 pjoin(RUNS_DIR, "pdf", pdf_md5, "source.pdf"),
                 parsedpdf_dir,
                 marker_model,
+                num_workers=NUM_PDF_WORKERS,
+                cache_dir=pjoin(RUNS_DIR, "pdf", "page_cache"),
             )
         else:
             text_content = open(pjoin(parsedpdf_dir, "source.md")).read()
@@ -296,6 +392,7 @@ async def ppt_gen(task_id: str, rerun=False):
                 language_model,
                 vision_model,
                 parsedpdf_dir,
+                CAPTION_STORE,
             )
             json.dump(
                 source_doc.to_dict(),
@@ -306,6 +403,19 @@ async def ppt_gen(task_id: str, rerun=False):
             source_doc = Document.from_dict(source_doc, parsedpdf_dir)
         await progress.report_progress()
 
+        ppt_agent = pptgen.PPTAgentAsync(
+            text_embedder,
+            language_model,
+            vision_model,
+            error_exit=False,
+            retry_times=5,
+            outline_cache_dir=pjoin(RUNS_DIR, "outline_cache"),
+            key_points_cache_dir=pjoin(RUNS_DIR, "key_points_cache"),
+        )
+        organize_task = None
+        if ORGANIZE_DOCUMENT:
+            organize_task = asyncio.create_task(ppt_agent.organize_document(source_doc))
+
         # Slide Induction
         if not os.path.exists(pjoin(pptx_config.RUN_DIR, "slide_induction.json")):
             deepcopy(presentation).save(
@@ -337,25 +447,43 @@ async def ppt_gen(task_id: str, rerun=False):
         await progress.report_progress()
 
         # PPT Generation with PPTAgentAsync
-        ppt_agent = pptgen.PPTAgentAsync(
-            text_embedder, language_model, vision_model, error_exit=False, retry_times=5
-        )
+        if organize_task is not None:
+            await organize_task
         ppt_agent.set_reference(
             config=generation_config,
             slide_induction=slide_induction,
             presentation=presentation,
         )
 
-        await ppt_agent.generate_pres(
+        # a rerun continues from the slides checkpointed by the previous run
+        prs, _ = await ppt_agent.generate_pres(
             source_doc=source_doc,
             num_slides=task["numberOfPages"],
+            outline=outline,
+            resume=rerun,
+            regenerate=regenerate,
+            checkpoint=True,
         )
+        if prs is None:
+            raise Exception("Failed to generate presentation")
+        lock = asyncio.Lock()
+        presentation_store[task_id] = (prs, lock)
+        presentation_store.move_to_end(task_id)
+        while len(presentation_store) > MAX_PRESENTATIONS:
+            presentation_store.popitem(last=False)
+        # final.pptx keeps the result downloadable after the presentation is evicted or the server restarts
+        async with lock:
+            await asyncio.to_thread(
+                prs.save, pjoin(generation_config.RUN_DIR, "final.pptx")
+            )
 
         logger.info(f"{task_id}: generation finished")
         await progress.report_progress()
+        return True
     except Exception as e:
         await progress.fail_stage(str(e))
         traceback.print_exc()
+        return False
 
 
 async def test_connection(*models: AsyncLLM):
@@ -0,0 +1,125 @@
+"""
+Benchmarks of PPTAgent, run from the repository root with `python -m test.benchmark [name ...]`.
+They report measurements instead of asserting on them, as time and memory vary between machines.
+"""
+
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import replace
+from multiprocessing import get_context
+from test.conftest import test_config
+
+from pptx.oxml import parse_xml
+from pptx.text.text import _Paragraph, _Run
+
+from pptagent import shapes
+from pptagent.presentation import Presentation
+from pptagent.shapes import StyleArg
+from pptagent.utils import ENCODING, Config, pjoin, runs_merge
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def _parse_memory(compress: bool) -> int:
+    shapes.COMPRESS_XML = compress
+    with tempfile.TemporaryDirectory() as run_dir:
+        tracemalloc.start()
+        presentation = Presentation.from_file(
+            pjoin(test_config.template, "source.pptx"), Config(run_dir)
+        )
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    del presentation
+    return memory
+
+
+@benchmark
+def shape_memory() -> str:
+    """
+    The memory of the shape model of the test template, with and without `COMPRESS_XML`.
+    Each is measured in a new process, so neither is helped by the caches warmed by the other.
+    """
+    memory = {}
+    for compress in [False, True]:
+        with get_context("spawn").Pool(1) as pool:
+            memory[compress] = pool.apply(_parse_memory, (compress,))
+    return f"{memory[False]} bytes, {memory[True]} bytes with COMPRESS_XML"
+
+
+@benchmark
+def runs_merge_fields(num_paragraphs: int = 2000) -> str:
+    """
+    Merging paragraphs of slide numbers in place, against the serialize and reparse round trip used before.
+    """
+    field_paragraph = (
+        '<a:p xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">'
+        '<a:fld id="{B6F15528-21DE-4FAA-801E-634DDDAF4B2B}" type="slidenum">'
+        '<a:rPr lang="en-US" sz="1200"/><a:t>3</a:t></a:fld></a:p>'
+    )
+    paragraphs = [
+        _Paragraph(parse_xml(field_paragraph), None) for _ in range(num_paragraphs)
+    ]
+    start = time.perf_counter()
+    for paragraph in paragraphs:
+        [
+            _Run(r, paragraph)
+            for r in parse_xml(paragraph._p.xml.replace("fld", "r")).r_lst
+        ]
+    reparse = time.perf_counter() - start
+    start = time.perf_counter()
+    for paragraph in paragraphs:
+        runs_merge(paragraph)
+    in_place = time.perf_counter() - start
+    return (
+        f"{num_paragraphs} paragraphs, reparse {reparse:.3f}s, in place {in_place:.3f}s"
+    )
+
+
+@benchmark
+def parse_template() -> str:
+    """
+    The time to parse the test template into the shape model.
+    """
+    with tempfile.TemporaryDirectory() as run_dir:
+        start = time.perf_counter()
+        Presentation.from_file(
+            pjoin(test_config.template, "source.pptx"), Config(run_dir)
+        )
+        return f"{time.perf_counter() - start:.3f}s"
+
+
+@benchmark
+def slide_tokens() -> str:
+    """
+    The prompt tokens of the test template in HTML and in the compact format,
+    with the default style arguments and with all of them.
+    """
+    with tempfile.TemporaryDirectory() as run_dir:
+        presentation = Presentation.from_file(
+            pjoin(test_config.template, "source.pptx"), Config(run_dir)
+        )
+    results = []
+    for name, style_args in [
+        ("default", StyleArg(show_image=False)),
+        ("all", replace(StyleArg.all_true(), show_image=False)),
+    ]:
+        html = compact = 0
+        for slide in presentation.slides:
+            html += len(ENCODING.encode(slide.to_html(style_args)))
+            compact += len(
+                ENCODING.encode(slide.to_html(replace(style_args, compact=True)))
+            )
+        results.append(f"{name}: html {html}, compact {compact} ({compact / html:.0%})")
+    return "; ".join(results)
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        print(f"{name}: {BENCHMARKS[name]()}")
@@ -1,9 +1,19 @@
 from test.conftest import test_config
 
+import pytest
 from pptx import Presentation
 
-from pptagent.apis import API_TYPES, CodeExecutor, replace_para
-from pptagent.utils import package_join
+from pptagent.apis import (
+    API_TYPES,
+    CodeExecutor,
+    SlideEditError,
+    replace_para,
+    synthesize_actions,
+    tokenize_markdown,
+)
+from pptagent.presentation import Presentation as PPTAgentPresentation
+from pptagent.shapes import Picture
+from pptagent.utils import package_join, pjoin
 
 
 def test_api_docs():
@@ -23,3 +33,82 @@ def test_replace_para():
     assert runs[6].font.name == "Consolas"
     assert runs[8].font.strikethrough
     assert runs[10].hyperlink.address == "http://example.com"
+
+
+def test_tokenize_markdown():
+    blocks = tokenize_markdown("- **bold *both*** `a*b*c` snake_case_name \\*x\\*")
+    assert [(b.text, b.bold, b.italic, b.code) for b in blocks] == [
+        ("bold ", True, False, False),
+        ("both", True, True, False),
+        (" ", False, False, False),
+        ("a*b*c", False, False, True),
+        (" snake_case_name *x*", False, False, False),
+    ]
+    assert tokenize_markdown("2 * 3 * 4")[0].text == "2 * 3 * 4"
+
+
+@pytest.mark.parametrize(
+    "text", ["Growth **2x", "C** rating", "**Note:", "a ** b", "**", "***"]
+)
+def test_tokenize_unmatched_emphasis(text):
+    blocks = tokenize_markdown(text)
+    assert "".join(b.text for b in blocks) == text
+    assert not any(b.bold or b.italic for b in blocks)
+
+
+def test_compile_actions():
+    executor = CodeExecutor(3)
+    program = executor.compile_actions(
+        "```python\n"
+        "# (title, text, quantity_change: 0, [old], [new])\n"
+        'replace_paragraph(0, 0, "New Title")\n'
+        "clone_paragraph(\n    1, 0\n)  # cloned paragraph_id is 2\n"
+        "```"
+    )
+    assert [stmt.func for stmt in program.calls] == [
+        "replace_paragraph",
+        "clone_paragraph",
+    ]
+    assert program.calls[1].args == [1, 0] and program.calls[1].end_lineno == 5
+    for actions in ["x = del_image(1)", "eval('1')", "del_image(len('a'))"]:
+        with pytest.raises(SlideEditError):
+            executor.compile_actions(actions)
+
+
+def test_synthesize_actions():
+    prs = PPTAgentPresentation.from_file(
+        pjoin(test_config.template, "source.pptx"), test_config.config
+    )
+    slide = prs.slides[0]
+    title = next(
+        para
+        for shape in slide
+        if shape.text_frame.is_textframe
+        for para in shape.text_frame.paragraphs
+        if para.idx != -1
+    )
+    actions = synthesize_actions(
+        slide, [("title", "text", "quantity_change: 0", [title.text], ["New Title"])]
+    )
+    calls = CodeExecutor(3).compile_actions(actions).calls
+    assert len(calls) == 1 and calls[0].func == "replace_paragraph"
+    assert calls[0].args[-1] == "New Title"
+    assert synthesize_actions(slide, [("x", "text", "", ["not exist"], ["a"])]) is None
+
+
+def test_execute_replace_image():
+    prs = PPTAgentPresentation.from_file(
+        pjoin(test_config.template, "source.pptx"), test_config.config
+    )
+    slide, picture = next(
+        (slide, shape) for slide in prs.slides for shape in slide.shape_filter(Picture)
+    )
+    image_path = pjoin(test_config.document, "_page_0_Figure_14.jpeg")
+    executor = CodeExecutor(3)
+    assert (
+        executor.execute_actions(
+            f'replace_image({picture.shape_idx}, "{image_path}")', slide, None
+        )
+        is None
+    )
+    assert picture.img_path == image_path
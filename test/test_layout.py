@@ -1,6 +1,12 @@
 from test.conftest import test_config
 
+import pytest
+
 from pptagent.layout import Layout
+from pptagent.presentation import Presentation
+from pptagent.preview import LINE_SPACING
+from pptagent.text_fit import TextArea, split_sentences
+from pptagent.utils import Config, pjoin
 
 
 def test_layout():
@@ -8,3 +14,54 @@ def test_layout():
     layout = Layout.from_dict(template["opening:text"])
     layout.content_schema
     layout.get_old_data()
+
+
+def test_text_fit(tmp_path):
+    presentation = Presentation.from_file(
+        pjoin(test_config.template, "source.pptx"), Config(str(tmp_path))
+    )
+    title = "table of contents:text"
+    layout = Layout.from_dict(title, test_config.get_slide_induction()[title])
+    layout.locate_text_areas(presentation.slides[layout.slide_id - 1])
+    text_area = layout["content_bullets"].text_area
+    assert text_area is not None
+    content = layout["content_bullets"].content
+    assert text_area.fit(content) == (content, None)
+
+    # a little more content is shrunk to fit
+    editor_output = {
+        "main_title": {"data": layout["main_title"].content},
+        "content_bullets": {"data": content + ["Culture is a way of life."]},
+    }
+    layout.validate(editor_output, 1.5, str(tmp_path))
+    assert editor_output["content_bullets"]["font_size"] < text_area.font_size
+    assert layout.resize_actions(editor_output).startswith(
+        f"set_font_size({text_area.shape_idx}, "
+    )
+
+    # trailing sentences are dropped rather than asking the editor to rewrite
+    extra = " It evolves over time. It is shared by a community."
+    truncated = text_area.truncate(content[:-1] + [content[-1] + extra * 2])
+    assert truncated[:-1] == content[:-1]
+    assert truncated[-1].startswith(content[-1])
+    assert len(truncated[-1]) < len(content[-1] + extra * 2)
+
+    editor_output["content_bullets"]["data"] = content * 3
+    with pytest.raises(ValueError):
+        layout.validate(editor_output, 1.5, str(tmp_path))
+
+
+def test_fit_min_font_size(monkeypatch):
+    # a line per sentence, the truncated text fits at 12.75pt, the smallest size of 17pt
+    monkeypatch.setattr(
+        TextArea,
+        "count_lines",
+        lambda self, text, font_size=None: len(split_sentences(text)),
+    )
+    text_area = TextArea(0, 1000, 2 * 12.75 * LINE_SPACING, 17)
+    texts = ["The first sentence is long. The second sentence is long. End."]
+    assert text_area.fit(texts) == (
+        ["The first sentence is long. The second sentence is long."],
+        12.5,
+    )
+    assert text_area.fit(texts * 2) is None
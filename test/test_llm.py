@@ -1,6 +1,11 @@
+import base64
+from io import BytesIO
 from test.conftest import test_config
 
 import pytest
+from PIL import Image
+
+from pptagent.llms import encode_image
 
 
 @pytest.mark.asyncio
@@ -29,3 +34,13 @@ def test_sync_llm():
     response = sync_language_model("Hello, how are you?", max_tokens=1)
     assert response is not None, "Sync LLM returned None response"
     assert len(response) > 0, "Sync LLM returned empty response"
+
+
+def test_encode_image():
+    image = f"{test_config.document}/_page_0_Figure_14.jpeg"
+    data_url = encode_image(image, max_side=256)
+    assert data_url.startswith("data:image/jpeg;base64,")
+    with Image.open(BytesIO(base64.b64decode(data_url.split(",", 1)[1]))) as img:
+        assert max(img.size) == 256
+    assert encode_image(image, max_side=256) is data_url
+    assert encode_image(image, image_format="webp").startswith("data:image/webp")
@@ -0,0 +1,130 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+from PyPDF2 import PdfWriter
+
+import pptagent.model_utils as model_utils
+from pptagent.model_utils import parse_pdf, pdf_page_hashes
+
+
+def write_pdf(path: str, page_sizes: list[tuple[int, int]]):
+    writer = PdfWriter()
+    for width, height in page_sizes:
+        writer.add_blank_page(width, height)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+@pytest.fixture
+def page_ranges(monkeypatch):
+    """
+    Replace marker with a converter rendering each page as its index, record the converted page ranges.
+    """
+    page_ranges = []
+
+    class ConfigParser:
+        def __init__(self, config: dict):
+            self.config = config
+
+        def generate_config_dict(self):
+            return self.config
+
+        def get_processors(self):
+            return None
+
+        def get_renderer(self):
+            return None
+
+    def PdfConverter(config: dict, **kwargs):
+        page_range = [int(page_idx) for page_idx in config["page_range"].split(",")]
+        page_ranges.append(page_range)
+        return lambda pdf_path: SimpleNamespace(
+            markdown="".join(
+                f"\n\n{{{page_idx}}}{'-' * 48}\n\n![](_page_{page_idx}_Figure_0.jpeg)"
+                f"\n\nPage {page_idx}"
+                for page_idx in page_range
+            ),
+            images={
+                f"_page_{page_idx}_Figure_0.jpeg": Image.new("RGB", (8, 8))
+                for page_idx in page_range
+            },
+            metadata={
+                "table_of_contents": [
+                    {"title": f"Page {page_idx}", "page_id": page_idx}
+                    for page_idx in page_range
+                ]
+            },
+        )
+
+    monkeypatch.setattr(model_utils, "ConfigParser", ConfigParser)
+    monkeypatch.setattr(model_utils, "PdfConverter", PdfConverter)
+    monkeypatch.setattr(
+        model_utils,
+        "text_from_rendered",
+        lambda rendered: (rendered.markdown, "md", rendered.images),
+    )
+    return page_ranges
+
+
+def test_pdf_page_hashes(tmp_path):
+    write_pdf(tmp_path / "a.pdf", [(200, 300), (200, 300), (300, 200)])
+    write_pdf(tmp_path / "b.pdf", [(300, 200), (200, 300)])
+    hashes = pdf_page_hashes(str(tmp_path / "a.pdf"))
+    assert hashes[0] == hashes[1] and hashes[0] != hashes[2]
+    assert pdf_page_hashes(str(tmp_path / "b.pdf")) == [hashes[2], hashes[0]]
+
+
+def test_parse_pdf_shards(tmp_path, page_ranges):
+    page_sizes = [(200 + page_idx, 300) for page_idx in range(5)]
+    write_pdf(tmp_path / "source.pdf", page_sizes)
+    cache_dir = str(tmp_path / "cache")
+    full_text = parse_pdf(
+        str(tmp_path / "source.pdf"),
+        str(tmp_path / "first"),
+        model_lst={},
+        pages_per_shard=2,
+        cache_dir=cache_dir,
+    )
+    assert page_ranges == [[0, 1], [2, 3], [4]]
+    assert [line for line in full_text.split("\n\n") if line.startswith("Page")] == [
+        f"Page {page_idx}" for page_idx in range(5)
+    ]
+    with open(tmp_path / "first" / "meta.json") as f:
+        metadata = json.load(f)
+    assert [item["page_id"] for item in metadata["table_of_contents"]] == list(range(5))
+
+    # only the revised page is converted again, the others are copied from the cache
+    page_ranges.clear()
+    page_sizes[3] = (400, 300)
+    write_pdf(tmp_path / "source.pdf", page_sizes)
+    revised_text = parse_pdf(
+        str(tmp_path / "source.pdf"),
+        str(tmp_path / "second"),
+        model_lst={},
+        pages_per_shard=2,
+        cache_dir=cache_dir,
+    )
+    assert page_ranges == [[3]]
+    assert revised_text == full_text
+    for page_idx in range(5):
+        assert (tmp_path / "second" / f"_page_{page_idx}_Figure_0.jpeg").exists()
+
+    # a cached page moved to another position is renamed after its new index
+    page_ranges.clear()
+    write_pdf(tmp_path / "source.pdf", page_sizes[1:])
+    moved_text = parse_pdf(
+        str(tmp_path / "source.pdf"),
+        str(tmp_path / "third"),
+        model_lst={},
+        cache_dir=cache_dir,
+    )
+    assert page_ranges == []
+    assert moved_text == "\n\n".join(
+        f"![](_page_{page_idx}_Figure_0.jpeg)\n\nPage {page_idx + 1}"
+        for page_idx in range(4)
+    )
+    with open(tmp_path / "third" / "meta.json") as f:
+        metadata = json.load(f)
+    assert [item["page_id"] for item in metadata["table_of_contents"]] == list(range(4))
@@ -1,6 +1,6 @@
 from test.conftest import test_config
 
-from pptagent.multimodal import ImageLabler
+from pptagent.multimodal import CaptionStore, ImageLabler
 from pptagent.presentation import Presentation
 from pptagent.utils import pjoin
 
@@ -11,3 +11,15 @@ def test_load_captions():
     )
     image_labler = ImageLabler(prs, test_config.config)
     image_labler.apply_stats(test_config.get_image_stats())
+
+
+def test_caption_store(tmp_path):
+    image = pjoin(test_config.document, "_page_0_Figure_14.jpeg")
+    store = CaptionStore(str(tmp_path))
+    assert store.get(image, "vision", "prompt") is None
+    store.set(image, "vision", "prompt", "a figure")
+    # a fresh store reads the caption back from disk
+    store = CaptionStore(str(tmp_path))
+    assert store.get(image, "vision", "prompt") == "a figure"
+    assert store.get(image, "another-vision", "prompt") is None
+    assert store.get(image, "vision", "another prompt") is None
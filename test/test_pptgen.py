@@ -1,9 +1,11 @@
+import asyncio
 from test.conftest import test_config
+from types import SimpleNamespace
 
-from pptagent.document import Document, OutlineItem
-from pptagent.pptgen import PPTAgent, PPTAgentAsync
+from pptagent.document import Document, OutlineItem, SubSection
+from pptagent.pptgen import DeckContext, PPTAgent, PPTAgentAsync
 from pptagent.presentation import Presentation
-from pptagent.utils import pjoin
+from pptagent.utils import Config, pjoin
 
 
 def test_pptgen():
@@ -45,3 +47,134 @@ async def test_pptgen_async():
     outline = test_config.get_outline()
     outline = [OutlineItem(**outline[3])]
     await pptgen.generate_pres(document, outline=outline)
+
+
+def test_pptgen_resume(tmp_path):
+    pptgen = PPTAgent(
+        test_config.text_embedder.to_sync(),
+        language_model=test_config.language_model.to_sync(),
+        vision_model=test_config.vision_model.to_sync(),
+    ).set_reference(
+        config=Config(str(tmp_path)),
+        presentation=Presentation.from_file(
+            pjoin(test_config.template, "source.pptx"), test_config.config
+        ),
+        slide_induction=test_config.get_slide_induction(),
+    )
+    document = Document.from_dict(
+        test_config.get_document_json(), test_config.document, False
+    )
+    outline = test_config.get_outline()
+    outline = [OutlineItem(**outline[2])]
+    pptgen.generate_pres(document, outline=outline, checkpoint=True)
+    assert len(list((tmp_path / "checkpoints").iterdir())) == 1
+    prs, history = pptgen.generate_pres(document, outline=outline, resume=True)
+    assert len(prs.slides) == 1
+    assert all(len(turns) == 0 for turns in history["agents"].values())
+    prs, history = pptgen.generate_pres(
+        document, outline=outline, resume=True, regenerate=[0]
+    )
+    assert len(prs.slides) == 1
+    assert len(history["agents"]["editor"]) != 0
+
+
+async def test_section_planning(tmp_path):
+    pptgen = PPTAgentAsync(
+        test_config.text_embedder,
+        language_model=test_config.language_model,
+        vision_model=test_config.vision_model,
+        outline_cache_dir=str(tmp_path),
+        section_planning=True,
+    ).set_reference(
+        config=test_config.config,
+        presentation=Presentation.from_file(
+            pjoin(test_config.template, "source.pptx"), test_config.config
+        ),
+        slide_induction=test_config.get_slide_induction(),
+    )
+    document = Document.from_dict(
+        test_config.get_document_json(), test_config.document, False
+    )
+    outline = await pptgen.generate_outline(8, document)
+    # planners don't keep to the number of slides exactly, check the structure instead
+    assert len(outline) > 0
+    assert all(isinstance(outline_item, OutlineItem) for outline_item in outline)
+    assert all(document.retrieve(outline_item.indexs) for outline_item in outline)
+    assert await pptgen.generate_outline(8, document) == outline
+    pptgen.section_planning = False
+    assert pptgen._outline_cache_file(
+        document, 8, pptgen.staffs["planner"].model
+    ) not in {str(path) for path in tmp_path.iterdir()}
+
+
+async def test_organize_document(tmp_path):
+    pptgen = PPTAgentAsync(
+        test_config.text_embedder,
+        language_model=test_config.language_model,
+        vision_model=test_config.vision_model,
+        key_points_cache_dir=str(tmp_path),
+    )
+    document = Document.from_dict(
+        test_config.get_document_json(), test_config.document, False
+    )
+    await pptgen.organize_document(document)
+    assert len(list(tmp_path.iterdir())) == len(
+        {subsection.content_source for subsection in document.subsections}
+    )
+
+
+async def test_shared_key_points(tmp_path):
+    pptgen = PPTAgentAsync(
+        test_config.text_embedder,
+        language_model=test_config.language_model,
+        vision_model=test_config.vision_model,
+        key_points_cache_dir=str(tmp_path),
+    )
+    subsection = SubSection(title="Background", content="Shared content")
+    calls = []
+
+    async def content_organizer(content_source: str):
+        calls.append(content_source)
+        await asyncio.sleep(0.1)
+        return [{"key": "point"}]
+
+    content_organizer.model = "organizer"
+    cancelled = asyncio.create_task(
+        pptgen._subsection_key_points(content_organizer, subsection)
+    )
+    waiting = asyncio.create_task(
+        pptgen._subsection_key_points(content_organizer, subsection)
+    )
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    assert await waiting == [{"key": "point"}]
+    assert len(calls) == 1 and len(pptgen._key_points_tasks) == 0
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+async def test_race_edit_slide(monkeypatch):
+    pptgen = PPTAgentAsync(
+        test_config.text_embedder,
+        language_model=test_config.language_model,
+        vision_model=test_config.vision_model,
+    )
+    built = []
+    deck = DeckContext(
+        source_doc=None,
+        staffs={name: role.fork() for name, role in pptgen.staffs.items()},
+        empty_prs=SimpleNamespace(build_slide=built.append),
+    )
+    slide = deck.new_slide(0)
+
+    async def edit_slide(candidate, layout, slide_content, slide_description, build):
+        assert not build
+        await asyncio.sleep(0 if layout.title == "fast" else 1)
+        candidate.checkpoint = {"layout": layout.title}
+        return layout.title, None
+
+    monkeypatch.setattr(pptgen, "edit_slide", edit_slide)
+    layouts = [SimpleNamespace(title="slow"), SimpleNamespace(title="fast")]
+    assert await pptgen._race_edit_slide(slide, layouts, "", "") == ("fast", None)
+    assert built == ["fast"]
+    assert slide.layout == "fast" and slide.checkpoint == {"layout": "fast"}
+    assert len(deck.slides) == 1 and deck.slides[0] is slide
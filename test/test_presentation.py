@@ -2,8 +2,10 @@ import tempfile
 from copy import deepcopy
 from test.conftest import test_config
 
+from pptagent import shapes
+from pptagent.apis import replace_paragraph
 from pptagent.presentation import Presentation
-from pptagent.utils import Config
+from pptagent.utils import Config, pjoin
 
 
 def test_presentation():
@@ -12,3 +14,126 @@ def test_presentation():
     for sld in presentation.slides:
         sld.to_html(show_image=False)
     deepcopy(presentation)
+
+
+def test_save(tmp_path):
+    presentation = Presentation.from_file(test_config.ppt, Config(str(tmp_path)))
+    # images are cached by package, saving again must not reuse dropped parts
+    for file_name in ["first.pptx", "second.pptx"]:
+        presentation.save(str(tmp_path / file_name))
+        saved = Presentation.from_file(str(tmp_path / file_name), Config(str(tmp_path)))
+        assert len(saved.slides) == len(presentation.slides)
+
+
+def test_to_bytes(tmp_path):
+    presentation = Presentation.from_file(test_config.ppt, Config(str(tmp_path)))
+    with open(tmp_path / "saved.pptx", "wb") as f:
+        f.write(presentation.to_bytes())
+    saved = Presentation.from_file(str(tmp_path / "saved.pptx"), Config(str(tmp_path)))
+    assert len(saved.slides) == len(presentation.slides)
+
+
+def test_compact_shapes(tmp_path, monkeypatch):
+    source = pjoin(test_config.template, "source.pptx")
+    config = Config(str(tmp_path))
+    xmls = {}
+    for compress in [False, True]:
+        monkeypatch.setattr(shapes, "COMPRESS_XML", compress)
+        presentation = Presentation.from_file(source, config)
+        xmls[compress] = []
+        for slide in presentation.slides:
+            for shape in slide.shapes:
+                assert not hasattr(shape, "__dict__")
+                assert isinstance(shape._xml, bytes) == compress
+                xmls[compress].append(shape.xml)
+            slide.to_html(show_image=False)
+        presentation.save(str(tmp_path / f"compress_{compress}.pptx"))
+    assert xmls[True] == xmls[False]
+
+
+def test_to_images(tmp_path):
+    presentation = Presentation.from_file(test_config.ppt, Config(str(tmp_path)))
+    image_paths = presentation.to_images(str(tmp_path / "previews"), width=480)
+    assert len(image_paths) == len(presentation.slides)
+    image = presentation.slides[0].to_image(width=480)
+    assert image.width == 480
+    assert (
+        abs(
+            image.height / image.width
+            - presentation.slides[0].slide_height / presentation.slides[0].slide_width
+        )
+        < 0.01
+    )
+
+
+def test_shape_index(tmp_path):
+    source = pjoin(test_config.template, "source.pptx")
+    presentation = Presentation.from_file(source, Config(str(tmp_path)))
+    for slide in presentation.slides:
+        for shape in slide:
+            assert slide.get_shape(shape.shape_idx) is not None
+        text = slide.to_text()
+        assert slide.to_text() is text
+        assert slide.text_length == sum(len(s.text_frame) for s in slide.shapes)
+        pictures = list(slide.shape_filter(shapes.Picture))
+        if len(pictures) == 0:
+            continue
+        slide = deepcopy(slide)
+        picture = list(slide.shape_filter(shapes.Picture))[0]
+        slide.remove_shape(picture)
+        assert slide.get_shape(picture.shape_idx) is None
+        assert len(list(slide.shape_filter(shapes.Picture))) == len(pictures) - 1
+        assert all(shape is not picture for shape in slide)
+
+
+def test_html_cache(tmp_path):
+    presentation = Presentation.from_file(test_config.ppt, Config(str(tmp_path)))
+    slide = presentation.slides[0]
+    html = slide.to_html(show_image=False)
+    assert slide.to_html(show_image=False) == html
+    assert slide.to_html(shapes.StyleArg(show_image=False)) == html
+    assert slide.to_html(shapes.StyleArg.all_true(), show_image=False) != html
+
+    edit_slide = deepcopy(slide)
+    shape = next(s for s in edit_slide if s.text_frame.is_textframe)
+    para = next(p for p in shape.text_frame.paragraphs if p.idx != -1)
+    replace_paragraph(edit_slide, shape.shape_idx, para.idx, "Edited paragraph")
+    assert "Edited paragraph" in edit_slide.to_html(show_image=False)
+    assert slide.to_html(show_image=False) == html
+
+
+def test_compact_format(tmp_path):
+    source = pjoin(test_config.template, "source.pptx")
+    presentation = Presentation.from_file(source, Config(str(tmp_path)))
+    for slide in presentation.slides:
+        compact = slide.to_html(show_image=False, compact=True)
+        assert compact == slide.to_compact(show_image=False)
+        lines = compact.splitlines()
+        assert lines[0].startswith(f"slide size={slide.slide_width}x")
+        classes = [line.split()[0] for line in lines if line.startswith(".")]
+        assert len(classes) == len(set(classes))
+        for shape in slide:
+            if shape.text_frame.is_textframe:
+                assert f"div#{shape.shape_idx}" in compact
+                for para in shape.text_frame.paragraphs:
+                    if para.idx != -1:
+                        assert f"#{para.idx}" in compact and para.text in compact
+
+
+def test_html_cache_copy(tmp_path, monkeypatch):
+    presentation = Presentation.from_file(test_config.ppt, Config(str(tmp_path)))
+    slide = presentation.slides[0]
+    copies = []
+    shape_type = type(slide.shapes[-1])
+    to_html = shape_type.to_html
+
+    def copy_while_rendering(shape, style_args):
+        # the template slide is copied by the event loop while a worker thread renders it
+        copies.append(deepcopy(slide))
+        return to_html(shape, style_args)
+
+    monkeypatch.setattr(shape_type, "to_html", copy_while_rendering)
+    html = slide.to_html(show_image=False)
+    assert all(len(copied._html_cache) == 0 for copied in copies)
+    assert copies[0].to_html(show_image=False) == html
+    assert len(deepcopy(slide)._html_cache) == 1
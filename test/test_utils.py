@@ -4,9 +4,26 @@ from test.conftest import test_config
 import pytest
 from bs4 import BeautifulSoup
 from markdown import markdown
+from pptx.oxml import parse_xml
+from pptx.text.text import _Paragraph
 
 import pptagent.utils as utils
-from pptagent.utils import get_json_from_response, split_markdown_to_chunks
+from pptagent.utils import (
+    ENCODING,
+    FuzzyIndex,
+    edit_distance,
+    get_json_from_response,
+    runs_merge,
+    split_markdown_to_chunks,
+)
+
+SLIDE_NUMBER = (
+    '<a:fld id="{B6F15528-21DE-4FAA-801E-634DDDAF4B2B}" type="slidenum">'
+    '<a:rPr lang="en-US" sz="1200"/><a:t>3</a:t></a:fld>'
+)
+FIELD_PARAGRAPH = (
+    '<a:p xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">%s</a:p>'
+)
 
 
 def test_extract_json_from_markdown_block():
@@ -104,3 +121,50 @@ def test_markdown_splits():
         soup = BeautifulSoup(markdown_html, "html.parser")
         parsed_medias += len(soup.find_all("img")) + len(soup.find_all("table"))
     assert parsed_medias == num_medias
+
+
+def test_markdown_splits_oversized_section():
+    paragraphs = [f"Paragraph {i} " + "lorem ipsum " * 20 for i in range(20)]
+    markdown_content = "# Title\n\n## Long Section\n\n" + "\n\n".join(paragraphs)
+    chunks = split_markdown_to_chunks(markdown_content, max_tokens=128)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        lines = chunk["content"].splitlines()
+        assert sum(len(ENCODING.encode(line)) for line in lines) <= 128
+    merged = "\n".join(chunk["content"] for chunk in chunks)
+    assert all(paragraph in merged for paragraph in paragraphs)
+
+
+def test_fuzzy_index():
+    titles = ["Introduction to PPTAgent", "Methods", "Results & Analysis"]
+    index = FuzzyIndex((title, i) for i, title in enumerate(titles))
+    assert index.match("Methods") == (1, 1.0)
+    assert index.match("introduction to  pptagent") == (0, 1.0)
+    value, similarity = index.match("Result Analysis")
+    assert value == 2
+    assert similarity == edit_distance("Results & Analysis", "Result Analysis")
+    assert FuzzyIndex([]).match("Methods") == (None, 0.0)
+
+
+def test_runs_merge_fields():
+    # paragraphs of only field codes are kept to be updated by the viewer
+    paragraph = _Paragraph(parse_xml(FIELD_PARAGRAPH % SLIDE_NUMBER), None)
+    run = runs_merge(paragraph)
+    assert run.text == "3" and run.font.size.pt == 12
+    assert len(paragraph._p.xpath("a:fld")) == 1
+
+    # field codes are converted to runs to edit the text
+    run = runs_merge(paragraph, convert_fields=True)
+    run.text = "Chapter 1"
+    assert paragraph.text == "Chapter 1" and run.font.size.pt == 12
+    assert len(paragraph._p.xpath("a:fld")) == 0
+
+    paragraph = _Paragraph(
+        parse_xml(
+            FIELD_PARAGRAPH
+            % ('<a:r><a:rPr b="1"/><a:t>Page </a:t></a:r>' + SLIDE_NUMBER)
+        ),
+        None,
+    )
+    run = runs_merge(paragraph, convert_fields=True)
+    assert run.font.bold and paragraph.text == "Page 3" and len(paragraph.runs) == 1